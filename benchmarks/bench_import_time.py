@@ -0,0 +1,76 @@
+"""
+Import-time benchmark of rigorous_llm.
+
+Every repetition imports the modules in a fresh interpreter, without any API key in the environment.
+The results are printed as JSON. With --max-ms, the benchmark exits with an error if the median import time exceeds the limit.
+
+    python benchmarks/bench_import_time.py --repeat 5 --max-ms 2000
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Modules which should not be imported by merely importing rigorous_llm
+DEFERRED_MODULES = ["langchain_openai", "langchain_community", "openai"]
+
+MEASUREMENT_SCRIPT = """
+import sys, time, json
+t_start = time.perf_counter()
+import {module}
+elapsed_ms = (time.perf_counter() - t_start) * 1000.0
+print(json.dumps({{
+    "elapsed_ms": elapsed_ms,
+    "loaded_deferred_modules": [m for m in {deferred_modules!r} if m in sys.modules]
+}}))
+"""
+
+
+def measure_import_time (module :str) -> dict:
+    env = {
+        k: v for k, v in os.environ.items()
+        if k not in ["OPENAI_API_KEY", "OPENAI_MODEL", "TAVILY_API_KEY"]
+    }
+    env["PYTHONPATH"] = SRC_DIR + os.pathsep + env.get("PYTHONPATH", "")
+
+    completed = subprocess.run(
+        [sys.executable, "-c", MEASUREMENT_SCRIPT.format(module=module, deferred_modules=DEFERRED_MODULES)],
+        env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main () -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="rigorous_llm.graph_builders")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    measurements = [measure_import_time(args.module) for _ in range(args.repeat)]
+    elapsed_ms = [m["elapsed_ms"] for m in measurements]
+
+    result = {
+        "benchmark": "import_time",
+        "module": args.module,
+        "repeat": args.repeat,
+        "min_ms": min(elapsed_ms),
+        "median_ms": statistics.median(elapsed_ms),
+        "max_ms": max(elapsed_ms),
+        "loaded_deferred_modules": sorted(set(sum([m["loaded_deferred_modules"] for m in measurements], [])))
+    }
+    print(json.dumps(result, indent=2))
+
+    if (args.max_ms is not None and result["median_ms"] > args.max_ms):
+        print(f"Median import time {result['median_ms']:.1f} ms exceeds {args.max_ms:.1f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Throughput benchmark of the output parsers (rigorous_llm.output_parsers), for outputs of 1 to thousands of items.
+
+Each parser parses a whole output (parse), and StrListOutputParser also parses it streamed in small chunks (transform), as in the pipelined graph.
+The results are printed as JSON; with --baseline, the regressions are reported (exit code 1).
+
+    python benchmarks/bench_output_parsers.py --sizes 1,100,1000 --output bench_parsers.json
+"""
+import sys
+import time
+import argparse
+from typing import Callable, Dict
+
+from bench_utils import summarize_latencies, write_result
+
+from rigorous_llm.output_parsers import BooleanOutputParser, StrListOutputParser, IndexedBooleanOutputParser
+
+
+def create_bulleted_output (n :int) -> str:
+    return "\n".join([f"* Entity {i} was registered in {1900 + i % 120} with the value {i * 7}." for i in range(n)])
+
+
+def create_indexed_output (n :int) -> str:
+    return "\n".join([f"[{i+1}] {'true' if (i % 3) else 'false'}" for i in range(n)])
+
+
+def split_into_chunks (text :str, chunk_size :int) -> list:
+    return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def measure (run :Callable[[], object], n_items :int, n_bytes :int, repeat :int) -> Dict:
+    latencies = []
+    for _ in range(repeat):
+        t_start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - t_start)
+
+    mean_seconds = sum(latencies) / len(latencies)
+    return {
+        "latency": summarize_latencies(latencies),
+        "items_per_second": n_items / mean_seconds,
+        "bytes_per_second": n_bytes / mean_seconds
+    }
+
+
+def bench_size (n :int, args) -> Dict:
+    bulleted_output = create_bulleted_output(n)
+    indexed_output = create_indexed_output(n)
+    chunks = split_into_chunks(bulleted_output, args.chunk_size)
+
+    str_list_parser = StrListOutputParser()
+    indexed_boolean_parser = IndexedBooleanOutputParser()
+    boolean_parser = BooleanOutputParser()
+
+    return {
+        "str_list_parse": measure(lambda: str_list_parser.parse(bulleted_output), n, len(bulleted_output), args.repeat),
+        "str_list_stream": measure(lambda: list(str_list_parser.transform(iter(chunks))), n, len(bulleted_output), args.repeat),
+        "indexed_boolean_parse": measure(lambda: indexed_boolean_parser.parse(indexed_output), n, len(indexed_output), args.repeat),
+        "boolean_parse": measure(lambda: [boolean_parser.parse("true") for _ in range(n)], n, 4 * n, args.repeat)
+    }
+
+
+def main () -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,100,1000", help="Comma-separated numbers of items per output")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=8, help="The size (in characters) of the streamed chunks")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    args = parser.parse_args()
+
+    result = {
+        "benchmark": "output_parsers",
+        "settings": {"repeat": args.repeat, "chunk_size": args.chunk_size},
+        "sizes": {
+            f"n{n}": bench_size(n, args)
+            for n in [int(s) for s in args.sizes.split(",")]
+        }
+    }
+    return write_result(result, args.output, args.baseline, args.max_regression)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Latency benchmark of the rigorous LLM graph and of its nodes, over a scripted fake chat model (rigorous_llm.fakes).
+
+For each scenario size n, the scripted search returns n facts and the chatbot answer holds n statements.
+Per scenario, the benchmark reports the end-to-end latency percentiles of a rigorous turn, its LLM calls and prompt bytes (in total and per node),
+and the same for each rigorous node run alone. The results are printed as JSON; with --baseline, the regressions are reported (exit code 1).
+
+    python benchmarks/bench_rigorous_graph.py --sizes 1,10,100 --latency lognormal --latency-mean-ms 50 --latency-spread 0.5 \\
+        --graph-kwargs '{"validation_batch_size": 10}' --output bench.json
+
+The tail-latency controls (rigorous_llm.latency_controls) are set with --deadline-ms, --hedge-percentile and --turn-budget-ms, e.g.:
+
+    python benchmarks/bench_rigorous_graph.py --latency lognormal --latency-mean-ms 50 --latency-spread 1.0 --hedge-percentile 90 --turn-budget-ms 2000
+
+With --stream, the turns are also streamed (rigorous_llm.streaming), and the perceived latencies are reported: the time to the casual answer,
+to the first token of the revised answer, and to the whole revised answer.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+from typing import Dict, List
+
+from bench_utils import LLMCallCounter, summarize_latencies, write_result
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from rigorous_llm.fakes import LatencyModel, create_scripted_chat_model_for_rigorous_llm, create_scripted_search_tool, create_scripted_rigorous_llm_graph
+from rigorous_llm.graph_builders import create_graph_node, FactsCollectionNode, LLMResponseStatementsExtractionNode, LLMResponseValidationNode, LLMResponseRevisementNode, RigorousnessJudgementNode
+from rigorous_llm.latency_controls import LatencyPolicy, TurnBudget
+from rigorous_llm.streaming import CASUAL_ANSWER_EVENT, REVISED_ANSWER_EVENT, REVISED_ANSWER_TOKEN_EVENT, astream_rigorous_answer, stream_rigorous_answer
+
+
+# ====
+# Scenarios
+# ====
+def create_facts (n :int) -> List[str]:
+    return [f"Entity {i} was registered in {1900 + i % 120} with the value {i * 7}." for i in range(n)]
+
+
+def create_search_contents (n :int, facts_per_content :int = 10) -> List[str]:
+    facts = create_facts(n)
+    return [" ".join(facts[i:i+facts_per_content]) for i in range(0, n, facts_per_content)]
+
+
+def create_node_states (n :int) -> Dict[str, Dict]:
+    facts = create_facts(n)
+    tool_content = json.dumps([{"url": f"https://example.com/{i}", "content": c} for i, c in enumerate(create_search_contents(n))])
+    messages = [
+        HumanMessage("Tell me about the entities."),
+        AIMessage("", tool_calls=[{"name": "scripted_search", "args": {"query": "entities"}, "id": "call_0"}]),
+        ToolMessage(tool_content, tool_call_id="call_0", id="tool_message_0"),
+        AIMessage(" ".join(facts))
+    ]
+    base_state = {"messages": messages, "fact_table": [], "fact_ids_by_source": {}, "rigorousness_required": True, "extracted_statements": [], "validated_statements": []}
+    return {
+        "judgement": base_state,
+        "facts_collection": base_state,
+        "statements_extraction": base_state,
+        "validation": {**base_state, "fact_table": facts, "fact_ids_by_source": {"tool_message_0": list(range(n))}, "extracted_statements": facts},
+        "revisement": {**base_state, "validated_statements": facts}
+    }
+
+
+# ====
+# Measurements
+# ====
+def run_turns (runnable, state :Dict, repeat :int, mode :str) -> Dict:
+    latencies = []
+    counters = []
+    for i in range(repeat):
+        counter = LLMCallCounter()
+        config = {"callbacks": [counter], "configurable": {"thread_id": f"bench-{time.time_ns()}-{i}"}}
+        t_start = time.perf_counter()
+        if (mode == "async"):
+            asyncio.run(runnable.ainvoke(state, config=config))
+        else:
+            runnable.invoke(state, config=config)
+        latencies.append(time.perf_counter() - t_start)
+        counters.append(counter)
+
+    nodes = sorted(set(sum([list(c.by_node.keys()) for c in counters], [])))
+    return {
+        "latency": summarize_latencies(latencies),
+        "llm": {
+            "n_calls": sum([c.n_calls for c in counters]) / repeat,
+            "prompt_bytes": sum([c.prompt_bytes for c in counters]) / repeat
+        },
+        "llm_by_node": {
+            node: {
+                "n_calls": sum([c.by_node.get(node, {}).get("n_calls", 0) for c in counters]) / repeat,
+                "prompt_bytes": sum([c.by_node.get(node, {}).get("prompt_bytes", 0) for c in counters]) / repeat
+            }
+            for node in nodes
+        }
+    }
+
+
+def run_streamed_turns (graph, state :Dict, repeat :int, mode :str) -> Dict:
+    """
+    The time to the first event of each type (the casual answer, the first token and the whole revised answer) of the streamed turns.
+    """
+    event_types = [CASUAL_ANSWER_EVENT, REVISED_ANSWER_TOKEN_EVENT, REVISED_ANSWER_EVENT]
+    latencies = {event_type: [] for event_type in event_types}
+
+    async def astream_turn (config :Dict) -> List:
+        return [(event, time.perf_counter()) async for event in astream_rigorous_answer(graph, state, config=config)]
+
+    for i in range(repeat):
+        config = {"configurable": {"thread_id": f"bench-stream-{time.time_ns()}-{i}"}}
+        t_start = time.perf_counter()
+        if (mode == "async"):
+            timed_events = asyncio.run(astream_turn(config))
+        else:
+            timed_events = [(event, time.perf_counter()) for event in stream_rigorous_answer(graph, state, config=config)]
+        for event_type in event_types:
+            event_times = [t for event, t in timed_events if event.type == event_type]
+            if (len(event_times) > 0):
+                latencies[event_type].append(event_times[0] - t_start)
+
+    return {
+        f"time_to_{event_type}": summarize_latencies(latencies[event_type])
+        for event_type in event_types if len(latencies[event_type]) > 0
+    }
+
+
+def create_latency_controls (args) -> Dict:
+    """
+    The latency_policy and turn_budget keyword arguments of create_rigorous_llm_graph (if any), from the command line.
+    """
+    latency_controls = {}
+    if (args.deadline_ms is not None or args.hedge_percentile is not None):
+        latency_controls["latency_policy"] = LatencyPolicy(
+            deadline_seconds=(args.deadline_ms / 1000.0) if (args.deadline_ms is not None) else None,
+            hedge_percentile=args.hedge_percentile,
+            hedge_delay_seconds=(2.0 * args.latency_mean_ms / 1000.0) if (args.hedge_percentile is not None) else None
+        )
+    if (args.turn_budget_ms is not None):
+        latency_controls["turn_budget"] = TurnBudget(budget_seconds=args.turn_budget_ms / 1000.0)
+    return latency_controls
+
+
+def bench_scenario (n :int, args, graph_kwargs :Dict) -> Dict:
+    chat_model = create_scripted_chat_model_for_rigorous_llm(latency_model=LatencyModel(
+        distribution=args.latency,
+        mean_seconds=args.latency_mean_ms / 1000.0,
+        spread=args.latency_spread,
+        seed=args.seed
+    )).model_copy(update={"token_latency_seconds": args.token_latency_ms / 1000.0})
+
+    # The full graph
+    search_tool = create_scripted_search_tool(search=lambda query: create_search_contents(n))
+    latency_controls = create_latency_controls(args)
+    graph = create_scripted_rigorous_llm_graph(chat_model=chat_model, search_tool=search_tool, **graph_kwargs, **latency_controls).compile()
+    initial_state = {"messages": [HumanMessage("Tell me about the entities.")], "fact_table": [], "fact_ids_by_source": {}, "rigorousness_required": False, "extracted_statements": [], "validated_statements": []}
+    result = {"graph": run_turns(graph, initial_state, args.repeat, args.mode)}
+    if (args.stream):
+        result["graph_streamed"] = run_streamed_turns(graph, initial_state, args.repeat, args.mode)
+    if ("latency_policy" in latency_controls):
+        latency_policy = latency_controls["latency_policy"]
+        result["graph"]["latency_controls"] = {
+            "n_calls": latency_policy.n_calls,
+            "n_hedged_calls": latency_policy.n_hedged_calls,
+            "n_hedge_wins": latency_policy.n_hedge_wins,
+            "n_deadline_exceeded": latency_policy.n_deadline_exceeded
+        }
+
+    # Each rigorous node alone
+    node_kwargs = {k: graph_kwargs[k] for k in ["max_concurrency"] if k in graph_kwargs}
+    nodes = {
+        "judgement": RigorousnessJudgementNode(chat_model=chat_model),
+        "facts_collection": FactsCollectionNode(chat_model=chat_model, **node_kwargs),
+        "statements_extraction": LLMResponseStatementsExtractionNode(chat_model=chat_model),
+        "validation": LLMResponseValidationNode(chat_model=chat_model, batch_size=graph_kwargs.get("validation_batch_size", 1), **node_kwargs),
+        "revisement": LLMResponseRevisementNode(chat_model=chat_model)
+    }
+    states = create_node_states(n)
+    result["nodes"] = {
+        name: run_turns(create_graph_node(node), states[name], args.repeat, args.mode)
+        for name, node in nodes.items()
+    }
+    return result
+
+
+def main () -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,100", help="Comma-separated numbers of facts/statements per scenario")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--latency", choices=LatencyModel.DISTRIBUTIONS, default="constant")
+    parser.add_argument("--latency-mean-ms", type=float, default=20.0)
+    parser.add_argument("--latency-spread", type=float, default=0.0, help="uniform: half-width in seconds; lognormal: sigma")
+    parser.add_argument("--token-latency-ms", type=float, default=0.0, help="Time between the generated words of a response")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--graph-kwargs", default="{}", help="JSON keyword arguments of create_rigorous_llm_graph")
+    parser.add_argument("--deadline-ms", type=float, default=None, help="Deadline of every LLM call of the graph")
+    parser.add_argument("--hedge-percentile", type=float, default=None, help="Hedge the LLM calls slower than this latency percentile")
+    parser.add_argument("--turn-budget-ms", type=float, default=None, help="Whole-turn latency budget of the graph")
+    parser.add_argument("--stream", action="store_true", help="Also report the perceived latencies of the streamed turns")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    graph_kwargs = json.loads(args.graph_kwargs)
+
+    result = {
+        "benchmark": "rigorous_graph",
+        "settings": {
+            "mode": args.mode,
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "latency_mean_ms": args.latency_mean_ms,
+            "latency_spread": args.latency_spread,
+            "token_latency_ms": args.token_latency_ms,
+            "deadline_ms": args.deadline_ms,
+            "hedge_percentile": args.hedge_percentile,
+            "turn_budget_ms": args.turn_budget_ms,
+            "graph_kwargs": graph_kwargs
+        },
+        "scenarios": {
+            f"n{n}": bench_scenario(n, args, graph_kwargs)
+            for n in [int(s) for s in args.sizes.split(",")]
+        }
+    }
+    return write_result(result, args.output, args.baseline, args.max_regression)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Shared helpers of the benchmarks: percentiles, LLM call accounting and baseline comparison.
+"""
+import os
+import sys
+import json
+import threading
+import statistics
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if (SRC_DIR not in sys.path):
+    sys.path.insert(0, SRC_DIR)
+
+
+def summarize_latencies (latencies_seconds :List[float]) -> Dict[str, float]:
+    sorted_ms = sorted([t * 1000.0 for t in latencies_seconds])
+    def percentile (p :float) -> float:
+        return sorted_ms[min(len(sorted_ms)-1, int(round(p / 100.0 * (len(sorted_ms)-1))))]
+    return {
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "mean_ms": statistics.mean(sorted_ms),
+        "max_ms": sorted_ms[-1]
+    }
+
+
+class LLMCallCounter (BaseCallbackHandler):
+    """
+    Count the chat model calls and their prompt bytes, in total and per graph node (from the langgraph_node metadata).
+    """
+
+    def __init__ (self) -> None:
+        self.n_calls = 0
+        self.prompt_bytes = 0
+        self.by_node :Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start (self, serialized, messages, *, metadata :Optional[Dict] = None, **kwargs) -> None:
+        prompt_bytes = sum([len(str(m.content).encode("utf-8")) for batch in messages for m in batch])
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        with self._lock:
+            self.n_calls += 1
+            self.prompt_bytes += prompt_bytes
+            node_counts = self.by_node.setdefault(node, {"n_calls": 0, "prompt_bytes": 0})
+            node_counts["n_calls"] += 1
+            node_counts["prompt_bytes"] += prompt_bytes
+
+
+def flatten_metrics (result :Any, prefix :str = "") -> Dict[str, float]:
+    if isinstance(result, dict):
+        flattened = {}
+        for k, v in result.items():
+            flattened.update(flatten_metrics(v, f"{prefix}{k}."))
+        return flattened
+    if isinstance(result, (int, float)) and not isinstance(result, bool):
+        return {prefix[:-1]: float(result)}
+    return {}
+
+
+def compare_with_baseline (result :Dict, baseline :Dict, max_regression :float) -> List[Dict]:
+    """
+    Compare the metrics with a baseline (both as produced by the benchmarks), and return the regressions beyond max_regression (relative).
+    Latencies, LLM calls and prompt bytes are lower-is-better. Throughputs (*_per_second) are higher-is-better.
+    """
+    current, previous = flatten_metrics(result), flatten_metrics(baseline)
+    regressions = []
+    for key, value in current.items():
+        base_value = previous.get(key, None)
+        if (base_value is None or base_value <= 0):
+            continue
+        if (key.endswith("_per_second")):
+            change = (base_value - value) / base_value
+        elif (key.endswith("_ms") or key.endswith("n_calls") or key.endswith("prompt_bytes")):
+            change = (value - base_value) / base_value
+        else:
+            continue
+        if (change > max_regression):
+            regressions.append({"metric": key, "baseline": base_value, "current": value, "regression": change})
+    return regressions
+
+
+def write_result (result :Dict, output_path :Optional[str], baseline_path :Optional[str], max_regression :float) -> int:
+    """
+    Print (and optionally save) the result as JSON. With a baseline, report the regressions and return 1 if any.
+    """
+    if (baseline_path is not None):
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            result["regressions"] = compare_with_baseline(result, json.load(f), max_regression)
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if (output_path is not None):
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if (len(result.get("regressions", [])) > 0):
+        print(f"{len(result['regressions'])} metrics regressed by more than {max_regression:.0%}", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,261 @@
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from .caches import LRUCache, create_cache_key
+from .instrumentation import record_cache_lookups
+from .llms import get_chat_model_name, resolve_chat_model
+from .graph_builders import LLMResponseRevisementNode, get_rigorous_llm_settings
+from .chains import create_chain_for_rigorousness_judgement, create_chain_for_statements_extraction, create_chain_for_input_validation_against_facts, create_chain_for_inputs_validation_against_facts, create_chain_for_statements_summarization, create_chain_for_history_summarization
+from .data_definitions import NO_RIGOROUS_ANSWER, REVISEMENT_INSTRUCTION, collect_facts_from_state, create_facts_update, is_user_query_message
+from .utils import normalize_text
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# ====
+# Constants
+# ====
+# The fact source of the supporting facts of a cached answer (see data_definitions.create_facts_update)
+ANSWER_CACHE_FACT_SOURCE = "answer_cache"
+
+DEFAULT_ANSWER_TTL_SECONDS = 24 * 3600
+
+# The chains of the rigorous graph whose prompts determine the answers (see graph_builders.create_rigorous_llm_graph)
+RIGOROUS_GRAPH_CHAIN_BUILDERS = [
+    create_chain_for_rigorousness_judgement,
+    create_chain_for_statements_extraction,
+    create_chain_for_input_validation_against_facts,
+    create_chain_for_inputs_validation_against_facts,
+    create_chain_for_statements_summarization,
+    create_chain_for_history_summarization
+]
+
+
+# ====
+# Answer cache helper functions
+# ====
+def render_chain_prompts (chain :Runnable) -> List[str]:
+    """
+    The rendered prompt templates of a chain.
+    """
+    return [node.data.pretty_repr() for node in chain.get_graph().nodes.values() if isinstance(node.data, BasePromptTemplate)]
+
+
+def create_config_fingerprint (chat_model :Optional[BaseChatModel] = None, **settings) -> str:
+    """
+    A fingerprint of everything else that determines the answers: the chat model, the prompts (the rendered prompt templates of the chains of the graph),
+    and the settings (e.g., the keyword arguments of create_rigorous_llm_graph). The settings which are not JSON values count by their type.
+    """
+    chat_model = resolve_chat_model(chat_model)
+    prompts = [prompt for create_chain in RIGOROUS_GRAPH_CHAIN_BUILDERS for prompt in render_chain_prompts(create_chain(chat_model))]
+    encoded_settings = json.dumps(
+        settings,
+        sort_keys=True,
+        default=lambda value: f"<{type(value).__module__}.{type(value).__name__}>"
+    )
+    return create_cache_key(get_chat_model_name(chat_model), *prompts, encoded_settings)
+
+
+def create_graph_fingerprint (graph :Runnable) -> str:
+    """
+    The config fingerprint of a rigorous graph, from the settings it was built with (see graph_builders.get_rigorous_llm_settings).
+    """
+    settings = get_rigorous_llm_settings(graph)
+    assert(settings is not None), f"Not a rigorous graph (see graph_builders.create_rigorous_llm_graph): {type(graph).__name__}"
+    return create_config_fingerprint(**settings)
+
+
+def find_cacheable_query (inputs :Dict) -> Optional[str]:
+    """
+    The user query of a turn whose answer only depends on the query: the inputs hold a single user query (and no earlier turn).
+    """
+    user_queries = [message for message in inputs.get("messages", []) if is_user_query_message(message)]
+    if (len(user_queries) != 1):
+        return None
+    return str(user_queries[0].content)
+
+
+def find_revised_answer (outputs :Dict) -> Optional[str]:
+    """
+    The revised answer of a turn, if the turn was revised with validated statements.
+    """
+    messages = outputs.get("messages", [])
+    if (len(messages) < 2 or not isinstance(messages[-2], HumanMessage) or messages[-2].content != REVISEMENT_INSTRUCTION):
+        return None
+    if (not isinstance(messages[-1], AIMessage) or messages[-1].content == NO_RIGOROUS_ANSWER):
+        return None
+    return str(messages[-1].content)
+
+
+def create_fact_store_freshness_check (fact_store) -> Callable[[Dict], bool]:
+    """
+    Create a freshness check of the cached answers: an answer is fresh while all its supporting facts are still in the fact store (unexpired).
+    fact_store: e.g., fact_store.SQLiteFactStore (with has_facts).
+    """
+    def is_fresh (entry :Dict) -> bool:
+        return fact_store.has_facts(entry["facts"])
+
+    return is_fresh
+
+
+def has_thread_history (graph :Runnable, config :RunnableConfig) -> bool:
+    if (getattr(graph, "checkpointer", None) is None or config.get("configurable", {}).get("thread_id", None) is None):
+        return False
+    return len(graph.get_state(config).values.get("messages", [])) > 0
+
+
+async def ahas_thread_history (graph :Runnable, config :RunnableConfig) -> bool:
+    if (getattr(graph, "checkpointer", None) is None or config.get("configurable", {}).get("thread_id", None) is None):
+        return False
+    return len((await graph.aget_state(config)).values.get("messages", [])) > 0
+
+
+def create_cached_turn_update (inputs :Dict, entry :Dict) -> Dict:
+    """
+    The state update of a turn answered from the cache: the revised answer, and its supporting facts in the fact table.
+    """
+    return {
+        "messages": list(inputs["messages"]) + [HumanMessage(REVISEMENT_INSTRUCTION), AIMessage(entry["answer"])],
+        **create_facts_update({}, {ANSWER_CACHE_FACT_SOURCE: entry["facts"]}),
+        "rigorousness_required": False,
+        "extracted_statements": [],
+        "validated_statements": []
+    }
+
+
+# ====
+# Answer cache classes
+# ====
+class AnswerCache:
+    """
+    A whole-turn cache of the revised answers, keyed by the normalized user query and the config fingerprint (see create_config_fingerprint).
+    - Each entry keeps the revised answer and its supporting facts (the facts of the turn).
+    - The entries are evicted by LRU (max_size) and by age (ttl_seconds), unless another cache (e.g., caches.TieredCache) is given.
+    - If freshness_check is given, a hit is only served if the check passes on its entry (e.g., create_fact_store_freshness_check), else it is dropped.
+    """
+
+    def __init__ (
+            self,
+            cache = None,
+            max_size :int = 1024,
+            ttl_seconds :Optional[float] = DEFAULT_ANSWER_TTL_SECONDS,
+            freshness_check :Optional[Callable[[Dict], bool]] = None
+    ) -> None:
+        """
+        cache: the underlying cache of JSON values. If None, an in-memory LRUCache(max_size, ttl_seconds).
+        """
+        self.cache = cache if (cache is not None) else LRUCache(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.freshness_check = freshness_check
+
+        self._lock = threading.Lock()
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_stale = 0
+
+    def create_key (self, query :str, fingerprint :str) -> str:
+        return create_cache_key(fingerprint, normalize_text(query))
+
+    def lookup (self, query :str, fingerprint :str) -> Optional[Dict]:
+        key = self.create_key(query, fingerprint)
+        entry = self.cache.get(key)
+
+        stale = (entry is not None and self.freshness_check is not None and not self.freshness_check(entry))
+        if (stale):
+            logger.info(f"Stale cached answer dropped")
+            self.cache.delete(key)
+            entry = None
+
+        with self._lock:
+            self.n_hits += int(entry is not None)
+            self.n_misses += int(entry is None)
+            self.n_stale += int(stale)
+        record_cache_lookups("answer", n_hits=int(entry is not None), n_misses=int(entry is None))
+        return entry
+
+    def store (self, query :str, fingerprint :str, answer :str, facts :List[str]) -> None:
+        self.cache.set(self.create_key(query, fingerprint), {
+            "query": query,
+            "answer": answer,
+            "facts": facts,
+            "created_at": time.time()
+        })
+
+    def store_turn (self, query :str, fingerprint :str, outputs :Dict) -> None:
+        # Only the revised answers with validated statements are cached (not the casual or fallback ones)
+        answer = find_revised_answer(outputs)
+        if (answer is not None):
+            self.store(query, fingerprint, answer, collect_facts_from_state(outputs))
+
+
+# ====
+# Answer-cached graph
+# ====
+def create_answer_cached_graph (graph :Runnable, answer_cache :AnswerCache, fingerprint :Optional[str] = None) -> Runnable:
+    """
+    Wrap a compiled rigorous graph (see graph_builders.create_rigorous_llm_graph) with a whole-turn answer cache.
+    The first turn of a conversation (a single user query, and no history in the thread) is answered from the cache if possible:
+    the output state holds the cached revised answer and its supporting facts, and is written to the thread (if the graph has a checkpointer).
+    The other turns, and the misses, run the graph; the revised answers of the first turns are then cached.
+    fingerprint: the config fingerprint of the graph (see create_config_fingerprint). If None, it is derived from the settings the graph was built with (see create_graph_fingerprint);
+    if given for a rigorous graph, it must match them.
+    """
+    if (get_rigorous_llm_settings(graph) is not None):
+        graph_fingerprint = create_graph_fingerprint(graph)
+        assert(fingerprint is None or fingerprint == graph_fingerprint), "The fingerprint does not match the settings of the graph"
+        fingerprint = graph_fingerprint
+    assert(fingerprint is not None), "A fingerprint is required for a graph not built by create_rigorous_llm_graph"
+
+    def answer_from_cache (inputs :Dict, entry :Dict, config :RunnableConfig) -> Dict:
+        logger.info(f"Answer served from the answer cache")
+        update = create_cached_turn_update(inputs, entry)
+        if (getattr(graph, "checkpointer", None) is None or config.get("configurable", {}).get("thread_id", None) is None):
+            return {**inputs, **update}
+        graph.update_state(config, update, as_node=LLMResponseRevisementNode.name)
+        return graph.get_state(config).values
+
+    async def aanswer_from_cache (inputs :Dict, entry :Dict, config :RunnableConfig) -> Dict:
+        logger.info(f"Answer served from the answer cache")
+        update = create_cached_turn_update(inputs, entry)
+        if (getattr(graph, "checkpointer", None) is None or config.get("configurable", {}).get("thread_id", None) is None):
+            return {**inputs, **update}
+        await graph.aupdate_state(config, update, as_node=LLMResponseRevisementNode.name)
+        return (await graph.aget_state(config)).values
+
+    def invoke_with_cache (inputs :Dict, config :RunnableConfig) -> Dict:
+        query = find_cacheable_query(inputs)
+        if (query is not None and has_thread_history(graph, config)):
+            query = None
+
+        if (query is not None):
+            entry = answer_cache.lookup(query, fingerprint)
+            if (entry is not None):
+                return answer_from_cache(inputs, entry, config)
+
+        outputs = graph.invoke(inputs, config=config)
+        if (query is not None):
+            answer_cache.store_turn(query, fingerprint, outputs)
+        return outputs
+
+    async def ainvoke_with_cache (inputs :Dict, config :RunnableConfig) -> Dict:
+        query = find_cacheable_query(inputs)
+        if (query is not None and await ahas_thread_history(graph, config)):
+            query = None
+
+        if (query is not None):
+            entry = answer_cache.lookup(query, fingerprint)
+            if (entry is not None):
+                return await aanswer_from_cache(inputs, entry, config)
+
+        outputs = await graph.ainvoke(inputs, config=config)
+        if (query is not None):
+            answer_cache.store_turn(query, fingerprint, outputs)
+        return outputs
+
+    return RunnableLambda(invoke_with_cache, afunc=ainvoke_with_cache, name=f"answer_cached_{graph.get_name()}")
@@ -0,0 +1,332 @@
+"""
+Offline batch runner of the rigorous LLM graph.
+
+The queries are streamed from a JSONL file (one {"id": ..., "query": ...} per line), and run through the compiled graph with bounded concurrency.
+The results (and optionally the per-node traces) are appended to JSONL files as the queries complete.
+The results file is the checkpoint: a re-run with the same output skips the queries completed there, so an interrupted run resumes where it stopped
+(the failed queries are retried, and their new results appended).
+
+    python -m rigorous_llm.batch_runner --input queries.jsonl --output results.jsonl --traces traces.jsonl \\
+        --graph-factory rigorous_llm.fakes:create_scripted_rigorous_llm_graph --max-concurrency 16
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import importlib
+import statistics
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional, Set
+from langchain_core.messages import BaseMessage, HumanMessage
+from langgraph.graph import StateGraph
+
+from .data_definitions import REVISEMENT_INSTRUCTION, ReasoningState, collect_facts_from_state
+from .instrumentation import InstrumentationCallbackHandler, JsonlExporter
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# ====
+# Batch runner helper functions
+# ====
+def load_graph_factory (spec :str) -> Callable[[], Any]:
+    """
+    Load a graph factory from a "module:function" spec.
+    """
+    module_name, _, function_name = spec.partition(":")
+    assert(len(module_name) > 0 and len(function_name) > 0), f"Invalid graph factory spec (expecting module:function): {spec}"
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def create_default_rigorous_llm_graph () -> StateGraph:
+    # Deferred import: the default chatbot requires the API keys and the tool packages
+    from .graph_builders import create_default_casual_chatbot_graph_builder, create_rigorous_llm_graph
+    return create_rigorous_llm_graph(chatbot_subgraph=create_default_casual_chatbot_graph_builder())
+
+
+def compile_graph (graph :Any) -> Any:
+    # A factory may return either a graph builder or a compiled graph
+    return graph.compile() if isinstance(graph, StateGraph) else graph
+
+
+def read_queries (input_path :str, query_field :str = "query") -> Iterator[Dict]:
+    """
+    Stream the query records from a JSONL file. A record without an "id" gets its line number as id.
+    """
+    with open(input_path, "r", encoding="utf-8") as f:
+        for i_line, line in enumerate(f):
+            if (len(line.strip()) == 0):
+                continue
+            record = json.loads(line)
+            assert(query_field in record), f"Line {i_line+1}: the field {query_field} is missing"
+            yield {
+                **record,
+                "id": str(record.get("id", i_line+1)),
+                "query": record[query_field]
+            }
+
+
+def read_completed_ids (output_path :str) -> Set[str]:
+    """
+    Read the ids of the queries already completed in the results file. The failed queries are not completed (i.e., they are retried),
+    and a truncated last line (of an interrupted run) is ignored.
+    """
+    completed_ids = set()
+    if (not os.path.exists(output_path)):
+        return completed_ids
+
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if ("id" in result and "error" not in result):
+                completed_ids.add(str(result["id"]))
+    return completed_ids
+
+
+def ends_with_newline (path :str) -> bool:
+    # An empty file counts as ended
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if (f.tell() == 0):
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def create_initial_state (query :str) -> ReasoningState:
+    return {
+        "messages": [HumanMessage(query)],
+        "fact_table": [],
+        "fact_ids_by_source": {},
+        "rigorousness_required": False,
+        "extracted_statements": [],
+        "validated_statements": []
+    }
+
+
+def summarize_value (value :Any) -> Any:
+    """
+    Summarize a state update value for the traces: message contents are truncated, long lists and dicts are counted.
+    """
+    if isinstance(value, BaseMessage):
+        return {"type": value.type, "content": str(value.content)[:200]}
+    if isinstance(value, list):
+        return [summarize_value(v) for v in value] if (len(value) <= 5 and all([isinstance(v, BaseMessage) for v in value])) else {"count": len(value)}
+    if isinstance(value, dict):
+        return {"count": len(value)}
+    return value
+
+
+def compute_percentile (values :list, percentile :float) -> Optional[float]:
+    if (len(values) == 0):
+        return None
+    sorted_values = sorted(values)
+    return sorted_values[min(len(sorted_values)-1, int(round(percentile / 100.0 * (len(sorted_values)-1))))]
+
+
+# ====
+# Batch runner classes
+# ====
+class JsonlWriter:
+    """
+    A thread-safe JSONL appender, flushing every record so that the file is a valid checkpoint at any time.
+    """
+
+    def __init__ (self, path :str) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        # A truncated last line (of an interrupted run) is ended, so that it does not corrupt the next record
+        if (not ends_with_newline(path)):
+            self._file.write("\n")
+            self._file.flush()
+
+    def write (self, record :Dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+
+    def close (self) -> None:
+        with self._lock:
+            self._file.close()
+
+class BatchRunner:
+    """
+    Run the query records through a compiled graph with bounded concurrency (asyncio), writing the results and the traces as they complete.
+    """
+
+    def __init__ (
+            self,
+            graph :Any,
+            result_writer :JsonlWriter,
+            trace_writer :Optional[JsonlWriter] = None,
+            max_concurrency :int = 8,
+            report_every :int = 100,
+            metrics_handler :Optional[InstrumentationCallbackHandler] = None
+    ) -> None:
+        """
+        metrics_handler: an optional instrumentation handler given to every query run (the query id is in the metadata of its RunMetrics).
+        """
+        self.graph = compile_graph(graph)
+        self.result_writer = result_writer
+        self.trace_writer = trace_writer
+        self.max_concurrency = max_concurrency
+        self.report_every = report_every
+        self.metrics_handler = metrics_handler
+
+        self.latencies = []
+        self.n_succeeded = 0
+        self.n_failed = 0
+        self.n_skipped = 0
+        self.started_at = None
+
+    async def run_query (self, record :Dict) -> None:
+        query_id = record["id"]
+        t_start = time.perf_counter()
+        final_state = None
+        error = None
+
+        config = {"configurable": {"thread_id": f"batch-{query_id}"}, "metadata": {"query_id": query_id}}
+        if (self.metrics_handler is not None):
+            config["callbacks"] = [self.metrics_handler]
+
+        try:
+            async for mode, chunk in self.graph.astream(
+                create_initial_state(record["query"]),
+                config=config,
+                stream_mode=["updates", "values"]
+            ):
+                if (mode == "values"):
+                    final_state = chunk
+                elif (self.trace_writer is not None):
+                    for node_name, update in chunk.items():
+                        self.trace_writer.write({
+                            "id": query_id,
+                            "node": node_name,
+                            "elapsed_seconds": time.perf_counter() - t_start,
+                            "update": {k: summarize_value(v) for k, v in (update or {}).items()}
+                        })
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        latency = time.perf_counter() - t_start
+        result = {
+            "id": query_id,
+            "query": record["query"],
+            "latency_seconds": latency
+        }
+        if (error is None):
+            messages = final_state["messages"]
+            result.update({
+                "answer": str(messages[-1].content),
+                "revised": any([isinstance(m, HumanMessage) and m.content == REVISEMENT_INSTRUCTION for m in messages]),
+                "n_messages": len(messages),
+                "n_facts": len(collect_facts_from_state(final_state))
+            })
+            self.n_succeeded += 1
+            self.latencies.append(latency)
+        else:
+            result["error"] = error
+            self.n_failed += 1
+            logger.warning(f"Query {query_id} failed: {error}")
+
+        self.result_writer.write(result)
+
+        n_done = self.n_succeeded + self.n_failed
+        if (n_done % self.report_every == 0):
+            logger.info(json.dumps(self.create_report()))
+
+    async def arun (self, records :Iterator[Dict], completed_ids :Set[str]) -> Dict:
+        """
+        Run the records (skipping the completed ones), with at most max_concurrency queries in flight. The records are read lazily.
+        """
+        self.started_at = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = set()
+
+        for record in records:
+            if (record["id"] in completed_ids):
+                self.n_skipped += 1
+                continue
+
+            await semaphore.acquire()
+            task = asyncio.create_task(self.run_query(record))
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), semaphore.release()))
+
+        if (len(tasks) > 0):
+            await asyncio.gather(*tasks)
+
+        return self.create_report()
+
+    def create_report (self) -> Dict:
+        elapsed = time.perf_counter() - self.started_at
+        n_done = self.n_succeeded + self.n_failed
+        return {
+            "n_succeeded": self.n_succeeded,
+            "n_failed": self.n_failed,
+            "n_skipped": self.n_skipped,
+            "elapsed_seconds": elapsed,
+            "queries_per_second": (n_done / elapsed) if (elapsed > 0) else None,
+            "latency_p50_seconds": compute_percentile(self.latencies, 50),
+            "latency_p95_seconds": compute_percentile(self.latencies, 95),
+            "latency_mean_seconds": statistics.mean(self.latencies) if (len(self.latencies) > 0) else None
+        }
+
+
+# ====
+# Entry point
+# ====
+def main () -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="The JSONL file of the queries")
+    parser.add_argument("--output", required=True, help="The JSONL file of the results (also the checkpoint)")
+    parser.add_argument("--traces", default=None, help="The JSONL file of the per-node traces")
+    parser.add_argument("--metrics", default=None, help="The JSONL file of the per-query run metrics (see instrumentation.py)")
+    parser.add_argument("--graph-factory", default="rigorous_llm.batch_runner:create_default_rigorous_llm_graph", help="module:function returning the graph")
+    parser.add_argument("--query-field", default="query")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--report-every", type=int, default=100)
+    parser.add_argument("--restart", action="store_true", help="Discard the previous results instead of resuming")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if (args.restart):
+        for path in [args.output, args.traces, args.metrics]:
+            if (path is not None and os.path.exists(path)):
+                os.remove(path)
+
+    completed_ids = read_completed_ids(args.output)
+    if (len(completed_ids) > 0):
+        logger.info(f"Resuming: {len(completed_ids)} queries already completed in {args.output}")
+
+    result_writer = JsonlWriter(args.output)
+    trace_writer = JsonlWriter(args.traces) if (args.traces is not None) else None
+    try:
+        runner = BatchRunner(
+            graph=load_graph_factory(args.graph_factory)(),
+            result_writer=result_writer,
+            trace_writer=trace_writer,
+            max_concurrency=args.max_concurrency,
+            report_every=args.report_every,
+            metrics_handler=InstrumentationCallbackHandler(exporters=[JsonlExporter(args.metrics)]) if (args.metrics is not None) else None
+        )
+        report = asyncio.run(runner.arun(read_queries(args.input, query_field=args.query_field), completed_ids))
+    finally:
+        result_writer.close()
+        if (trace_writer is not None):
+            trace_writer.close()
+
+    print(json.dumps(report, indent=2))
+    return 0 if (report["n_failed"] == 0) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.runnables.base import Runnable, RunnableLambda
+
+from .utils import normalize_text
+from .instrumentation import record_cache_lookups
+
+
+# ====
+# Cache helper functions
+# ====
+def create_cache_key (*parts :str) -> str:
+    """
+    Create a content-addressed key (sha256 hex digest) from the given string parts.
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        assert(type(part) is str)
+        encoded_part = part.encode("utf-8")
+        # length-prefix every part, so that ("ab", "c") and ("a", "bc") do not collide
+        hasher.update(f"{len(encoded_part)}:".encode("utf-8"))
+        hasher.update(encoded_part)
+    return hasher.hexdigest()
+
+
+# ====
+# Cache classes
+# ====
+class LRUCache:
+    """
+    A thread-safe in-memory cache with LRU eviction (max_size) and optional expiration (ttl_seconds).
+    """
+
+    def __init__ (self, max_size :int = 1024, ttl_seconds :Optional[float] = None) -> None:
+        assert(max_size > 0)
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (created_at, value)
+        self._lock = threading.Lock()
+
+    def get (self, key :str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if (entry is None):
+                return None
+
+            created_at, value = entry
+            if (self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds):
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set (self, key :str, value :Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while (len(self._entries) > self.max_size):
+                self._entries.popitem(last=False)
+
+    def delete (self, key :str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear (self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__ (self) -> int:
+        return len(self._entries)
+
+class SQLiteCache:
+    """
+    An on-disk cache backed by a SQLite file. Values must be JSON serializable.
+    Entries are evicted by least-recent access (max_size) and by age (ttl_seconds).
+    """
+
+    def __init__ (
+            self,
+            db_path :str,
+            max_size :int = 100000,
+            ttl_seconds :Optional[float] = None,
+            table_name :str = "rigorous_llm_cache"
+    ) -> None:
+        assert(max_size > 0)
+        assert(table_name.isidentifier()), f"Invalid table name: {table_name}"
+        self.db_path = db_path
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.table_name = table_name
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name} (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_accessed_at ON {table_name} (accessed_at)"
+            )
+
+    def get (self, key :str) -> Optional[Any]:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                f"SELECT value, created_at FROM {self.table_name} WHERE key = ?", (key,)
+            ).fetchone()
+            if (row is None):
+                return None
+
+            value, created_at = row
+            if (self.ttl_seconds is not None and now - created_at > self.ttl_seconds):
+                self._connection.execute(f"DELETE FROM {self.table_name} WHERE key = ?", (key,))
+                return None
+
+            self._connection.execute(f"UPDATE {self.table_name} SET accessed_at = ? WHERE key = ?", (now, key))
+            return json.loads(value)
+
+    def set (self, key :str, value :Any) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.table_name} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            if (self.ttl_seconds is not None):
+                self._connection.execute(
+                    f"DELETE FROM {self.table_name} WHERE created_at < ?", (now - self.ttl_seconds,)
+                )
+            self._connection.execute(
+                f"DELETE FROM {self.table_name} WHERE key IN (SELECT key FROM {self.table_name} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,)
+            )
+
+    def delete (self, key :str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.table_name} WHERE key = ?", (key,))
+
+    def clear (self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.table_name}")
+
+    def __len__ (self) -> int:
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()[0]
+
+class TieredCache:
+    """
+    An in-memory LRU tier in front of an optional on-disk tier. Disk hits are promoted into the memory tier.
+    """
+
+    def __init__ (
+            self,
+            memory_cache :Optional[LRUCache] = None,
+            disk_cache :Optional[SQLiteCache] = None
+    ) -> None:
+        self.memory_cache = memory_cache if (memory_cache is not None) else LRUCache()
+        self.disk_cache = disk_cache
+
+    def get (self, key :str) -> Optional[Any]:
+        value = self.memory_cache.get(key)
+        if (value is None and self.disk_cache is not None):
+            value = self.disk_cache.get(key)
+            if (value is not None):
+                self.memory_cache.set(key, value)
+        return value
+
+    def set (self, key :str, value :Any) -> None:
+        self.memory_cache.set(key, value)
+        if (self.disk_cache is not None):
+            self.disk_cache.set(key, value)
+
+    def delete (self, key :str) -> None:
+        self.memory_cache.delete(key)
+        if (self.disk_cache is not None):
+            self.disk_cache.delete(key)
+
+    def clear (self) -> None:
+        self.memory_cache.clear()
+        if (self.disk_cache is not None):
+            self.disk_cache.clear()
+
+class ThreadRegistry:
+    """
+    Keep one object per conversation thread (LRU-bounded), created by the factory on first use.
+    """
+
+    def __init__ (self, factory :Callable[[], Any], max_size :int = 1024) -> None:
+        self.factory = factory
+        self.objects = LRUCache(max_size=max_size)
+        self._lock = threading.Lock()
+
+    def get (self, thread_id :Optional[str]) -> Any:
+        # Without a thread id, the object cannot be tied to a conversation: create a fresh one
+        if (thread_id is None):
+            return self.factory()
+
+        with self._lock:
+            obj = self.objects.get(thread_id)
+            if (obj is None):
+                obj = self.factory()
+                self.objects.set(thread_id, obj)
+            return obj
+
+class VerdictCache:
+    """
+    A cache of statement validation verdicts, keyed by the normalized statement.
+    Each entry keeps the verdict and the digests of the facts the statement was validated against.
+    - If the facts are unchanged, the verdict is reused.
+    - If facts were only added, a "true" verdict is kept (keep_true_on_added_facts) and a "false" verdict is re-validated.
+    - Otherwise (some facts are gone), the statement is re-validated.
+    """
+
+    def __init__ (
+            self,
+            cache = None,
+            keep_true_on_added_facts :bool = True
+    ) -> None:
+        self.cache = cache if (cache is not None) else LRUCache(max_size=10000)
+        self.keep_true_on_added_facts = keep_true_on_added_facts
+
+    @staticmethod
+    def create_fact_digests (facts :List[str]) -> List[str]:
+        return sorted(set([create_cache_key(normalize_text(f))[:16] for f in facts]))
+
+    def create_key (self, statement :str, namespace :str = "") -> str:
+        return create_cache_key(namespace, normalize_text(statement))
+
+    def lookup (self, statement :str, fact_digests :List[str], namespace :str = "") -> Optional[bool]:
+        entry = self.cache.get(self.create_key(statement=statement, namespace=namespace))
+        if (entry is None):
+            return None
+
+        if (entry["fact_digests"] == fact_digests):
+            return entry["verdict"]
+
+        if (entry["verdict"] and self.keep_true_on_added_facts and set(entry["fact_digests"]).issubset(fact_digests)):
+            return True
+
+        return None
+
+    def store (self, statement :str, fact_digests :List[str], verdict :bool, namespace :str = "") -> None:
+        self.cache.set(
+            self.create_key(statement=statement, namespace=namespace),
+            {
+                "verdict": verdict,
+                "fact_digests": fact_digests
+            }
+        )
+
+
+# ====
+# Cached runnables
+# ====
+def create_cached_runnable (runnable :Runnable, cache, namespace :str, cache_name :str = "runnable") -> Runnable:
+    """
+    Wrap a runnable (taking a dict input) with a cache. The cache key is the hash of the namespace and the JSON-encoded input.
+    The namespace should identify everything else that determines the output, e.g., the prompt template and the model name.
+    The lookups are reported to the instrumentation under cache_name.
+    """
+    def get_key (inputs :Dict) -> str:
+        return create_cache_key(namespace, json.dumps(inputs, sort_keys=True, default=str))
+
+    def invoke_with_cache (inputs :Dict) -> Any:
+        key = get_key(inputs)
+        output = cache.get(key)
+        record_cache_lookups(cache_name, n_hits=int(output is not None), n_misses=int(output is None))
+        if (output is None):
+            output = runnable.invoke(inputs)
+            cache.set(key, output)
+        return output
+
+    async def ainvoke_with_cache (inputs :Dict) -> Any:
+        key = get_key(inputs)
+        output = cache.get(key)
+        record_cache_lookups(cache_name, n_hits=int(output is not None), n_misses=int(output is None))
+        if (output is None):
+            output = await runnable.ainvoke(inputs)
+            cache.set(key, output)
+        return output
+
+    return RunnableLambda(invoke_with_cache, afunc=ainvoke_with_cache, name=f"cached_{runnable.get_name()}")
@@ -0,0 +1,93 @@
+import uuid
+import asyncio
+import threading
+from typing import Any, Awaitable, Iterable, Iterator, Optional
+
+from .caches import ThreadRegistry
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# ====
+# Cancellation classes
+# ====
+class BranchCancelledError (Exception):
+    """Raised in a branch whose cancellation scope was cancelled."""
+
+class CancellationScope:
+    """
+    A cancellation signal shared by the concurrent branches (nodes, tasks) of one graph run.
+    When a branch can no longer change the outcome, its scope is cancelled:
+    - the asyncio tasks run through `arun` are cancelled right away (including the in-flight LLM calls),
+    - the synchronous code stops at its next check (`raise_if_cancelled`, or the next item of `iterate`).
+    """
+
+    def __init__ (self) -> None:
+        self.reason :Optional[str] = None
+        self._event = threading.Event()
+        self._tasks = set() # (event loop, task)
+        self._lock = threading.Lock()
+
+    @property
+    def is_cancelled (self) -> bool:
+        return self._event.is_set()
+
+    def cancel (self, reason :str = "") -> None:
+        with self._lock:
+            if (self._event.is_set()):
+                return
+            self.reason = reason
+            self._event.set()
+            tasks = list(self._tasks)
+
+        logger.info(f"Cancellation scope cancelled: {reason}")
+        for loop, task in tasks:
+            loop.call_soon_threadsafe(task.cancel)
+
+    def raise_if_cancelled (self) -> None:
+        if (self.is_cancelled):
+            raise BranchCancelledError(self.reason)
+
+    def iterate (self, iterable :Iterable) -> Iterator:
+        """
+        Iterate (e.g., over a stream of LLM output chunks) until the scope is cancelled.
+        """
+        for item in iterable:
+            self.raise_if_cancelled()
+            yield item
+
+    async def arun (self, awaitable :Awaitable) -> Any:
+        """
+        Await the awaitable as a task which is cancelled with the scope. Raise BranchCancelledError if the scope is cancelled.
+        """
+        task = asyncio.ensure_future(awaitable)
+        entry = (asyncio.get_running_loop(), task)
+        with self._lock:
+            self._tasks.add(entry)
+        if (self.is_cancelled):
+            task.cancel()
+
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if (self.is_cancelled and task.cancelled()):
+                raise BranchCancelledError(self.reason)
+            raise
+        finally:
+            with self._lock:
+                self._tasks.discard(entry)
+
+class CancellationScopeRegistry (ThreadRegistry):
+    """
+    Keep the cancellation scopes by scope id (LRU-bounded), so that the branches of one run (sharing the id in the state) share the scope.
+    """
+
+    def __init__ (self, max_size :int = 1024) -> None:
+        super().__init__(factory=CancellationScope, max_size=max_size)
+
+    def create_scope_id (self) -> str:
+        return uuid.uuid4().hex
+
+    def get_scope (self, scope_id :Optional[str]) -> CancellationScope:
+        return self.get(scope_id)
@@ -1,9 +1,11 @@
 from langchain_core.prompts import PromptTemplate 
 from langchain_core.runnables.base import Runnable
 from langchain_core.output_parsers import StrOutputParser
-from langchain.chat_models.base import BaseChatModel 
+from langchain_core.language_models.chat_models import BaseChatModel 
 
-from .output_parsers import BooleanOutputParser, StrListOutputParser
+from .llms import get_chat_model_name
+from .caches import create_cache_key, create_cached_runnable
+from .output_parsers import BooleanOutputParser, StrListOutputParser, IndexedBooleanOutputParser
 
 
 def create_chain_for_rigorousness_judgement (llm :BaseChatModel) -> Runnable: 
@@ -20,12 +22,13 @@ Answer:
 """
     )
 
-    return (prompt_template | llm | BooleanOutputParser()) 
+    return (prompt_template | llm | BooleanOutputParser()).with_config(run_name="rigorousness_judgement_chain")
 
 
-def create_chain_for_statements_extraction (llm :BaseChatModel) -> Runnable: 
+def create_chain_for_statements_extraction (llm :BaseChatModel, cache = None) -> Runnable: 
     """
     Given a LLM, create a chain to extract statements from the given input (string/text)
+    If a cache (e.g., caches.TieredCache) is given, the chain consults it before calling the LLM. The cache key covers the prompt template, the model name, and the input. 
     """
     prompt_template = PromptTemplate.from_template(
         """You will break a text (given under 'Text:') into several short but self-contained statements. Each statement captures a piece of fact in the text. If an empty text is provided, answer with an empty. Here is an example: 
@@ -50,57 +53,110 @@ Facts:
 """
     )
     
-    return (prompt_template | llm | StrListOutputParser())
+    chain = (prompt_template | llm | StrListOutputParser())
+    if (cache is not None): 
+        chain = create_cached_runnable(
+            runnable=chain, 
+            cache=cache, 
+            namespace=create_cache_key(prompt_template.template, get_chat_model_name(llm)), 
+            cache_name="statements_extraction"
+        )
+
+    return chain.with_config(run_name="statements_extraction_chain")
 
 
 def create_chain_for_input_validation_against_facts (llm :BaseChatModel) -> Runnable: 
+    """
+    Given a LLM, create a chain to validate the given input (string/text) against the given facts. 
+    The facts come before the input in the prompt, so that the calls validating different inputs against the same facts share the same prompt prefix (friendly to the prompt prefix caching). 
+    """
     prompt_template = PromptTemplate.from_template(
-        """You will validate a given text (under 'Text:') against all given facts (under 'Fact:'). If the text satisfies one fact but fails another, you will answer "false". If no facts were provided, you must answer "false". You must reply simply "true" or "false". No further explanation for your answer. Here are some examples: 
-
-Text: 
-John is a software engineer who focuses on developing machine learning applications. 
+        """You will validate a given text (under 'Text:') against all given facts (under 'Facts:'). If the text satisfies one fact but fails another, you will answer "false". If no facts were provided, you must answer "false". You must reply simply "true" or "false". No further explanation for your answer. Here are some examples: 
 
 Facts: 
 * John is a software engineer. 
 * John focuses on developing machine learning applications. 
 
+Text: 
+John is a software engineer who focuses on developing machine learning applications. 
+
 Answer: 
 true 
 
-Text: 
-Adam works very hard. He works seven days a week. 
-
 Facts: 
 * Adam works very hard. 
 * Adam works five days a week. 
 
+Text: 
+Adam works very hard. He works seven days a week. 
+
 Answer: 
 false 
 
+Facts: 
+
 Text:
 David is smart. 
 
-Facts: 
-
 Answer:
 false
 
-Now, validate the following text with the facts provided as follows. 
+Now, validate a text with the facts provided as follows. 
+
+Facts: 
+{facts}
 
 Text: 
 {input} 
 
+Answer:
+"""
+    )
+
+    return (prompt_template | llm | BooleanOutputParser()).with_config(run_name="input_validation_against_facts_chain")
+
+
+def create_chain_for_inputs_validation_against_facts (llm :BaseChatModel) -> Runnable: 
+    """
+    Given a LLM, create a chain to validate several indexed texts against the same facts in one call. The chain returns a dict from the text indices to their judgements. 
+    As in create_chain_for_input_validation_against_facts, the facts come before the texts in the prompt. 
+    """
+    prompt_template = PromptTemplate.from_template(
+        """You will validate each of the given texts (under 'Texts:') against all given facts (under 'Facts:'). If a text satisfies one fact but fails another, the text is "false". If no facts were provided, every text is "false". For each text, you must reply with one line: its index followed by simply "true" or "false". No further explanation for your answers. Here is an example: 
+
+Facts: 
+* John is a software engineer. 
+* John focuses on developing machine learning applications. 
+* Adam works very hard. 
+* Adam works five days a week. 
+
+Texts: 
+[1] John is a software engineer who focuses on developing machine learning applications. 
+[2] Adam works very hard. He works seven days a week. 
+
+Answers: 
+[1] true 
+[2] false 
+
+Now, validate the texts with the facts provided as follows. 
+
 Facts: 
 {facts}
 
-Answer:
+Texts: 
+{inputs} 
+
+Answers:
 """
     )
 
-    return (prompt_template | llm | BooleanOutputParser())
+    return (prompt_template | llm | IndexedBooleanOutputParser()).with_config(run_name="inputs_validation_against_facts_chain")
 
 
 def create_chain_for_statements_summarization (llm :BaseChatModel) -> Runnable: 
+    """
+    Given a LLM, create a chain to summarize the given statements. The fixed instructions form the prompt prefix, and the statements come last. 
+    """
     prompt_template = PromptTemplate.from_template(
         """Summarize the statements provided under 'Statements:'. Your writeup must only include the provided statements. Do not introduce external knowledge. 
 
@@ -111,4 +167,24 @@ Summary:
 """
     )
 
-    return (prompt_template | llm | StrOutputParser())
\ No newline at end of file
+    return (prompt_template | llm | StrOutputParser()).with_config(run_name="statements_summarization_chain")
+
+
+def create_chain_for_history_summarization (llm :BaseChatModel) -> Runnable: 
+    """
+    Given a LLM, create a chain to fold the dropped turns of a conversation into its running summary. 
+    """
+    prompt_template = PromptTemplate.from_template(
+        """Summarize the conversation so far in a few sentences. Keep the user's goals, the questions asked, and the key answers. Start from the previous summary (if any) and add the new turns to it. 
+
+Previous summary: 
+{summary}
+
+New turns: 
+{transcript}
+
+Summary:
+"""
+    )
+
+    return (prompt_template | llm | StrOutputParser()).with_config(run_name="history_summarization_chain")
\ No newline at end of file
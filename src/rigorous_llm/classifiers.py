@@ -0,0 +1,81 @@
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from .utils import normalize_text
+
+
+# ====
+# Constants
+# ====
+# (pattern, weight): a positive weight is for queries requiring a rigorous answer, a negative weight for casual ones
+DEFAULT_RIGOROUSNESS_RULES :List[Tuple[str, float]] = [
+    # Factual questions
+    (r"^(what|which) (year|date|day|month|time)\b", 2.0),
+    (r"^when (is|was|were|did|does|do|will)\b", 2.0),
+    (r"^how (many|much|long|old|far|big|tall|large)\b", 2.0),
+    (r"^(who|whom) (is|was|were|founded|invented|wrote|discovered|owns|created|won)\b", 2.0),
+    (r"^where (is|was|are|were|did|does)\b", 1.5),
+    (r"^(what|who) (is|was|are|were) the\b", 1.0),
+    (r"^(is|was|are|were|did|does|do|has|have|can) it true\b", 2.0),
+    (r"\b(according to|statistics|population|capital of|founded|headquarter|ceo|gdp|revenue|price|salary|rate|percent|percentage)\b", 1.0),
+    (r"\b(cite|citation|source|sources|reference|references|evidence|fact|facts|accurate|accurately|exact|exactly)\b", 1.5),
+    (r"\b(law|legal|medical|dosage|diagnosis|tax|regulation)\b", 1.0),
+    (r"\b\d{3,4}\b", 0.5),
+    # Casual requests
+    (r"^(hi|hello|hey|yo|good (morning|afternoon|evening|night))\b", -3.0),
+    (r"^(thanks|thank you|thx|bye|goodbye|ok|okay|cool|nice|great)\b", -3.0),
+    (r"^how are you\b", -3.0),
+    (r"\b(tell|write|make up|invent|compose) (me )?(a|an|some) (story|joke|poem|song|haiku|limerick|riddle|fairy tale)\b", -3.0),
+    (r"\b(story|joke|poem|lyrics|haiku|limerick|fiction|fairy tale|bedtime)\b", -1.5),
+    (r"\b(imagine|pretend|role ?play|brainstorm|daydream)\b", -2.0),
+    (r"\b(your favorite|do you like|how do you feel|what do you think)\b", -1.5),
+    (r"\b(funny|cute|silly)\b", -1.0),
+]
+
+
+# ====
+# Classifier classes
+# ====
+class RigorousnessClassifier:
+    """
+    A local rule-based pre-classifier of the need of rigorousness of a user query.
+    The weights of the matched rules are summed (with the bias). A score at least `threshold` means True,
+    a score at most `-threshold` means False, and anything in between is ambiguous (None), to be judged by the LLM.
+    """
+
+    def __init__ (
+            self,
+            rules :Optional[List[Tuple[str, float]]] = None,
+            threshold :float = 2.0,
+            bias :float = 0.0
+    ) -> None:
+        assert(threshold > 0.0)
+        self.rules = [
+            (re.compile(pattern), weight)
+            for pattern, weight in (rules if (rules is not None) else DEFAULT_RIGOROUSNESS_RULES)
+        ]
+        self.threshold = threshold
+        self.bias = bias
+
+        # Statistics
+        self.n_classified_queries = 0
+        self.n_confident_queries = 0
+        self._lock = threading.Lock()
+
+    def compute_score (self, query :str) -> float:
+        normalized_query = normalize_text(query)
+        return self.bias + sum([weight for pattern, weight in self.rules if pattern.search(normalized_query)])
+
+    def classify (self, query :str) -> Optional[bool]:
+        """
+        Return the judgement if confident, otherwise None.
+        """
+        score = self.compute_score(query)
+        judgement = True if (score >= self.threshold) else (False if (score <= -self.threshold) else None)
+
+        with self._lock:
+            self.n_classified_queries += 1
+            self.n_confident_queries += int(judgement is not None)
+
+        return judgement
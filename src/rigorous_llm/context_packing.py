@@ -0,0 +1,149 @@
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from langchain_core.prompts import BasePromptTemplate
+
+from .instrumentation import record_context_packing
+from .utils import estimate_token_count
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# ====
+# Constants
+# ====
+# The default token budget of one prompt (the fixed instructions included)
+DEFAULT_MAX_PROMPT_TOKENS = 8000
+
+# The tokens taken by the bullet or index and the line break of a listed item
+ITEM_OVERHEAD_TOKENS = 2
+
+DEFAULT_TIKTOKEN_ENCODING = "cl100k_base"
+
+
+# ====
+# Context packing helper functions
+# ====
+@lru_cache(maxsize=None)
+def create_token_counter (model_name :Optional[str] = None) -> Callable[[str], int]:
+    """
+    Create a local token counter for the model: its tiktoken encoding if tiktoken (optional) is installed and the encoding is available,
+    else the rough estimate of utils.estimate_token_count. The counter of each model is created once.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return estimate_token_count
+
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model_name) if (model_name is not None) else tiktoken.get_encoding(DEFAULT_TIKTOKEN_ENCODING)
+        except KeyError:
+            encoding = tiktoken.get_encoding(DEFAULT_TIKTOKEN_ENCODING)
+    except Exception as e:
+        # e.g., the encoding files cannot be downloaded
+        logger.warning(f"tiktoken encoding unavailable ({type(e).__name__}), estimating the token counts instead")
+        return estimate_token_count
+
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+# ====
+# Context packing classes
+# ====
+class ContextPacker:
+    """
+    Fit the listed items of a prompt (e.g., facts, statements) into a token budget, so that the size, latency and cost of every call are bounded.
+    - pack_items keeps the most relevant items within the budget, and drops the others.
+    - split_items splits the items into consecutive chunks within the budget, one call per chunk.
+    The numbers of dropped items and extra (split) calls are counted, and reported to the instrumentation (see instrumentation.record_context_packing).
+    """
+
+    def __init__ (
+            self,
+            max_prompt_tokens :int = DEFAULT_MAX_PROMPT_TOKENS,
+            model_name :Optional[str] = None,
+            token_counter :Optional[Callable[[str], int]] = None,
+            token_count_cache_size :int = 16384
+    ) -> None:
+        """
+        max_prompt_tokens: the token budget of one prompt, for the model it is sent to.
+        model_name: the model whose tokenizer counts the tokens (see create_token_counter). Ignored if token_counter is given.
+        """
+        assert(max_prompt_tokens > 0)
+        self.max_prompt_tokens = max_prompt_tokens
+        self.count_tokens = lru_cache(maxsize=token_count_cache_size)(token_counter if (token_counter is not None) else create_token_counter(model_name))
+
+        self._lock = threading.Lock()
+        self._template_tokens :Dict[int, int] = {}
+        self.n_dropped_items = 0
+        self.n_splits = 0
+
+    def count_items_tokens (self, items :List[str]) -> int:
+        return sum([self.count_tokens(item) + ITEM_OVERHEAD_TOKENS for item in items])
+
+    def count_template_tokens (self, prompt_template :BasePromptTemplate) -> int:
+        """
+        The tokens of the fixed instructions of a prompt (the prompt with empty inputs).
+        """
+        if (id(prompt_template) not in self._template_tokens):
+            self._template_tokens[id(prompt_template)] = self.count_tokens(
+                prompt_template.format(**{name: "" for name in prompt_template.input_variables})
+            )
+        return self._template_tokens[id(prompt_template)]
+
+    def get_items_budget (self, prompt_template :BasePromptTemplate, fixed_inputs :Optional[List[str]] = None) -> int:
+        """
+        The tokens left for the listed items, in a prompt of the template with the fixed inputs (e.g., the statement to validate).
+        """
+        fixed_inputs = fixed_inputs if (fixed_inputs is not None) else []
+        return self.max_prompt_tokens - self.count_template_tokens(prompt_template) - sum(map(self.count_tokens, fixed_inputs))
+
+    def record (self, name :str, n_dropped_items :int = 0, n_splits :int = 0) -> None:
+        if (n_dropped_items + n_splits == 0):
+            return
+        with self._lock:
+            self.n_dropped_items += n_dropped_items
+            self.n_splits += n_splits
+        record_context_packing(name, n_dropped_items=n_dropped_items, n_splits=n_splits)
+
+    def pack_items (self, items :List[str], max_tokens :int, scores :Optional[Dict[str, float]] = None, name :str = "items") -> List[str]:
+        """
+        Keep the items within the budget, the highest scored first (the unscored ones last, by position), and return them in their original order.
+        The items are returned as is (the same list) if they fit.
+        """
+        if (self.count_items_tokens(items) <= max_tokens):
+            return items
+
+        scores = scores if (scores is not None) else {}
+        ranked_positions = sorted(range(len(items)), key=lambda i: (-scores.get(items[i], float("-inf")), i))
+
+        kept_positions = []
+        n_tokens = 0
+        for i in ranked_positions:
+            n_item_tokens = self.count_tokens(items[i]) + ITEM_OVERHEAD_TOKENS
+            if (n_tokens + n_item_tokens <= max_tokens):
+                kept_positions.append(i)
+                n_tokens += n_item_tokens
+
+        self.record(name, n_dropped_items=len(items) - len(kept_positions))
+        return [items[i] for i in sorted(kept_positions)]
+
+    def split_items (self, items :List[str], max_tokens :int, name :str = "items") -> List[List[str]]:
+        """
+        Split the items into consecutive chunks within the budget (an item over the budget alone makes a chunk).
+        """
+        chunks = [[]]
+        n_tokens = 0
+        for item in items:
+            n_item_tokens = self.count_tokens(item) + ITEM_OVERHEAD_TOKENS
+            if (len(chunks[-1]) > 0 and n_tokens + n_item_tokens > max_tokens):
+                chunks.append([])
+                n_tokens = 0
+            chunks[-1].append(item)
+            n_tokens += n_item_tokens
+
+        self.record(name, n_splits=len(chunks) - 1)
+        return chunks
@@ -1,15 +1,60 @@
-from typing import Annotated, List
+from typing import Annotated, Dict, List, NamedTuple, Optional, Union
 from typing_extensions import TypedDict
+from langchain_core.messages import BaseMessage, HumanMessage
 from langgraph.graph.message import add_messages
 
+from .utils import normalize_text
+
+
+# The HumanMessage added by the revisement (it does not start a new turn) 
+REVISEMENT_INSTRUCTION = "Please revise rigorously"
+
+# The revised answer without any validated statement 
+NO_RIGOROUS_ANSWER = "Sorry, I cannot answer it rigorously..."
+
+
+# ====
+# Fact table reducers 
+# ====
+class FactTableTruncation (NamedTuple): 
+    """A fact table update which drops the oldest facts (instead of appending new ones)."""
+    n_dropped_facts :int
+
+
+def update_fact_table (fact_table :List[str], update :Union[List[str], FactTableTruncation]) -> List[str]: 
+    """
+    The fact table is append-only: the ID of a fact is its position plus the fact_id_offset, and never changes. 
+    Only the history compaction drops the oldest facts (and moves the fact_id_offset accordingly). 
+    """
+    if (isinstance(update, FactTableTruncation)): 
+        return fact_table[update.n_dropped_facts:]
+    if (len(update) == 0): 
+        return fact_table 
+    return fact_table + update
+
+
+def update_fact_ids_by_source (fact_ids_a :dict, fact_ids_b :dict) -> dict: 
+    # A None value removes the source (e.g., its message was dropped by the history compaction) 
+    merged = {**fact_ids_a, **fact_ids_b}
+    if (any([fact_ids is None for fact_ids in fact_ids_b.values()])): 
+        merged = {source_id: fact_ids for source_id, fact_ids in merged.items() if fact_ids is not None}
+    return merged
+
 
 class ReasoningState (TypedDict):
     rigorousness_required :Annotated[bool, lambda x,y: y]
 
     messages :Annotated[list, add_messages]
 
+    # A summary of the turns dropped by the history compaction, if any 
+    history_summary :Annotated[Optional[str], lambda x,y: y]
+
     facts_collected :Annotated[bool, lambda x,y: y]
-    facts :Annotated[dict, lambda facts_a, facts_b: {**facts_a, **facts_b}]
+    # The facts are interned: each (normalized) fact is stored once in the append-only fact table, and referred by its ID 
+    fact_table :Annotated[list, update_fact_table]
+    fact_id_offset :Annotated[int, lambda x,y: y]
+    # The processed fact sources (the ToolMessage ids, and the fact store retrievals) and the IDs of their facts 
+    fact_ids_by_source :Annotated[dict, update_fact_ids_by_source]
 
     statements_extracted :Annotated[bool, lambda x,y: y]
     extracted_statements :Annotated[list, lambda es_a, es_b: es_b] 
@@ -17,9 +62,73 @@ class ReasoningState (TypedDict):
     # These validated statements are those extracted from the last AIMessage and were passed the validation against the facts. 
     validated_statements :Annotated[list, lambda vs_a, vs_b: vs_b] # We overwrite the previous set of statements 
 
+    # The id of the cancellation scope shared by the rigorous branches of the current turn (see cancellation.CancellationScope) 
+    cancellation_scope_id :Annotated[Optional[str], lambda x,y: y]
+
+    # The deadline (a time.time() timestamp) of the rigorous stages of the current turn, if any (see latency_controls.TurnBudget) 
+    turn_deadline :Annotated[Optional[float], lambda x,y: y]
+
+
+# ====
+# State helper functions 
+# ====
+def get_fact_table (state :ReasoningState) -> List[str]: 
+    return state.get("fact_table", None) or []
+
+
+def get_fact_id_offset (state :ReasoningState) -> int: 
+    return state.get("fact_id_offset", None) or 0
+
+
+def get_fact_ids_by_source (state :ReasoningState) -> Dict[str, List[int]]: 
+    return state.get("fact_ids_by_source", None) or {}
+
+
+def is_fact_source_processed (state :ReasoningState, source_id :str) -> bool: 
+    return source_id in get_fact_ids_by_source(state)
+
 
 def collect_facts_from_state (state :ReasoningState) -> List[str]: 
-    all_facts = [] 
-    for facts in state["facts"].values(): 
-        all_facts += facts
-    return list(set(all_facts))
\ No newline at end of file
+    """
+    Collect the facts (without duplicates) in a stable order: the insertion order of the facts. 
+    The same state always gives byte-identical fact lists, and hence byte-identical prompt prefixes for the validation. 
+    """
+    return list(get_fact_table(state))
+
+
+def collect_facts_of_source (state :ReasoningState, source_id :str) -> List[str]: 
+    # The facts dropped from the fact table (by the history compaction) are skipped 
+    fact_table = get_fact_table(state)
+    fact_id_offset = get_fact_id_offset(state)
+    return [fact_table[fact_id - fact_id_offset] for fact_id in get_fact_ids_by_source(state).get(source_id, []) if fact_id >= fact_id_offset]
+
+
+def create_facts_update (state :ReasoningState, new_facts :Dict[str, List[str]]) -> ReasoningState: 
+    """
+    Create the state update adding the new facts of each source: the facts already in the fact table are referred by their IDs, and the others are appended. 
+    """
+    fact_table = get_fact_table(state)
+    fact_id_offset = get_fact_id_offset(state)
+    fact_ids = {normalize_text(fact): fact_id_offset + i for i, fact in enumerate(fact_table)}
+
+    appended_facts = []
+    fact_ids_by_source = {}
+    for source_id, facts in new_facts.items(): 
+        source_fact_ids = []
+        for fact in facts: 
+            normalized_fact = normalize_text(fact)
+            if (normalized_fact not in fact_ids): 
+                fact_ids[normalized_fact] = fact_id_offset + len(fact_table) + len(appended_facts)
+                appended_facts.append(fact)
+            source_fact_ids.append(fact_ids[normalized_fact])
+        fact_ids_by_source[source_id] = list(dict.fromkeys(source_fact_ids))
+
+    return {
+        "fact_table": appended_facts, 
+        "fact_ids_by_source": fact_ids_by_source
+    }
+
+
+def is_user_query_message (message :BaseMessage) -> bool: 
+    # A user query starts a new turn 
+    return isinstance(message, HumanMessage) and message.content != REVISEMENT_INSTRUCTION
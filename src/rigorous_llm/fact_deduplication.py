@@ -0,0 +1,189 @@
+import hashlib
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from .caches import ThreadRegistry
+from .utils import normalize_text
+
+
+# ====
+# Deduplication helper functions
+# ====
+def create_shingles (text :str, shingle_size :int = 4) -> Set[str]:
+    """
+    Split a text into its set of (overlapping) character shingles, after normalization.
+    """
+    normalized_text = normalize_text(text)
+    if (len(normalized_text) <= shingle_size):
+        return set([normalized_text])
+    return set([normalized_text[i:i+shingle_size] for i in range(len(normalized_text) - shingle_size + 1)])
+
+
+def compute_jaccard_similarity (shingles_a :Set[str], shingles_b :Set[str]) -> float:
+    if (len(shingles_a) == 0 and len(shingles_b) == 0):
+        return 1.0
+    n_shared = len(shingles_a & shingles_b)
+    return n_shared / (len(shingles_a) + len(shingles_b) - n_shared)
+
+
+def estimate_jaccard_similarity (signature_a :List[Optional[int]], signature_b :List[Optional[int]]) -> float:
+    """
+    Estimate the Jaccard similarity from two one-permutation MinHash signatures, over the bins not empty in both.
+    """
+    n_matched, n_bins = 0, 0
+    for value_a, value_b in zip(signature_a, signature_b):
+        if (value_a is None and value_b is None):
+            continue
+        n_bins += 1
+        n_matched += (value_a == value_b)
+    return (n_matched / n_bins) if (n_bins > 0) else 1.0
+
+
+# ====
+# Deduplication classes
+# ====
+class FactDeduplicator:
+    """
+    An incremental near-duplicate detector over facts, with MinHash signatures (one-permutation hashing) and LSH banding.
+    A new fact is compared (exact Jaccard similarity over shingles) only against the facts sharing an LSH band with it,
+    and is dropped if any of them is at least `threshold` similar. The first fact of a cluster is its representative.
+    Candidates whose estimated similarity (from the signatures) is below `threshold - estimation_margin` are skipped.
+    """
+
+    def __init__ (
+            self,
+            threshold :float = 0.8,
+            num_permutations :int = 32,
+            num_bands :int = 8,
+            shingle_size :int = 4,
+            estimation_margin :float = 0.2
+    ) -> None:
+        assert(0.0 < threshold <= 1.0)
+        assert(num_permutations % num_bands == 0), "num_permutations must be a multiple of num_bands"
+        self.threshold = threshold
+        self.num_bands = num_bands
+        self.rows_per_band = num_permutations // num_bands
+        self.num_permutations = num_permutations
+        self.shingle_size = shingle_size
+        self.estimation_margin = estimation_margin
+
+        # Statistics
+        self.n_dropped_facts = 0
+        self.n_dropped_chars = 0
+
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear (self) -> None:
+        with self._lock:
+            self.facts :List[str] = []
+            self.fact_shingles :List[Set[str]] = []
+            self.fact_signatures :List[List[Optional[int]]] = []
+            self.normalized_facts :Set[str] = set()
+            self.buckets :Dict[Tuple, List[int]] = {} # (band index, band signature) -> fact ids
+
+    def create_signature (self, shingles :Set[str]) -> List[Optional[int]]:
+        # One-permutation hashing: every shingle is hashed once into one of the bins, and each bin keeps its minimum
+        # (None for an empty bin). Spurious band matches on empty bins are filtered out by the exact similarity check.
+        signature = [None] * self.num_permutations
+        for shingle in shingles:
+            h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            i, value = h % self.num_permutations, h // self.num_permutations
+            if (signature[i] is None or value < signature[i]):
+                signature[i] = value
+        return signature
+
+    def create_band_keys (self, signature :List[Optional[int]]) -> List[Tuple]:
+        return [
+            (i, tuple(signature[i*self.rows_per_band:(i+1)*self.rows_per_band]))
+            for i in range(self.num_bands)
+        ]
+
+    def find_representative (self, shingles :Set[str], signature :List[Optional[int]]) -> Optional[str]:
+        candidate_ids = set()
+        for band_key in self.create_band_keys(signature):
+            candidate_ids.update(self.buckets.get(band_key, []))
+
+        for fid in sorted(candidate_ids):
+            if (estimate_jaccard_similarity(signature, self.fact_signatures[fid]) < self.threshold - self.estimation_margin):
+                continue
+            if (compute_jaccard_similarity(shingles, self.fact_shingles[fid]) >= self.threshold):
+                return self.facts[fid]
+        return None
+
+    def is_known_fact (self, fact :str, shingles :Set[str], signature :List[Optional[int]]) -> bool:
+        return (normalize_text(fact) in self.normalized_facts) or (self.find_representative(shingles, signature) is not None)
+
+    def add_fact (self, fact :str, shingles :Set[str], signature :List[Optional[int]]) -> None:
+        fact_id = len(self.facts)
+        self.facts.append(fact)
+        self.fact_shingles.append(shingles)
+        self.fact_signatures.append(signature)
+        self.normalized_facts.add(normalize_text(fact))
+        for band_key in self.create_band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(fact_id)
+
+    def seed_facts (self, facts :List[str]) -> None:
+        """
+        Add facts as known facts, without deduplicating them (e.g., the facts already in the state).
+        """
+        with self._lock:
+            for fact in facts:
+                if (normalize_text(fact) in self.normalized_facts):
+                    continue
+                shingles = create_shingles(fact, shingle_size=self.shingle_size)
+                self.add_fact(fact, shingles, self.create_signature(shingles))
+
+    def sync_facts (self, facts :List[str]) -> None:
+        """
+        Sync the known facts with a fact table (e.g., the facts of the state): the facts after the known ones are seeded,
+        and the known facts are rebuilt if they are no longer a prefix of the table (e.g., the oldest facts were dropped by the history compaction).
+        """
+        with self._lock:
+            if (self.facts != facts[:len(self.facts)]):
+                self.clear()
+            self.seed_facts(facts[len(self.facts):])
+
+    def filter_facts (self, facts_lists :List[List[str]]) -> List[List[str]]:
+        """
+        Return the facts of each list which are not a duplicate or near-duplicate of a known fact, or of a kept fact before them, in order.
+        The known facts are left unchanged, e.g., so that they only follow the committed state (see sync_facts).
+        """
+        kept_facts = FactDeduplicator(
+            threshold=self.threshold,
+            num_permutations=self.num_permutations,
+            num_bands=self.num_bands,
+            shingle_size=self.shingle_size,
+            estimation_margin=self.estimation_margin
+        )
+        kept_facts_lists = []
+        with self._lock:
+            for facts in facts_lists:
+                kept_facts_lists.append([])
+                for fact in facts:
+                    shingles = create_shingles(fact, shingle_size=self.shingle_size)
+                    signature = self.create_signature(shingles)
+                    if (self.is_known_fact(fact, shingles, signature) or kept_facts.is_known_fact(fact, shingles, signature)):
+                        self.n_dropped_facts += 1
+                        self.n_dropped_chars += len(fact)
+                        continue
+
+                    kept_facts.add_fact(fact, shingles, signature)
+                    kept_facts_lists[-1].append(fact)
+
+        return kept_facts_lists
+
+    def __len__ (self) -> int:
+        return len(self.facts)
+
+class FactDeduplicatorRegistry (ThreadRegistry):
+    """
+    Keep one FactDeduplicator per conversation thread (LRU-bounded), so that facts are deduplicated across turns.
+    The known facts of a thread follow the fact table of its state (see FactDeduplicator.sync_facts).
+    """
+
+    def __init__ (self, threshold :float = 0.8, max_size :int = 1024) -> None:
+        super().__init__(factory=lambda: FactDeduplicator(threshold=threshold), max_size=max_size)
+
+    def get_deduplicator (self, thread_id :Optional[str]) -> FactDeduplicator:
+        return self.get(thread_id)
@@ -0,0 +1,133 @@
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from .caches import ThreadRegistry
+from .utils import normalize_text
+
+
+# ====
+# Constants
+# ====
+STOP_WORDS = frozenset([
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "by", "for", "with", "from", "as",
+    "is", "are", "was", "were", "be", "been", "being", "it", "its", "this", "that", "these", "those",
+    "he", "she", "they", "them", "his", "her", "their", "which", "who", "whom", "what", "has", "have", "had",
+    "do", "does", "did", "not", "no", "so", "than", "then", "there", "about", "into", "also"
+])
+
+
+# ====
+# Index helper functions
+# ====
+def tokenize_text (text :str) -> List[str]:
+    """
+    Split a text into lowercase word tokens, without stop words.
+    """
+    return [t for t in re.findall(r"\w+", text.lower()) if t not in STOP_WORDS]
+
+
+# ====
+# Fact index classes
+# ====
+class FactIndex:
+    """
+    An in-process BM25 inverted index over facts.
+    Facts are added incrementally. Adding a fact already in the index (after normalization) is a no-op.
+    """
+
+    def __init__ (self, k1 :float = 1.5, b :float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear (self) -> None:
+        with self._lock:
+            self.facts :List[str] = []
+            self.fact_ids_by_normalized_fact :Dict[str, int] = {}
+            self.postings :Dict[str, Dict[int, int]] = {} # token -> {fact id -> term frequency}
+            self.fact_lengths :List[int] = []
+            self.total_fact_length = 0
+
+    def add_facts (self, facts :List[str]) -> int:
+        """
+        Add facts into the index, and return the number of facts newly added.
+        """
+        n_added = 0
+        with self._lock:
+            for fact in facts:
+                normalized_fact = normalize_text(fact)
+                if (normalized_fact in self.fact_ids_by_normalized_fact):
+                    continue
+
+                fact_id = len(self.facts)
+                self.facts.append(fact)
+                self.fact_ids_by_normalized_fact[normalized_fact] = fact_id
+
+                tokens = tokenize_text(fact)
+                for token, tf in Counter(tokens).items():
+                    self.postings.setdefault(token, {})[fact_id] = tf
+
+                self.fact_lengths.append(len(tokens))
+                self.total_fact_length += len(tokens)
+                n_added += 1
+
+        return n_added
+
+    def sync_facts (self, facts :List[str]) -> None:
+        """
+        Sync the index with a fact table (e.g., the facts of the state): the facts after the indexed ones are added,
+        and the index is rebuilt if the indexed facts are no longer a prefix of the table (e.g., the oldest facts were dropped by the history compaction).
+        """
+        with self._lock:
+            if (self.facts != facts[:len(self.facts)]):
+                self.clear()
+            self.add_facts(facts[len(self.facts):])
+
+    def search (self, query :str, top_k :int, min_score :float = 0.0) -> List[Tuple[str, float]]:
+        """
+        Return the top-k (fact, score) pairs relevant to the query, with scores above min_score, ordered by descending score.
+        """
+        with self._lock:
+            n_facts = len(self.facts)
+            if (n_facts == 0):
+                return []
+
+            avg_fact_length = self.total_fact_length / n_facts
+            scores :Dict[int, float] = {}
+
+            for token in set(tokenize_text(query)):
+                token_postings = self.postings.get(token, None)
+                if (token_postings is None):
+                    continue
+
+                idf = math.log(1.0 + (n_facts - len(token_postings) + 0.5) / (len(token_postings) + 0.5))
+                for fact_id, tf in token_postings.items():
+                    length_norm = 1.0 - self.b + self.b * self.fact_lengths[fact_id] / max(avg_fact_length, 1e-9)
+                    scores[fact_id] = scores.get(fact_id, 0.0) + idf * tf * (self.k1 + 1.0) / (tf + self.k1 * length_norm)
+
+            ranked_fact_ids = sorted(
+                [fid for fid, score in scores.items() if score > min_score],
+                key=lambda fid: (-scores[fid], fid)
+            )[:top_k]
+
+            return [(self.facts[fid], scores[fid]) for fid in ranked_fact_ids]
+
+    def __len__ (self) -> int:
+        return len(self.facts)
+
+class FactIndexRegistry (ThreadRegistry):
+    """
+    Keep one FactIndex per conversation thread (LRU-bounded), so that the index grows incrementally across turns.
+    The index of a thread follows the fact table of its state (see FactIndex.sync_facts).
+    """
+
+    def __init__ (self, max_size :int = 1024) -> None:
+        super().__init__(factory=FactIndex, max_size=max_size)
+
+    def get_index (self, thread_id :Optional[str]) -> FactIndex:
+        return self.get(thread_id)
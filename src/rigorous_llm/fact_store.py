@@ -0,0 +1,219 @@
+import re
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from .caches import create_cache_key
+from .fact_index import tokenize_text
+
+
+# ====
+# Constants
+# ====
+# The max number of facts looked up by one query (see SQLiteFactStore.has_facts)
+FACT_LOOKUP_BATCH_SIZE = 500
+
+
+# ====
+# Fact store helper functions
+# ====
+def create_source_hash (source_content :str) -> str:
+    return create_cache_key(source_content)
+
+
+def find_source_url (source_content :str) -> Optional[str]:
+    """
+    Find the URL of a source (e.g., a search result entry {"url": ..., "content": ...}), if any.
+    """
+    try:
+        entry = json.loads(source_content)
+        if (isinstance(entry, dict) and isinstance(entry.get("url", None), str)):
+            return entry["url"]
+    except (TypeError, ValueError):
+        pass
+    # A chunk of a long entry is not valid JSON anymore
+    matched = re.search(r"\"url\":\s*\"([^\"]+)\"", source_content)
+    return matched.group(1) if (matched is not None) else None
+
+
+def create_fts_query (query :str) -> Optional[str]:
+    """
+    Create an FTS5 query matching any of the (quoted) tokens of the query.
+    """
+    tokens = list(dict.fromkeys(tokenize_text(query)))
+    if (len(tokens) == 0):
+        return None
+    return " OR ".join([f"\"{t}\"" for t in tokens])
+
+
+# ====
+# Fact store classes
+# ====
+class SQLiteFactStore:
+    """
+    A persistent fact store, shared across threads, sessions and processes (a SQLite file in WAL mode).
+    - The facts are stored by source: the hash of the source content (e.g., a chunk of a tool message) maps to the facts extracted from it,
+      so the same source is never extracted twice (until it expires).
+    - Every source keeps its provenance: the URL (if any), the tool name, the model which extracted the facts, and when.
+    - The facts are indexed (FTS5, BM25) for the lookup of the facts relevant to a query.
+    - The sources expire after ttl_seconds (None: never), and their facts with them.
+    """
+
+    def __init__ (
+            self,
+            db_path :str,
+            ttl_seconds :Optional[float] = 7 * 24 * 3600,
+            table_prefix :str = "rigorous_llm_fact_store"
+    ) -> None:
+        assert(table_prefix.isidentifier()), f"Invalid table prefix: {table_prefix}"
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.sources_table = f"{table_prefix}_sources"
+        self.facts_table = f"{table_prefix}_facts"
+        self.fts_table = f"{table_prefix}_fts"
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30.0)
+        with self._lock, self._connection:
+            if (db_path != ":memory:"):
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.sources_table} (source_hash TEXT PRIMARY KEY, url TEXT, tool_name TEXT, model_name TEXT, created_at REAL NOT NULL, expires_at REAL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.sources_table}_expires_at ON {self.sources_table} (expires_at)"
+            )
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.facts_table} (fact_id INTEGER PRIMARY KEY, source_hash TEXT NOT NULL, fact TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.facts_table}_source_hash ON {self.facts_table} (source_hash)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.facts_table}_fact ON {self.facts_table} (fact)"
+            )
+            # The lexical index is an external-content FTS5 table, kept in sync with the facts table by triggers
+            self._connection.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.fts_table} USING fts5(fact, content='{self.facts_table}', content_rowid='fact_id')"
+            )
+            self._connection.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.facts_table}_after_insert AFTER INSERT ON {self.facts_table} BEGIN "
+                f"INSERT INTO {self.fts_table} (rowid, fact) VALUES (new.fact_id, new.fact); END"
+            )
+            self._connection.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {self.facts_table}_after_delete AFTER DELETE ON {self.facts_table} BEGIN "
+                f"INSERT INTO {self.fts_table} ({self.fts_table}, rowid, fact) VALUES ('delete', old.fact_id, old.fact); END"
+            )
+        self.delete_expired()
+
+    def get_facts (self, source_hash :str) -> Optional[List[str]]:
+        """
+        Return the facts of a source, or None if the source is unknown (or expired). A source without any fact gives [].
+        """
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT expires_at FROM {self.sources_table} WHERE source_hash = ?", (source_hash,)
+            ).fetchone()
+            if (row is None or (row[0] is not None and row[0] < time.time())):
+                return None
+            return [fact for (fact,) in self._connection.execute(
+                f"SELECT fact FROM {self.facts_table} WHERE source_hash = ? ORDER BY fact_id", (source_hash,)
+            )]
+
+    def put_facts (
+            self,
+            source_hash :str,
+            facts :List[str],
+            url :Optional[str] = None,
+            tool_name :Optional[str] = None,
+            model_name :Optional[str] = None
+    ) -> None:
+        """
+        Store the facts extracted from a source (replacing the previous ones, if any), and delete the expired sources.
+        """
+        now = time.time()
+        expires_at = (now + self.ttl_seconds) if (self.ttl_seconds is not None) else None
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.facts_table} WHERE source_hash = ?", (source_hash,))
+            self._connection.execute(
+                f"INSERT OR REPLACE INTO {self.sources_table} (source_hash, url, tool_name, model_name, created_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (source_hash, url, tool_name, model_name, now, expires_at)
+            )
+            self._connection.executemany(
+                f"INSERT INTO {self.facts_table} (source_hash, fact) VALUES (?, ?)",
+                [(source_hash, fact) for fact in facts]
+            )
+            self.delete_expired_unlocked(now)
+
+    def search (self, query :str, top_k :int) -> List[Dict]:
+        """
+        Return the (unexpired) facts most relevant to the query (by BM25), best first, each with its score and provenance.
+        """
+        fts_query = create_fts_query(query)
+        if (fts_query is None):
+            return []
+
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT f.fact, -bm25({self.fts_table}) AS score, s.source_hash, s.url, s.tool_name, s.model_name, s.created_at "
+                f"FROM {self.fts_table} JOIN {self.facts_table} f ON f.fact_id = {self.fts_table}.rowid "
+                f"JOIN {self.sources_table} s ON s.source_hash = f.source_hash "
+                f"WHERE {self.fts_table} MATCH ? AND (s.expires_at IS NULL OR s.expires_at >= ?) "
+                f"ORDER BY bm25({self.fts_table}) LIMIT ?",
+                # The same fact may come from several sources: over-fetch, then keep the best-scored of each
+                (fts_query, time.time(), top_k * 2)
+            ).fetchall()
+
+        results = {}
+        for fact, score, source_hash, url, tool_name, model_name, created_at in rows:
+            if (fact not in results):
+                results[fact] = {
+                    "fact": fact,
+                    "score": score,
+                    "source_hash": source_hash,
+                    "url": url,
+                    "tool_name": tool_name,
+                    "model_name": model_name,
+                    "created_at": created_at
+                }
+        return list(results.values())[:top_k]
+
+    def has_facts (self, facts :List[str]) -> bool:
+        """
+        Whether all the given facts are stored (exactly, from an unexpired source).
+        """
+        unique_facts = list(dict.fromkeys(facts))
+        found_facts = set()
+        now = time.time()
+        with self._lock:
+            # Batched lookups, within the limit of the SQLite variables
+            for i_start in range(0, len(unique_facts), FACT_LOOKUP_BATCH_SIZE):
+                batch = unique_facts[i_start:i_start+FACT_LOOKUP_BATCH_SIZE]
+                found_facts.update([fact for (fact,) in self._connection.execute(
+                    f"SELECT DISTINCT f.fact FROM {self.facts_table} f JOIN {self.sources_table} s ON s.source_hash = f.source_hash "
+                    f"WHERE f.fact IN ({', '.join(['?'] * len(batch))}) AND (s.expires_at IS NULL OR s.expires_at >= ?)",
+                    (*batch, now)
+                )])
+        return len(found_facts) == len(unique_facts)
+
+    def delete_expired_unlocked (self, now :float) -> None:
+        self._connection.execute(
+            f"DELETE FROM {self.facts_table} WHERE source_hash IN (SELECT source_hash FROM {self.sources_table} WHERE expires_at < ?)", (now,)
+        )
+        self._connection.execute(f"DELETE FROM {self.sources_table} WHERE expires_at < ?", (now,))
+
+    def delete_expired (self) -> None:
+        with self._lock, self._connection:
+            self.delete_expired_unlocked(time.time())
+
+    def clear (self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.facts_table}")
+            self._connection.execute(f"DELETE FROM {self.sources_table}")
+
+    def __len__ (self) -> int:
+        # The number of stored facts
+        with self._lock:
+            return self._connection.execute(f"SELECT COUNT(*) FROM {self.facts_table}").fetchone()[0]
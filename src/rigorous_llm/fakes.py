@@ -0,0 +1,304 @@
+import re
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool, StructuredTool
+from langchain_core.language_models.chat_models import BaseChatModel
+from langgraph.graph import StateGraph, START, END
+
+from .graph_builders import BasicChatModelNode, BasicToolNode, basic_chat_model_conditional_edges, create_graph_node, create_rigorous_llm_graph
+from .data_definitions import ReasoningState
+from .utils import estimate_token_count
+
+
+# ====
+# Scripted responses of the rigorous prompts (see chains.py)
+# ====
+def split_into_sentences (text :str) -> List[str]:
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", text) if len(s.strip()) > 0]
+
+
+def find_last_section (prompt :str, header :str, next_header :Optional[str] = None) -> str:
+    section = prompt.rsplit(header, 1)[-1]
+    if (next_header is not None):
+        section = section.split(next_header, 1)[0]
+    return section.strip()
+
+
+def script_statements_extraction (prompt :str) -> str:
+    # One statement per sentence of the text
+    return "\n".join([f"* {s}" for s in split_into_sentences(find_last_section(prompt, "Text:", "Facts:"))])
+
+
+def script_batch_validation (prompt :str) -> str:
+    indices = re.findall(r"^\[(\d+)\]", find_last_section(prompt, "Texts:", "Answers:"), flags=re.MULTILINE)
+    return "\n".join([f"[{i}] true" for i in indices])
+
+
+def script_statements_summarization (prompt :str) -> str:
+    statements = find_last_section(prompt, "Statements:", "Summary:").splitlines()
+    return " ".join([s.lstrip("* ").strip() for s in statements if len(s.strip()) > 0])
+
+
+def script_history_summarization (prompt :str) -> str:
+    # The previous summary followed by the first sentence of each new user query
+    summary = find_last_section(prompt, "Previous summary:", "New turns:").replace("(none)", "")
+    queries = [line[len("human:"):].strip() for line in find_last_section(prompt, "New turns:", "Summary:").splitlines() if line.startswith("human:")]
+    return " ".join([summary] + [f"The user asked: {split_into_sentences(q)[0]}" for q in queries if len(q) > 0]).strip()
+
+
+DEFAULT_RIGOROUS_LLM_SCRIPT :List[Tuple[str, Any]] = [
+    (r"requires a rigorous answer", "true"),
+    (r"break the following text", script_statements_extraction),
+    (r"validate each of the given texts", script_batch_validation),
+    (r"validate a given text", "true"),
+    (r"^Summarize the statements", script_statements_summarization),
+    (r"^Summarize the conversation", script_history_summarization),
+]
+
+
+# ====
+# Scripted chat model
+# ====
+class LatencyModel:
+    """
+    A seeded latency distribution (in seconds) of the scripted LLM calls.
+    - constant: always mean_seconds.
+    - uniform: uniform in mean_seconds +/- spread.
+    - lognormal: lognormal with the given mean and sigma = spread (a heavy right tail, like real LLM latencies).
+    """
+
+    DISTRIBUTIONS = ["constant", "uniform", "lognormal"]
+
+    def __init__ (
+            self,
+            distribution :str = "constant",
+            mean_seconds :float = 0.0,
+            spread :float = 0.0,
+            seed :int = 0
+    ) -> None:
+        assert(distribution in self.DISTRIBUTIONS), f"Unknown distribution: {distribution}"
+        self.distribution = distribution
+        self.mean_seconds = mean_seconds
+        self.spread = spread
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample (self) -> float:
+        with self._lock:
+            if (self.distribution == "uniform"):
+                return max(0.0, self._random.uniform(self.mean_seconds - self.spread, self.mean_seconds + self.spread))
+            if (self.distribution == "lognormal" and self.mean_seconds > 0):
+                # mu is chosen so that the mean of the distribution is mean_seconds
+                return self._random.lognormvariate(math.log(self.mean_seconds) - self.spread ** 2 / 2.0, self.spread)
+            return self.mean_seconds
+
+class ScriptedChatModel (BaseChatModel):
+    """
+    A chat model replying with scripted responses, without any network call (e.g., for tests, benchmarks and offline batch runs).
+    - The first rule whose pattern matches the prompt (the message contents, joined) gives the response: a string, or a function of the prompt.
+    - Once tools are bound, a HumanMessage (last) is answered with a call of the first tool, and a ToolMessage (last) with the tool contents.
+    - Every call waits latency_seconds, or a latency sampled from latency_model (a LatencyModel) if given.
+      The words of the response are then generated token_latency_seconds apart (streamed one by one, if the call is streamed).
+    - The token usage (usage_metadata) of every response is estimated with utils.estimate_token_count.
+    """
+
+    rules :List[Tuple[str, Any]] = []
+    default_response :str = "I don't know."
+    latency_seconds :float = 0.0
+    latency_model :Optional[Any] = None
+    token_latency_seconds :float = 0.0
+    model_name :str = "scripted-chat-model"
+    tool_name :Optional[str] = None
+
+    @property
+    def _llm_type (self) -> str:
+        return "scripted"
+
+    def create_response (self, messages :List[BaseMessage]) -> AIMessage:
+        last_message = messages[-1]
+
+        if (self.tool_name is not None and isinstance(last_message, HumanMessage)):
+            return AIMessage("", tool_calls=[{
+                "name": self.tool_name,
+                "args": {"query": last_message.content},
+                "id": f"call_{uuid.uuid4().hex[:12]}"
+            }])
+
+        if (self.tool_name is not None and isinstance(last_message, ToolMessage)):
+            try:
+                results = json.loads(last_message.content)
+                return AIMessage(" ".join([str(r.get("content", r)) if isinstance(r, dict) else str(r) for r in results]))
+            except (json.JSONDecodeError, TypeError, AttributeError):
+                return AIMessage(str(last_message.content))
+
+        prompt = "\n".join([str(m.content) for m in messages])
+        for pattern, response in self.rules:
+            if (re.search(pattern, prompt, flags=re.MULTILINE)):
+                return AIMessage(response(prompt) if callable(response) else response)
+        return AIMessage(self.default_response)
+
+    def create_result (self, messages :List[BaseMessage]) -> ChatResult:
+        response = self.create_response(messages)
+        input_tokens = sum([estimate_token_count(str(m.content)) for m in messages])
+        output_tokens = estimate_token_count(str(response.content))
+        response.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def sample_latency (self) -> float:
+        return self.latency_model.sample() if (self.latency_model is not None) else self.latency_seconds
+
+    def get_generation_seconds (self, result :ChatResult) -> float:
+        # The time to generate the words after the first one, as if streamed
+        n_words = len(str(result.generations[0].message.content).split())
+        return self.token_latency_seconds * max(0, n_words - 1)
+
+    def _generate (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = self.create_result(messages)
+        latency = self.sample_latency() + self.get_generation_seconds(result)
+        if (latency > 0):
+            time.sleep(latency)
+        return result
+
+    async def _agenerate (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        result = self.create_result(messages)
+        latency = self.sample_latency() + self.get_generation_seconds(result)
+        if (latency > 0):
+            await asyncio.sleep(latency)
+        return result
+
+    def create_chunks (self, messages :List[BaseMessage]) -> List[ChatGenerationChunk]:
+        response = self.create_result(messages).generations[0].message
+        if (len(response.tool_calls) > 0):
+            return [ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": i}
+                    for i, tc in enumerate(response.tool_calls)
+                ],
+                usage_metadata=response.usage_metadata
+            ))]
+
+        words = re.findall(r"\S+\s*", str(response.content)) or [""]
+        return [
+            ChatGenerationChunk(message=AIMessageChunk(
+                content=word,
+                # The token usage comes with the last chunk, as in the OpenAI streams
+                usage_metadata=response.usage_metadata if (i == len(words)-1) else None
+            ))
+            for i, word in enumerate(words)
+        ]
+
+    def _stream (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        latency = self.sample_latency()
+        if (latency > 0):
+            time.sleep(latency)
+        for i, chunk in enumerate(self.create_chunks(messages)):
+            if (i > 0 and self.token_latency_seconds > 0):
+                time.sleep(self.token_latency_seconds)
+            yield chunk
+
+    async def _astream (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        latency = self.sample_latency()
+        if (latency > 0):
+            await asyncio.sleep(latency)
+        for i, chunk in enumerate(self.create_chunks(messages)):
+            if (i > 0 and self.token_latency_seconds > 0):
+                await asyncio.sleep(self.token_latency_seconds)
+            yield chunk
+
+    def bind_tools (self, tools :List[BaseTool], **kwargs) -> "ScriptedChatModel":
+        return self.model_copy(update={"tool_name": tools[0].name if (len(tools) > 0) else None})
+
+
+def create_scripted_chat_model_for_rigorous_llm (
+        latency_seconds :float = 0.0,
+        latency_model :Optional[LatencyModel] = None
+) -> ScriptedChatModel:
+    """
+    Create a scripted chat model answering the rigorous prompts: every query requires rigorousness, every statement is valid.
+    """
+    return ScriptedChatModel(rules=DEFAULT_RIGOROUS_LLM_SCRIPT, latency_seconds=latency_seconds, latency_model=latency_model)
+
+
+# ====
+# Scripted tools and graphs
+# ====
+def create_scripted_search_tool (
+        search :Optional[Callable[[str], List[str]]] = None,
+        name :str = "scripted_search"
+) -> BaseTool:
+    """
+    Create a search tool returning scripted contents (as a list of {"url", "content"}, like the Tavily search results).
+    search: a function from the query to the contents. By default, one content restating the query.
+    """
+    def run_search (query :str) -> List[Dict]:
+        contents = search(query) if (search is not None) else [f"The query was: {query.strip()}"]
+        return [
+            {"url": f"https://example.com/{i}", "content": content}
+            for i, content in enumerate(contents)
+        ]
+
+    return StructuredTool.from_function(
+        func=run_search,
+        name=name,
+        description="Search the scripted documents for the query."
+    )
+
+
+def create_scripted_chatbot_graph_builder (
+        chat_model :Optional[ScriptedChatModel] = None,
+        search_tool :Optional[BaseTool] = None
+) -> StateGraph:
+    """
+    Create a chatbot graph, like graph_builders.create_default_casual_chatbot_graph_builder, with a scripted chat model and search tool.
+    """
+    chat_model = chat_model if (chat_model is not None) else create_scripted_chat_model_for_rigorous_llm()
+    search_tool = search_tool if (search_tool is not None) else create_scripted_search_tool()
+
+    graph_builder = StateGraph(ReasoningState)
+
+    graph_builder.add_node(BasicChatModelNode.name, create_graph_node(BasicChatModelNode(chat_model=chat_model.bind_tools([search_tool]))))
+    graph_builder.add_edge(START, BasicChatModelNode.name)
+
+    graph_builder.add_node(BasicToolNode.name, create_graph_node(BasicToolNode(tools=[search_tool])))
+    graph_builder.add_edge(BasicToolNode.name, BasicChatModelNode.name)
+
+    graph_builder.add_conditional_edges(
+        BasicChatModelNode.name,
+        basic_chat_model_conditional_edges,
+        {
+            BasicToolNode.name: BasicToolNode.name,
+            END: END
+        }
+    )
+
+    return graph_builder
+
+
+def create_scripted_rigorous_llm_graph (
+        latency_seconds :float = 0.0,
+        chat_model :Optional[ScriptedChatModel] = None,
+        search_tool :Optional[BaseTool] = None,
+        **kwargs
+) -> StateGraph:
+    """
+    Create the rigorous LLM graph over the scripted chat model and search tool, e.g., for offline runs of batch_runner:
+
+        python -m rigorous_llm.batch_runner --graph-factory rigorous_llm.fakes:create_scripted_rigorous_llm_graph ...
+
+    The other keyword arguments are passed to graph_builders.create_rigorous_llm_graph.
+    """
+    chat_model = chat_model if (chat_model is not None) else create_scripted_chat_model_for_rigorous_llm(latency_seconds=latency_seconds)
+    return create_rigorous_llm_graph(
+        chatbot_subgraph=create_scripted_chatbot_graph_builder(chat_model=chat_model, search_tool=search_tool),
+        chat_model=chat_model,
+        **kwargs
+    )
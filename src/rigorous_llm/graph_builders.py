@@ -1,18 +1,38 @@
 import os 
 import json 
-from typing import Dict
+import time 
+import asyncio 
+import threading 
+import contextvars 
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from functools import cached_property, partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from langchain_core.messages import ToolMessage, AIMessage, HumanMessage
-from langchain_core.runnables.base import Runnable
-from langchain.chat_models.base import BaseChatModel 
+from langchain_core.runnables.base import Runnable, RunnableLambda
+from langchain_core.runnables.config import ensure_config
+from langchain_core.language_models.chat_models import BaseChatModel 
 from langgraph.graph import StateGraph, START, END
 
-from .llms import create_default_openai_llm
-from .data_definitions import ReasoningState, collect_facts_from_state
-from .chains import create_chain_for_rigorousness_judgement, create_chain_for_statements_extraction, create_chain_for_input_validation_against_facts, create_chain_for_statements_summarization
-from .utils import encode_text_list_to_bulleted_paragraph, find_last_chat_message
+from .llms import get_default_chat_model, resolve_chat_model, get_chat_model_name
+from .caches import VerdictCache, create_cache_key
+from .fact_index import FactIndex, FactIndexRegistry
+from .fact_store import create_source_hash, find_source_url
+from .fact_deduplication import FactDeduplicatorRegistry
+from .verifiers import LocalStatementVerifier
+from .classifiers import RigorousnessClassifier
+from .cancellation import BranchCancelledError, CancellationScope, CancellationScopeRegistry
+from .instrumentation import record_cache_lookups
+from .context_packing import ContextPacker
+from .history_compaction import HistoryCompactionPolicy, create_chat_history
+from .latency_controls import DeadlineExceededError, LatencyPolicy, TurnBudget, llm_call_deadline
+from .streaming import FACTS_COLLECTED_EVENT, STATEMENTS_EXTRACTED_EVENT, STATEMENT_VERIFIED_EVENT, write_progress_event
+from .rate_limiters import PRIORITY_BACKGROUND, PRIORITY_CRITICAL, PRIORITY_NORMAL, get_llm_call_priority, llm_call_priority
+from .data_definitions import NO_RIGOROUS_ANSWER, REVISEMENT_INSTRUCTION, ReasoningState, collect_facts_from_state, create_facts_update, is_fact_source_processed
+from .chains import create_chain_for_rigorousness_judgement, create_chain_for_statements_extraction, create_chain_for_input_validation_against_facts, create_chain_for_inputs_validation_against_facts, create_chain_for_statements_summarization, create_chain_for_history_summarization
+from .utils import encode_text_list_to_bulleted_paragraph, encode_text_list_to_indexed_paragraph, find_last_chat_message, normalize_text, split_tool_content_into_chunks
 
 import logging 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 # ====
@@ -20,6 +40,104 @@ logging.basicConfig(level=logging.INFO)
 # ====
 KEY_CHATBOT_SUBGRAPH = "chatbot_subgraph"
 
+# The default upper bound of concurrent LLM/tool calls made by one node 
+DEFAULT_MAX_CONCURRENCY = 8
+
+# The default token budget of a tool message chunk for the facts extraction 
+DEFAULT_CHUNK_MAX_TOKENS = 2000
+
+# The default time a streamed statement waits for more statements to fill its validation batch (see StatementsPipelineNode) 
+DEFAULT_MICRO_BATCH_TIMEOUT_SECONDS = 0.1
+
+# The attribute of the rigorous graph builder holding the keyword arguments of create_rigorous_llm_graph 
+RIGOROUS_LLM_SETTINGS_ATTRIBUTE = "rigorous_llm_settings"
+
+
+# ====
+# Graph node helper functions 
+# ====
+def create_graph_node (node) -> Runnable: 
+    """
+    Wrap a node object (with __call__ and acall) into a runnable, so that graph.ainvoke/astream awaits node.acall instead of running __call__ in a thread. 
+    If the node has an llm_call_priority, its LLM calls are made with that priority (see rate_limiters.py). 
+    If the node is bounded_by_turn_deadline, its LLM calls give up at the turn deadline in the state, if any (see latency_controls.TurnBudget). 
+    """
+    priority = getattr(node, "llm_call_priority", None)
+    bounded_by_turn_deadline = getattr(node, "bounded_by_turn_deadline", False)
+    if (priority is None and not bounded_by_turn_deadline): 
+        return RunnableLambda(node, afunc=node.acall, name=node.name)
+
+    def get_call_controls (state): 
+        return (
+            llm_call_priority(priority if (priority is not None) else get_llm_call_priority()), 
+            llm_call_deadline(state.get("turn_deadline", None) if (bounded_by_turn_deadline) else None)
+        )
+
+    def call_with_controls (state): 
+        priority_context, deadline_context = get_call_controls(state)
+        with priority_context, deadline_context: 
+            return node(state)
+
+    async def acall_with_controls (state): 
+        priority_context, deadline_context = get_call_controls(state)
+        with priority_context, deadline_context: 
+            return await node.acall(state)
+
+    return RunnableLambda(call_with_controls, afunc=acall_with_controls, name=node.name)
+
+def resolve_chain_llm (
+        chat_model :Optional[BaseChatModel], 
+        latency_policy :Optional[LatencyPolicy], 
+        chain_name :str, 
+        streaming :Optional[bool] = None
+) -> BaseChatModel: 
+    """
+    Resolve the chat model of a chain (the shared default one if None), under the latency policy (if any) of the chain. 
+    streaming: whether the calls may be streamed under the latency policy (see LatencyPolicy.wrap_chat_model). 
+    """
+    llm = resolve_chat_model(chat_model)
+    return latency_policy.wrap_chat_model(llm, chain_name=chain_name, streaming=streaming) if (latency_policy is not None) else llm 
+
+def replace_deadline_errors (results :list, default = None) -> list: 
+    """
+    Replace the results (of a batch with return_exceptions=True) past their deadline by the default, and raise any other error. 
+    """
+    for result in results: 
+        if (isinstance(result, Exception) and not isinstance(result, DeadlineExceededError)): 
+            raise result 
+
+    n_deadline_exceeded = len([result for result in results if isinstance(result, DeadlineExceededError)])
+    if (n_deadline_exceeded > 0): 
+        logger.warning(f"{n_deadline_exceeded} out of {len(results)} LLM calls past their deadline")
+    return [default if isinstance(result, DeadlineExceededError) else result for result in results]
+
+def get_thread_id () -> Optional[str]: 
+    """
+    Get the thread id (config["configurable"]["thread_id"]) of the running graph, if any. 
+    """
+    return ensure_config().get("configurable", {}).get("thread_id", None)
+
+def get_cancellation_scope (cancellation_scope_registry :Optional[CancellationScopeRegistry], state :ReasoningState) -> CancellationScope: 
+    """
+    Get the cancellation scope of the current turn (by the scope id in the state). Without a registry, the scope is not shared with other branches. 
+    """
+    if (cancellation_scope_registry is None): 
+        return CancellationScope()
+    return cancellation_scope_registry.get_scope(state.get("cancellation_scope_id", None))
+
+def has_fact_sources (state :ReasoningState, fact_store = None) -> bool: 
+    """
+    Check if there are facts, or tool messages to collect facts from, or (if a fact store is given) stored facts relevant to the last user query. 
+    """
+    if (
+        len(collect_facts_from_state(state)) > 0 or 
+        any([isinstance(message, ToolMessage) and not is_fact_source_processed(state, message.id) for message in state["messages"]])
+    ): 
+        return True 
+
+    last_user_message = find_last_chat_message(state["messages"], message_type=HumanMessage, return_none_for_not_found=True)
+    return (fact_store is not None and last_user_message is not None and len(fact_store.search(last_user_message.content, top_k=1)) > 0)
+
 
 # ====
 # Basic graph nodes and conditional edges 
@@ -28,6 +146,7 @@ class BasicChatModelNode:
     """A node that runs the LLM for the last HumanMessage."""
 
     name :str = "default_casual_chatbot"
+    llm_call_priority :int = PRIORITY_CRITICAL
 
     def __init__(self, chat_model :Runnable) -> None:
         self.chat_model = chat_model 
@@ -40,35 +159,175 @@ class BasicChatModelNode:
             "messages": [chat_model_said], 
         }
 
+    async def acall(self, state :Dict): 
+        assert("messages" in state) 
+        
+        chat_model_said = await self.chat_model.ainvoke(state["messages"])
+        return {
+            "messages": [chat_model_said], 
+        }
+
 class BasicToolNode:
     """A node that runs the tools requested in the last AIMessage."""
 
     name :str = "default_casual_tools"
 
-    def __init__(self, tools: list) -> None:
+    def __init__(
+            self, 
+            tools: list, 
+            max_concurrency: int = DEFAULT_MAX_CONCURRENCY, 
+            max_concurrency_by_tool: Optional[Dict[str, int]] = None, 
+            timeout_seconds: Optional[float] = None, 
+            tool_result_cache = None
+    ) -> None:
+        """
+        max_concurrency: the upper bound of concurrent calls of each tool, unless overridden by max_concurrency_by_tool (tool name -> limit). 
+        timeout_seconds: the time limit of each tool call, from its submission (the wait for the concurrency limit included). A timed-out call is answered with an error ToolMessage. 
+        tool_result_cache: an optional cache (e.g., caches.LRUCache with ttl_seconds) of the tool results, keyed by the tool name and the canonicalized args. 
+        """
         self.tools_by_name = {tool.name: tool for tool in tools}
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_by_tool = max_concurrency_by_tool if (max_concurrency_by_tool is not None) else {}
+        self.timeout_seconds = timeout_seconds
+        self.tool_result_cache = tool_result_cache
 
-    def __call__(self, state: Dict):
+    def get_last_message (self, state: Dict):
         if messages := state.get("messages", []):
-            message = messages[-1]
+            return messages[-1]
         else:
             raise ValueError("No message found in input")
-        outputs = []
-        for tool_call in message.tool_calls:
-            tool_result = self.tools_by_name[tool_call["name"]].invoke(
-                tool_call["args"]
-            )
-            outputs.append(
-                ToolMessage(
-                    content=json.dumps(tool_result),
-                    name=tool_call["name"],
-                    tool_call_id=tool_call["id"],
+
+    def get_max_concurrency (self, tool_name: str) -> int: 
+        return self.max_concurrency_by_tool.get(tool_name, self.max_concurrency)
+
+    def create_tool_result_cache_key (self, tool_call) -> str: 
+        return create_cache_key(tool_call["name"], json.dumps(tool_call["args"], sort_keys=True, default=str))
+
+    def lookup_cached_tool_message (self, tool_call) -> Optional[ToolMessage]: 
+        if (self.tool_result_cache is None): 
+            return None 
+
+        cached_content = self.tool_result_cache.get(self.create_tool_result_cache_key(tool_call))
+        record_cache_lookups("tool_result", n_hits=int(cached_content is not None), n_misses=int(cached_content is None))
+        if (cached_content is None): 
+            return None 
+
+        logger.info(f"Tool result cache hit: {tool_call['name']}")
+        return ToolMessage(
+            content=cached_content,
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+        )
+
+    def create_tool_message (self, tool_call, tool_result) -> ToolMessage: 
+        content = json.dumps(tool_result)
+        if (self.tool_result_cache is not None): 
+            self.tool_result_cache.set(self.create_tool_result_cache_key(tool_call), content)
+
+        return ToolMessage(
+            content=content,
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+        )
+
+    def create_timeout_tool_message (self, tool_call) -> ToolMessage: 
+        logger.warning(f"Tool call timed out after {self.timeout_seconds} seconds: {tool_call['name']}")
+        return ToolMessage(
+            content=json.dumps({"error": f"The tool call timed out after {self.timeout_seconds} seconds"}),
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"],
+            status="error",
+        )
+
+    def __call__(self, state: Dict):
+        message = self.get_last_message(state)
+
+        outputs = [self.lookup_cached_tool_message(tool_call) for tool_call in message.tool_calls]
+        pending_indices = [i for i, o in enumerate(outputs) if o is None]
+        if (len(pending_indices) == 0): 
+            return {
+                **state, 
+                "messages": outputs
+            }
+
+        semaphores = {
+            tool_name: threading.BoundedSemaphore(self.get_max_concurrency(tool_name)) 
+            for tool_name in self.tools_by_name
+        }
+
+        # All the calls are submitted now: their timeouts run from now 
+        deadline = (time.monotonic() + self.timeout_seconds) if (self.timeout_seconds is not None) else None
+        get_remaining_seconds = lambda: max(0.0, deadline - time.monotonic()) if (deadline is not None) else None
+
+        def run_tool_call (i_tool_call :int): 
+            tool_call = message.tool_calls[i_tool_call]
+            semaphore = semaphores[tool_call["name"]]
+            # A call still waiting for the concurrency limit at its deadline gives up, and is never run 
+            if (not semaphore.acquire(timeout=get_remaining_seconds())): 
+                raise FuturesTimeoutError()
+            try: 
+                return self.tools_by_name[tool_call["name"]].invoke(
+                    tool_call["args"]
                 )
-            )
+            finally: 
+                semaphore.release()
+
+        # Every call gets its own thread, the per-tool semaphores bound the concurrency 
+        executor = ThreadPoolExecutor(max_workers=len(pending_indices))
+        try: 
+            futures = [
+                executor.submit(contextvars.copy_context().run, run_tool_call, i)
+                for i in pending_indices
+            ]
+
+            for i, future in zip(pending_indices, futures): 
+                tool_call = message.tool_calls[i]
+                try: 
+                    outputs[i] = self.create_tool_message(tool_call, future.result(timeout=get_remaining_seconds()))
+                except FuturesTimeoutError: 
+                    outputs[i] = self.create_timeout_tool_message(tool_call)
+
+        finally: 
+            # Do not wait for the timed-out calls 
+            executor.shutdown(wait=False, cancel_futures=True)
+
         return {
             **state, 
             "messages": outputs
         }
+
+    async def acall(self, state: Dict):
+        message = self.get_last_message(state)
+        
+        semaphores = {
+            tool_name: asyncio.Semaphore(self.get_max_concurrency(tool_name)) 
+            for tool_name in self.tools_by_name
+        }
+
+        async def run_tool_call (tool_call) -> ToolMessage: 
+            cached_tool_message = self.lookup_cached_tool_message(tool_call)
+            if (cached_tool_message is not None): 
+                return cached_tool_message
+
+            async def ainvoke_tool (): 
+                async with semaphores[tool_call["name"]]: 
+                    return await self.tools_by_name[tool_call["name"]].ainvoke(tool_call["args"])
+
+            # As in the sync calls, the timeout includes the wait for the concurrency limit 
+            try: 
+                tool_result = await asyncio.wait_for(ainvoke_tool(), timeout=self.timeout_seconds)
+            except asyncio.TimeoutError: 
+                return self.create_timeout_tool_message(tool_call)
+
+            return self.create_tool_message(tool_call, tool_result)
+
+        outputs = await asyncio.gather(*[
+            run_tool_call(tool_call) for tool_call in message.tool_calls
+        ])
+        return {
+            **state, 
+            "messages": list(outputs)
+        }
     
 def basic_chat_model_conditional_edges(
     state: ReasoningState
@@ -87,11 +346,18 @@ def basic_chat_model_conditional_edges(
 # ====
 # Default casual chatbot graph 
 # ====
-def create_default_casual_chatbot_graph_builder () -> StateGraph: 
+def create_default_casual_chatbot_graph_builder (
+        tool_timeout_seconds :Optional[float] = None, 
+        tool_result_cache = None
+) -> StateGraph: 
+    """
+    tool_timeout_seconds: the time limit of each tool call. 
+    tool_result_cache: an optional cache (e.g., caches.LRUCache with ttl_seconds) of the search results, shared across turns and users. 
+    """
     assert("TAVILY_API_KEY" in os.environ)
 
-    # create the default LLM 
-    llm = create_default_openai_llm() 
+    # get the (shared) default LLM 
+    llm = get_default_chat_model() 
 
     # create a tavily search tool and bind it with the LLM 
     from langchain_community.tools.tavily_search import TavilySearchResults
@@ -103,10 +369,14 @@ def create_default_casual_chatbot_graph_builder () -> StateGraph:
     # create a graph builder 
     graph_builder = StateGraph(ReasoningState)
     
-    graph_builder.add_node(BasicChatModelNode.name, BasicChatModelNode(chat_model=llm))
+    graph_builder.add_node(BasicChatModelNode.name, create_graph_node(BasicChatModelNode(chat_model=llm)))
     graph_builder.add_edge(START, BasicChatModelNode.name)
     
-    graph_builder.add_node(BasicToolNode.name, BasicToolNode(tools=llm_tools))
+    graph_builder.add_node(BasicToolNode.name, create_graph_node(BasicToolNode(
+        tools=llm_tools, 
+        timeout_seconds=tool_timeout_seconds, 
+        tool_result_cache=tool_result_cache
+    )))
     graph_builder.add_edge(BasicToolNode.name, BasicChatModelNode.name)
 
     graph_builder.add_conditional_edges(
@@ -125,83 +395,537 @@ def create_default_casual_chatbot_graph_builder () -> StateGraph:
 # ====
 # Rigorous LLM nodes and edges 
 # ====
+class ChatbotSubgraphNode: 
+    """
+    A node that runs the compiled chatbot subgraph and only hands its new messages back. 
+    The subgraph runs in parallel with the rigorousness judgement, so it must not overwrite the other state fields (e.g., rigorousness_required) in the same step. 
+    The subgraph sees the summary of the compacted turns (if any) before the messages, see history_compaction.create_chat_history. 
+    """
+
+    name :str = KEY_CHATBOT_SUBGRAPH
+
+    def __init__(self, chatbot_subgraph :StateGraph) -> None: 
+        self.compiled_chatbot_subgraph = chatbot_subgraph.compile()
+
+    def __call__(self, state :ReasoningState) -> ReasoningState: 
+        chat_history = create_chat_history(state)
+        subgraph_state = self.compiled_chatbot_subgraph.invoke({**state, "messages": chat_history})
+        return {
+            # Only the new messages: the history is not re-merged into the state every turn 
+            "messages": subgraph_state["messages"][len(chat_history):]
+        }
+
+    async def acall(self, state :ReasoningState) -> ReasoningState: 
+        chat_history = create_chat_history(state)
+        subgraph_state = await self.compiled_chatbot_subgraph.ainvoke({**state, "messages": chat_history})
+        return {
+            "messages": subgraph_state["messages"][len(chat_history):]
+        }
+
 class RigorousnessJudgementNode: 
     
     name :str = "rigorousness_judgement"
+    llm_call_priority :int = PRIORITY_NORMAL
 
     def __init__ (
             self, 
-            chat_model :BaseChatModel = create_default_openai_llm()
+            chat_model :Optional[BaseChatModel] = None, 
+            classifier :Optional[RigorousnessClassifier] = None, 
+            judgement_cache = None, 
+            latency_policy :Optional[LatencyPolicy] = None
     ): 
-        self.chain_4_judging_the_need_of_reasoning = create_chain_for_rigorousness_judgement(llm=chat_model)
+        """
+        chat_model: the LLM to use. If None, the shared default chat model (llms.get_default_chat_model) is resolved on first call. 
+        classifier: if given, the queries it classifies confidently are judged locally, and only the ambiguous ones are judged by the LLM. 
+        judgement_cache: an optional cache (e.g., caches.LRUCache) of the judgements, keyed by the normalized query. 
+        latency_policy: the deadline and hedging of the LLM calls. A judgement past its deadline is "not rigorous": the chatbot answer stands. 
+        """
+        self.chat_model = chat_model
+        self.classifier = classifier
+        self.judgement_cache = judgement_cache
+        self.latency_policy = latency_policy
+
+    @cached_property
+    def chain_4_judging_the_need_of_reasoning (self) -> Runnable: 
+        return create_chain_for_rigorousness_judgement(llm=resolve_chain_llm(self.chat_model, self.latency_policy, "rigorousness_judgement_chain"))
+
+    def get_last_user_query (self, state :ReasoningState) -> str: 
+        # Judge the user query, which is the last HumanMessage (the chatbot subgraph runs in parallel) 
+        last_user_message = find_last_chat_message(state["messages"], message_type=HumanMessage)
+        assert(last_user_message is not None), "HumanMessage not found"
+        return last_user_message.content
+
+    def judge_locally (self, query :str) -> Optional[bool]: 
+        """
+        Return the judgement from the cache or the local classifier, or None if the LLM must judge. 
+        """
+        if (self.judgement_cache is not None): 
+            judgement = self.judgement_cache.get(create_cache_key(normalize_text(query)))
+            record_cache_lookups("rigorousness_judgement", n_hits=int(judgement is not None), n_misses=int(judgement is None))
+            if (judgement is not None): 
+                logger.info(f"Judgement of the need of rigorousness reused from the cache")
+                return judgement 
+
+        if (self.classifier is not None): 
+            judgement = self.classifier.classify(query)
+            if (judgement is not None): 
+                logger.info(f"Judgement of the need of rigorousness made by the local classifier")
+                self.store_judgement(query, judgement)
+                return judgement 
+
+        return None 
+
+    def store_judgement (self, query :str, judgement :bool) -> None: 
+        if (self.judgement_cache is not None): 
+            self.judgement_cache.set(create_cache_key(normalize_text(query)), judgement)
 
     def __call__ (self, state :ReasoningState) -> ReasoningState: 
-        old_messages = state["messages"]
-        assert(len(old_messages) > 0)
+        query = self.get_last_user_query(state)
+
+        judgement = self.judge_locally(query)
+        if (judgement is None): 
+            try: 
+                judgement = self.chain_4_judging_the_need_of_reasoning.invoke({"input": query})
+                self.store_judgement(query, judgement)
+            except DeadlineExceededError: 
+                logger.warning(f"Judgement of the need of rigorousness past its deadline, answering casually")
+                judgement = False 
+        assert(type(judgement) is bool)
+
+        logger.info(f"Judgement of the need of rigorousness: {judgement}")
 
-        last_user_message = old_messages[-1]
-        judgement = self.chain_4_judging_the_need_of_reasoning.invoke({"input": last_user_message})
+        return {
+            "rigorousness_required": judgement
+        }
+
+    async def acall (self, state :ReasoningState) -> ReasoningState: 
+        query = self.get_last_user_query(state)
+
+        judgement = self.judge_locally(query)
+        if (judgement is None): 
+            try: 
+                judgement = await self.chain_4_judging_the_need_of_reasoning.ainvoke({"input": query})
+                self.store_judgement(query, judgement)
+            except DeadlineExceededError: 
+                logger.warning(f"Judgement of the need of rigorousness past its deadline, answering casually")
+                judgement = False 
         assert(type(judgement) is bool)
 
-        logging.info(f"Judgement of the need of rigorousness: {judgement}")
+        logger.info(f"Judgement of the need of rigorousness: {judgement}")
 
         return {
             "rigorousness_required": judgement
         }
     
+class HistoryCompactionNode: 
+    """
+    A node that compacts the state of the conversation by a HistoryCompactionPolicy: the old turns are dropped (or summarized), and so are the oldest facts. 
+    It runs in parallel with the chatbot subgraph, which still sees the whole history in the turn of the compaction. 
+    """
+
+    name :str = "history_compaction"
+    llm_call_priority :int = PRIORITY_BACKGROUND
+
+    def __init__(
+            self, 
+            policy :HistoryCompactionPolicy, 
+            chat_model :Optional[BaseChatModel] = None, 
+            latency_policy :Optional[LatencyPolicy] = None
+    ) -> None: 
+        """
+        chat_model: the LLM summarizing the dropped turns (mode "summarize"). If None, the shared default chat model is resolved on first call. 
+        latency_policy: the deadline and hedging of the LLM calls. If the summarization is past its deadline, the compaction is left to the next turn. 
+        """
+        self.policy = policy 
+        self.chat_model = chat_model
+        self.latency_policy = latency_policy
+
+    @cached_property
+    def chain_4_history_summarization (self) -> Runnable: 
+        return create_chain_for_history_summarization(
+            llm=resolve_chain_llm(self.chat_model, self.latency_policy, "history_summarization_chain")
+        )
+
+    def create_compaction_update (self, state :ReasoningState) -> Tuple[ReasoningState, Optional[Dict]]: 
+        """
+        Return the state update without the summary, and the summarization inputs (None if there is nothing to summarize). 
+        """
+        dropped_messages = self.policy.find_dropped_messages(state)
+        update = {
+            **self.policy.create_messages_update(dropped_messages), 
+            **self.policy.create_facts_update(state, dropped_messages)
+        }
+        if (len(dropped_messages) > 0): 
+            logger.info(f"{len(dropped_messages)} messages of the old turns compacted ({self.policy.mode})")
+
+        transcript = self.policy.create_transcript(dropped_messages) if (self.policy.mode == "summarize") else ""
+        if (transcript == ""): 
+            return update, None 
+        return update, {"summary": state.get("history_summary", None) or "(none)", "transcript": transcript}
+
+    def __call__(self, state :ReasoningState) -> ReasoningState: 
+        update, summarization_inputs = self.create_compaction_update(state)
+        if (summarization_inputs is not None): 
+            try: 
+                update["history_summary"] = self.chain_4_history_summarization.invoke(summarization_inputs)
+            except DeadlineExceededError: 
+                # The dropped turns would be lost without their summary 
+                logger.warning(f"History summarization past its deadline, compaction left to the next turn")
+                return {}
+        return update 
+
+    async def acall(self, state :ReasoningState) -> ReasoningState: 
+        update, summarization_inputs = self.create_compaction_update(state)
+        if (summarization_inputs is not None): 
+            try: 
+                update["history_summary"] = await self.chain_4_history_summarization.ainvoke(summarization_inputs)
+            except DeadlineExceededError: 
+                # The dropped turns would be lost without their summary 
+                logger.warning(f"History summarization past its deadline, compaction left to the next turn")
+                return {}
+        return update 
+
+class TurnTimerNode: 
+    """A node that sets the deadline of the rigorous stages of the turn, by a TurnBudget, at the start of the turn."""
+
+    name :str = "turn_timer"
+
+    def __init__(self, turn_budget :TurnBudget) -> None: 
+        self.turn_budget = turn_budget
+
+    def __call__(self, state :ReasoningState) -> ReasoningState: 
+        return {
+            "turn_deadline": self.turn_budget.create_turn_deadline()
+        }
+
+    async def acall(self, state :ReasoningState) -> ReasoningState: 
+        return self(state)
+
+class RigorousnessGate: 
+    """A no-op node that joins the chatbot subgraph and the rigorousness judgement (and the history compaction and the turn timer, if any)."""
+
+    name :str = "rigorousness_gate"
+
+    def __call__(self, state :ReasoningState) -> ReasoningState: 
+        return {}
+
+    async def acall(self, state :ReasoningState) -> ReasoningState: 
+        return self(state)
+
 def rigorousness_judgement_conditional_edge (
-        state :ReasoningState
+        state :ReasoningState, 
+        fact_store = None, 
+        turn_budget :Optional[TurnBudget] = None
 ):
-    if (state["rigorousness_required"]): 
-        return SubTasksLauncher.name 
-    else: 
+    if (not state["rigorousness_required"]): 
         return END
     
+    # Graceful degradation: without the time for the rigorous stages, no statement can be verified, so go straight to the fallback response 
+    if (turn_budget is not None and not turn_budget.has_time_for_rigorous_stages(state)): 
+        logger.warning(f"Turn budget spent before the rigorous stages, skipping them")
+        return LLMResponseRevisementNode.name 
+
+    # Early exit: without any fact source, no statement can pass the validation, so go straight to the fallback response 
+    if (not has_fact_sources(state, fact_store=fact_store)): 
+        logger.info(f"No fact source, skipping the facts collection and the statements extraction")
+        return LLMResponseRevisementNode.name 
+
+    return SubTasksLauncher.name 
+    
 class SubTasksLauncher: 
 
     name :str = "sub_tasks_launcher"
 
+    def __init__(self, cancellation_scope_registry :Optional[CancellationScopeRegistry] = None) -> None: 
+        """
+        cancellation_scope_registry: if given, a new cancellation scope is opened for the sub-tasks of this turn. 
+        """
+        self.cancellation_scope_registry = cancellation_scope_registry
+
     def __call__(self, state :ReasoningState) -> ReasoningState: 
         return {
             "facts_collected": False, 
             "statements_extracted": False, 
-            "extracted_statements": [] 
+            "extracted_statements": [], 
+            "cancellation_scope_id": self.cancellation_scope_registry.create_scope_id() if (self.cancellation_scope_registry is not None) else None
         }
+
+    async def acall(self, state :ReasoningState) -> ReasoningState: 
+        return self(state)
     
 class FactsCollectionNode: 
 
     name :str = "facts_collection"
+    llm_call_priority :int = PRIORITY_BACKGROUND
+    bounded_by_turn_deadline :bool = True
 
     def __init__(
             self, 
-            chat_model :BaseChatModel = create_default_openai_llm()
+            chat_model :Optional[BaseChatModel] = None, 
+            max_concurrency :int = DEFAULT_MAX_CONCURRENCY, 
+            extraction_cache = None, 
+            chunk_max_tokens :int = DEFAULT_CHUNK_MAX_TOKENS, 
+            fact_deduplicator_registry :Optional[FactDeduplicatorRegistry] = None, 
+            cancellation_scope_registry :Optional[CancellationScopeRegistry] = None, 
+            fact_store = None, 
+            fact_store_top_k :Optional[int] = None, 
+            latency_policy :Optional[LatencyPolicy] = None
     ):
-        self.chain_4_statements_extraction = create_chain_for_statements_extraction(llm=chat_model)
+        """
+        chat_model: the LLM to use. If None, the shared default chat model (llms.get_default_chat_model) is resolved on first call. 
+        extraction_cache: an optional cache (e.g., caches.TieredCache) of statements extraction results, consulted before calling the LLM. 
+        latency_policy: the deadline and hedging of the LLM calls. The facts of a tool message with chunks past their deadline are partial: the message is extracted again in the next turn. 
+        fact_store: an optional persistent fact store (e.g., fact_store.SQLiteFactStore). The chunks already in the store are not extracted again, and the facts extracted from the new chunks are stored (with their provenance). 
+        fact_store_top_k: if given (with a fact store), the top-k stored facts relevant to the last user query are collected too, e.g., facts extracted in other sessions. 
+        chunk_max_tokens: each tool message is split into chunks (one per result entry, each within this token budget), and the facts are extracted from the chunks concurrently. 
+        fact_deduplicator_registry: if given, the new facts which are near-duplicates of known facts (of the thread) are dropped. 
+        cancellation_scope_registry: if given and no fact is collected, the cancellation scope of the turn is cancelled (e.g., the statements extraction stops). 
+        """
+        self.chat_model = chat_model
+        self.extraction_cache = extraction_cache
+        self.max_concurrency = max_concurrency
+        self.chunk_max_tokens = chunk_max_tokens
+        self.fact_deduplicator_registry = fact_deduplicator_registry
+        self.cancellation_scope_registry = cancellation_scope_registry
+        self.fact_store = fact_store
+        self.fact_store_top_k = fact_store_top_k
+        self.latency_policy = latency_policy
+
+    @cached_property
+    def chain_4_statements_extraction (self) -> Runnable: 
+        return create_chain_for_statements_extraction(
+            llm=resolve_chain_llm(self.chat_model, self.latency_policy, "statements_extraction_chain"), 
+            cache=self.extraction_cache
+        )
+
+    def lookup_stored_facts (self, extraction_inputs :List[Dict]) -> List[Optional[List[str]]]: 
+        """
+        Return the stored facts of each extraction input (chunk), or None for the chunks to extract. 
+        """
+        if (self.fact_store is None): 
+            return [None] * len(extraction_inputs)
+
+        stored_facts_list = [self.fact_store.get_facts(create_source_hash(inputs["input"])) for inputs in extraction_inputs]
+        n_stored = len(stored_facts_list) - stored_facts_list.count(None)
+        record_cache_lookups("fact_store", n_hits=n_stored, n_misses=stored_facts_list.count(None))
+        if (n_stored > 0): 
+            logger.info(f"Facts of {n_stored} out of {len(extraction_inputs)} chunks reused from the fact store")
+        return stored_facts_list
+
+    def store_extracted_facts (
+            self, 
+            new_tool_messages :List[ToolMessage], 
+            extraction_inputs :List[Dict], 
+            message_indices :List[int], 
+            stored_facts_list :List[Optional[List[str]]], 
+            extracted_statements_list :List[Optional[List[str]]]
+    ) -> List[Optional[List[str]]]: 
+        """
+        Store the facts extracted from the chunks not in the fact store, and return the facts of all the chunks (stored or extracted). 
+        The chunks past their deadline (None) are not stored. 
+        """
+        i_missing = [i for i, stored_facts in enumerate(stored_facts_list) if stored_facts is None]
+        all_facts_list = list(stored_facts_list)
+        for i, extracted_statements in zip(i_missing, extracted_statements_list): 
+            all_facts_list[i] = extracted_statements
+
+        if (self.fact_store is not None and len(i_missing) > 0): 
+            model_name = get_chat_model_name(resolve_chat_model(self.chat_model))
+            for i, extracted_statements in zip(i_missing, extracted_statements_list): 
+                if (extracted_statements is None): 
+                    continue 
+                self.fact_store.put_facts(
+                    create_source_hash(extraction_inputs[i]["input"]), 
+                    extracted_statements, 
+                    url=find_source_url(extraction_inputs[i]["input"]), 
+                    tool_name=new_tool_messages[message_indices[i]].name, 
+                    model_name=model_name
+                )
+        return all_facts_list
+
+    def retrieve_stored_facts (self, state :ReasoningState) -> Dict[str, List[str]]: 
+        """
+        Retrieve the stored facts relevant to the last user query (once per user query). 
+        """
+        if (self.fact_store is None or self.fact_store_top_k is None): 
+            return {}
+
+        last_user_message = find_last_chat_message(state["messages"], message_type=HumanMessage, return_none_for_not_found=True)
+        if (last_user_message is None): 
+            return {}
+        facts_key = f"fact_store:{last_user_message.id}"
+        if (is_fact_source_processed(state, facts_key)): 
+            return {}
+
+        stored_facts = [result["fact"] for result in self.fact_store.search(last_user_message.content, top_k=self.fact_store_top_k)]
+        logger.info(f"{len(stored_facts)} relevant facts retrieved from the fact store")
+        return {facts_key: stored_facts}
+
+    def deduplicate_new_facts (self, state :ReasoningState, new_facts :Dict[str, List[str]]) -> Dict[str, List[str]]: 
+        """
+        Drop the new facts which are near-duplicates of the facts already in the state, or of the new facts before them. 
+        """
+        if (self.fact_deduplicator_registry is None): 
+            return new_facts 
+
+        fact_deduplicator = self.fact_deduplicator_registry.get_deduplicator(get_thread_id())
+        # Sync with the facts of the state (a no-op for the facts already known to the deduplicator, a rebuild if the history compaction dropped any)
+        fact_deduplicator.sync_facts(collect_facts_from_state(state))
+
+        # The deduplicator is not updated with the new facts: it only learns them once they are committed to the state (at the next sync), 
+        # so that the facts of a failed (or retried) step are not dropped as duplicates 
+        n_dropped_chars = fact_deduplicator.n_dropped_chars
+        n_chars = sum([len(fact) for facts in new_facts.values() for fact in facts])
+        deduplicated_new_facts = dict(zip(new_facts.keys(), fact_deduplicator.filter_facts(list(new_facts.values()))))
+
+        n_dropped_facts = sum(map(len, new_facts.values())) - sum(map(len, deduplicated_new_facts.values()))
+        n_saved_chars = fact_deduplicator.n_dropped_chars - n_dropped_chars
+        logger.info(f"{n_dropped_facts} near-duplicate facts dropped, saving {n_saved_chars} of {n_chars} characters of facts")
+        return deduplicated_new_facts
+
+    def cancel_if_no_fact (self, state :ReasoningState, new_facts :Dict[str, List[str]]) -> None: 
+        # Without any fact, no statement can pass the validation: the other branches of the turn can stop 
+        if (self.cancellation_scope_registry is None): 
+            return 
+        if (sum(map(len, new_facts.values())) == 0 and len(collect_facts_from_state(state)) == 0): 
+            get_cancellation_scope(self.cancellation_scope_registry, state).cancel("no fact collected")
+
+    def create_state_update (self, state :ReasoningState, new_facts :Dict[str, List[str]]) -> ReasoningState: 
+        facts_update = create_facts_update(state, new_facts)
+        write_progress_event(FACTS_COLLECTED_EVENT, {
+            "n_new_facts": len(facts_update["fact_table"]), 
+            "n_facts": len(collect_facts_from_state(state)) + len(facts_update["fact_table"])
+        })
+        return facts_update
+
+    def find_new_tool_messages (self, state :ReasoningState) -> List[ToolMessage]: 
+        return [
+            message for message in state["messages"]
+            if (isinstance(message, ToolMessage) and not is_fact_source_processed(state, message.id))
+        ]
 
-    def __call__(self, state :ReasoningState) -> ReasoningState:
-        # Extracting facts from tool messages 
-        new_facts = {} 
-        for message in state["messages"]: 
-            if (isinstance(message, ToolMessage) and message.id not in state["facts"]): 
-                logging.info(f"Extracting facts from tool messages: {message.id}")
-                extracted_statements = self.chain_4_statements_extraction.invoke({"input": message.content})
-                new_facts[message.id] = extracted_statements
-        
-        logging.info(f"{len(new_facts.values())} new facts extracted")
-        # Return 
+    def create_extraction_inputs (self, new_tool_messages :List[ToolMessage]) -> Tuple[List[Dict], List[int]]: 
+        """
+        Map: split the tool messages into chunks. Return the extraction inputs and, for each input, the index of its tool message. 
+        """
+        extraction_inputs = []
+        message_indices = []
+        for i, message in enumerate(new_tool_messages): 
+            for chunk in split_tool_content_into_chunks(message.content, max_tokens=self.chunk_max_tokens): 
+                extraction_inputs.append({"input": chunk})
+                message_indices.append(i)
+
+        logger.info(f"Extracting facts from {len(new_tool_messages)} tool messages in {len(extraction_inputs)} chunks")
+        return extraction_inputs, message_indices
+
+    def merge_extracted_statements (
+            self, 
+            new_tool_messages :List[ToolMessage], 
+            message_indices :List[int], 
+            extracted_statements_list :List[Optional[List[str]]]
+    ) -> Dict[str, List[str]]: 
+        """
+        Reduce: merge the facts extracted from the chunks of each tool message, and drop the duplicates. 
+        The facts of a tool message with chunks past their deadline (None) are kept under "partial:<message id>", so that the message is not marked as processed. 
+        """
+        new_facts = {message.id: [] for message in new_tool_messages}
+        seen_facts = {message.id: set() for message in new_tool_messages}
+        partial_message_ids = set()
+
+        for i, extracted_statements in zip(message_indices, extracted_statements_list): 
+            message_id = new_tool_messages[i].id
+            if (extracted_statements is None): 
+                partial_message_ids.add(message_id)
+                continue 
+            for statement in extracted_statements: 
+                normalized_statement = normalize_text(statement)
+                if (normalized_statement not in seen_facts[message_id]): 
+                    seen_facts[message_id].add(normalized_statement)
+                    new_facts[message_id].append(statement)
+
+        logger.info(f"{sum(map(len, new_facts.values()))} new facts extracted")
+        if (len(partial_message_ids) > 0): 
+            logger.warning(f"Facts of {len(partial_message_ids)} tool messages partially extracted before the deadline")
         return {
-            "facts": new_facts
+            (f"partial:{message_id}" if (message_id in partial_message_ids) else message_id): facts 
+            for message_id, facts in new_facts.items()
         }
+
+    def __call__(self, state :ReasoningState) -> ReasoningState:
+        # Extracting facts from the chunks of the tool messages 
+        new_tool_messages = self.find_new_tool_messages(state)
+        extraction_inputs, message_indices = self.create_extraction_inputs(new_tool_messages)
+
+        stored_facts_list = self.lookup_stored_facts(extraction_inputs)
+
+        extracted_statements_list = replace_deadline_errors(self.chain_4_statements_extraction.batch(
+            [inputs for inputs, stored_facts in zip(extraction_inputs, stored_facts_list) if stored_facts is None], 
+            config={"max_concurrency": self.max_concurrency}, 
+            return_exceptions=True
+        ))
+        extracted_statements_list = self.store_extracted_facts(new_tool_messages, extraction_inputs, message_indices, stored_facts_list, extracted_statements_list)
+        new_facts = self.merge_extracted_statements(new_tool_messages, message_indices, extracted_statements_list)
+        new_facts.update(self.retrieve_stored_facts(state))
+        new_facts = self.deduplicate_new_facts(state, new_facts)
+        self.cancel_if_no_fact(state, new_facts)
+
+        # Return: the new facts are interned into the fact table 
+        return self.create_state_update(state, new_facts)
+
+    async def acall(self, state :ReasoningState) -> ReasoningState:
+        # Extracting facts from the chunks of the tool messages 
+        new_tool_messages = self.find_new_tool_messages(state)
+        extraction_inputs, message_indices = self.create_extraction_inputs(new_tool_messages)
+
+        stored_facts_list = self.lookup_stored_facts(extraction_inputs)
+
+        extracted_statements_list = replace_deadline_errors(await self.chain_4_statements_extraction.abatch(
+            [inputs for inputs, stored_facts in zip(extraction_inputs, stored_facts_list) if stored_facts is None], 
+            config={"max_concurrency": self.max_concurrency}, 
+            return_exceptions=True
+        ))
+        extracted_statements_list = self.store_extracted_facts(new_tool_messages, extraction_inputs, message_indices, stored_facts_list, extracted_statements_list)
+        new_facts = self.merge_extracted_statements(new_tool_messages, message_indices, extracted_statements_list)
+        new_facts.update(self.retrieve_stored_facts(state))
+        new_facts = self.deduplicate_new_facts(state, new_facts)
+        self.cancel_if_no_fact(state, new_facts)
+
+        # Return: the new facts are interned into the fact table 
+        return self.create_state_update(state, new_facts)
     
 class LLMResponseStatementsExtractionNode: 
     
     name :str = "llm_response_statements_extraction"
+    llm_call_priority :int = PRIORITY_BACKGROUND
+    bounded_by_turn_deadline :bool = True
 
     def __init__ (
             self, 
-            chat_model :BaseChatModel = create_default_openai_llm()
+            chat_model :Optional[BaseChatModel] = None, 
+            extraction_cache = None, 
+            cancellation_scope_registry :Optional[CancellationScopeRegistry] = None, 
+            latency_policy :Optional[LatencyPolicy] = None, 
+            streaming :Optional[bool] = None
     ) -> None: 
-        self.chain_4_statements_extraction = create_chain_for_statements_extraction(llm=chat_model)
+        """
+        chat_model: the LLM to use. If None, the shared default chat model (llms.get_default_chat_model) is resolved on first call. 
+        extraction_cache: an optional cache (e.g., caches.TieredCache) of statements extraction results, consulted before calling the LLM. 
+        cancellation_scope_registry: if given, the extraction stops (with no statement) once the cancellation scope of the turn is cancelled. 
+        latency_policy: the deadline and hedging of the LLM calls. An extraction past its deadline gives no statement. 
+        streaming: whether the extraction calls may be streamed under the latency policy (True for StatementsPipelineNode). If None, as the policy streams the chain. 
+        """
+        self.chat_model = chat_model
+        self.extraction_cache = extraction_cache
+        self.cancellation_scope_registry = cancellation_scope_registry
+        self.latency_policy = latency_policy
+        self.streaming = streaming
+
+    @cached_property
+    def chain_4_statements_extraction (self) -> Runnable: 
+        return create_chain_for_statements_extraction(
+            llm=resolve_chain_llm(self.chat_model, self.latency_policy, "statements_extraction_chain", streaming=self.streaming), 
+            cache=self.extraction_cache
+        )
 
     def __call__(self, state :ReasoningState) -> ReasoningState:
         # Find out the last AI message 
@@ -209,9 +933,47 @@ class LLMResponseStatementsExtractionNode:
         assert(last_ai_message is not None), "AIMessage not found"
         
         # Extract statements from the last AIMessage 
-        extracted_statements = self.chain_4_statements_extraction.invoke({"input": last_ai_message.content})
+        # (a synchronous LLM call cannot be interrupted: the cancellation is only checked before it, and its result is discarded if cancelled meanwhile) 
+        cancellation_scope = get_cancellation_scope(self.cancellation_scope_registry, state)
+        try: 
+            cancellation_scope.raise_if_cancelled()
+            extracted_statements = self.chain_4_statements_extraction.invoke({"input": last_ai_message.content})
+            cancellation_scope.raise_if_cancelled()
+        except BranchCancelledError: 
+            logger.info(f"Statements extraction cancelled: {cancellation_scope.reason}")
+            extracted_statements = []
+        except DeadlineExceededError: 
+            logger.warning(f"Statements extraction past its deadline")
+            extracted_statements = []
+
+        logger.info(f"{len(extracted_statements)} statements extracted from the last AI message")
+        write_progress_event(STATEMENTS_EXTRACTED_EVENT, {"n_statements": len(extracted_statements)})
+
+        # Return 
+        return {
+            "extracted_statements": extracted_statements 
+        }
+
+    async def acall(self, state :ReasoningState) -> ReasoningState:
+        # Find out the last AI message 
+        last_ai_message = find_last_chat_message(state["messages"], message_type=AIMessage)
+        assert(last_ai_message is not None), "AIMessage not found"
+        
+        # Extract statements from the last AIMessage 
+        cancellation_scope = get_cancellation_scope(self.cancellation_scope_registry, state)
+        try: 
+            extracted_statements = await cancellation_scope.arun(
+                self.chain_4_statements_extraction.ainvoke({"input": last_ai_message.content})
+            )
+        except BranchCancelledError: 
+            logger.info(f"Statements extraction cancelled: {cancellation_scope.reason}")
+            extracted_statements = []
+        except DeadlineExceededError: 
+            logger.warning(f"Statements extraction past its deadline")
+            extracted_statements = []
 
-        logging.info(f"{len(extracted_statements)} statements extracted from the last AI message")
+        logger.info(f"{len(extracted_statements)} statements extracted from the last AI message")
+        write_progress_event(STATEMENTS_EXTRACTED_EVENT, {"n_statements": len(extracted_statements)})
 
         # Return 
         return {
@@ -221,84 +983,751 @@ class LLMResponseStatementsExtractionNode:
 class LLMResponseValidationNode: 
 
     name :str = "llm_response_validation" 
+    llm_call_priority :int = PRIORITY_BACKGROUND
+    bounded_by_turn_deadline :bool = True
 
     def __init__(
             self, 
-            chat_model :BaseChatModel = create_default_openai_llm()
+            chat_model :Optional[BaseChatModel] = None, 
+            batch_size :int = 1, 
+            max_concurrency :int = DEFAULT_MAX_CONCURRENCY, 
+            verdict_cache :Optional[VerdictCache] = None, 
+            fact_index_registry :Optional[FactIndexRegistry] = None, 
+            fact_top_k :Optional[int] = None, 
+            fact_min_score :float = 0.0, 
+            local_verifier :Optional[LocalStatementVerifier] = None, 
+            context_packer :Optional[ContextPacker] = None, 
+            latency_policy :Optional[LatencyPolicy] = None
     ) -> None:
-        self.chain_4_text_validation_against_facts = create_chain_for_input_validation_against_facts(llm=chat_model)
+        """
+        chat_model: the LLM to use. If None, the shared default chat model (llms.get_default_chat_model) is resolved on first call. 
+        batch_size: the number of statements validated in one LLM call. With batch_size <= 1, each statement is validated with its own call. 
+        max_concurrency: the upper bound of concurrent validation calls. 
+        verdict_cache: an optional cache of the verdicts, so that only the statements whose inputs changed are validated again. 
+        fact_index_registry: the per-thread fact indices, synced with the facts of the state (see FactIndex.sync_facts). 
+        fact_top_k: if given, each statement is only validated against its top-k relevant facts (scores above fact_min_score) instead of all facts. 
+        local_verifier: if given, the statements nearly verbatim in their facts are accepted locally, without an LLM call. 
+        context_packer: if given, the facts of each statement are cut down to the most relevant ones within the prompt budget, and a batch over the budget is split. 
+        latency_policy: the deadline and hedging of the LLM calls. The statements whose validation is past its deadline are left unverified (dropped). 
+        """
+        self.chat_model = chat_model
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.verdict_cache = verdict_cache
+        self.fact_index_registry = fact_index_registry if (fact_index_registry is not None) else FactIndexRegistry()
+        self.fact_top_k = fact_top_k
+        self.fact_min_score = fact_min_score
+        self.local_verifier = local_verifier
+        self.context_packer = context_packer
+        self.latency_policy = latency_policy
+
+    @cached_property
+    def chain_4_text_validation_against_facts (self) -> Runnable: 
+        return create_chain_for_input_validation_against_facts(
+            llm=resolve_chain_llm(self.chat_model, self.latency_policy, "input_validation_against_facts_chain")
+        )
+
+    @cached_property
+    def chain_4_texts_validation_against_facts (self) -> Runnable: 
+        return create_chain_for_inputs_validation_against_facts(
+            llm=resolve_chain_llm(self.chat_model, self.latency_policy, "inputs_validation_against_facts_chain")
+        )
+
+    @cached_property
+    def verdict_namespace (self) -> str: 
+        return create_cache_key(
+            self.chain_4_text_validation_against_facts.first.template, 
+            get_chat_model_name(resolve_chat_model(self.chat_model))
+        )
+
+    def get_fact_index (self, all_facts :List[str]) -> FactIndex: 
+        # The index of the thread follows its facts: the facts dropped by the history compaction are no longer selected 
+        fact_index = self.fact_index_registry.get_index(get_thread_id())
+        fact_index.sync_facts(all_facts)
+        return fact_index
+
+    def select_facts_for_statements (self, statements :List[str], all_facts :List[str]) -> List[List[str]]: 
+        if (self.fact_top_k is None): 
+            return [all_facts] * len(statements)
+
+        fact_index = self.get_fact_index(all_facts)
+
+        # The selected facts keep their order in all_facts (not the score order), so that the prompts stay stable 
+        fact_positions = {fact: i for i, fact in enumerate(all_facts)}
+        statement_facts = [
+            sorted(
+                [fact for fact, score in fact_index.search(query=s, top_k=self.fact_top_k, min_score=self.fact_min_score)], 
+                key=lambda fact: fact_positions.get(fact, len(fact_positions))
+            )
+            for s in statements
+        ]
+        logger.info(f"Selected {sum(map(len, statement_facts))} relevant facts for {len(statements)} statements out of {len(all_facts)} facts")
+        return statement_facts
+
+    def pack_facts_for_statements (self, statements :List[str], statement_facts :List[List[str]], all_facts :List[str]) -> List[List[str]]: 
+        """
+        Fit the facts of each statement into the prompt budget: the facts most relevant to the statement (by BM25) are kept. 
+        """
+        if (self.context_packer is None): 
+            return statement_facts 
+
+        prompt_templates = [self.chain_4_text_validation_against_facts.first]
+        if (self.batch_size > 1): 
+            prompt_templates.append(self.chain_4_texts_validation_against_facts.first)
+
+        packed_statement_facts = []
+        for s, facts in zip(statements, statement_facts): 
+            max_tokens = min([self.context_packer.get_items_budget(t, fixed_inputs=[s]) for t in prompt_templates])
+            if (self.context_packer.count_items_tokens(facts) <= max_tokens): 
+                packed_statement_facts.append(facts)
+                continue
+            fact_scores = dict(self.get_fact_index(all_facts).search(query=s, top_k=len(facts)))
+            packed_statement_facts.append(self.context_packer.pack_items(facts, max_tokens, scores=fact_scores, name="validation_facts"))
+
+        n_dropped_facts = sum(map(len, statement_facts)) - sum(map(len, packed_statement_facts))
+        if (n_dropped_facts > 0): 
+            logger.info(f"{n_dropped_facts} facts of the statements dropped to fit the prompt budget")
+        return packed_statement_facts
+
+    def verify_statements_locally (
+            self, 
+            statements :List[str], 
+            statement_facts :List[List[str]], 
+            judgements :List[Optional[bool]], 
+            all_facts :List[str]
+    ) -> List[Optional[bool]]: 
+        if (self.local_verifier is None or judgements.count(None) == 0): 
+            return judgements 
+
+        fact_index = self.get_fact_index(all_facts)
+        n_avoided_llm_validations = self.local_verifier.n_avoided_llm_validations
+        judgements = [
+            self.local_verifier.verify(
+                statement=s, 
+                fact_index=fact_index, 
+                allowed_facts=set(facts) if (self.fact_top_k is not None) else None
+            ) if (j is None) else j 
+            for s, facts, j in zip(statements, statement_facts, judgements)
+        ]
+        logger.info(f"{self.local_verifier.n_avoided_llm_validations - n_avoided_llm_validations} statements accepted by the local verifier")
+        return judgements
+
+    def create_fact_digests_for_statements (self, statement_facts :List[List[str]]) -> List[List[str]]: 
+        # Statements often share the same fact list (e.g., all facts), hash each distinct list only once 
+        fact_digests_by_list_id = {}
+        for facts in statement_facts: 
+            if (id(facts) not in fact_digests_by_list_id): 
+                fact_digests_by_list_id[id(facts)] = VerdictCache.create_fact_digests(facts)
+        return [fact_digests_by_list_id[id(facts)] for facts in statement_facts]
+
+    def lookup_cached_judgements (self, statements :List[str], statement_fact_digests :List[List[str]]) -> List[Optional[bool]]: 
+        if (self.verdict_cache is None): 
+            return [None] * len(statements)
+
+        judgements = [
+            self.verdict_cache.lookup(statement=s, fact_digests=fd, namespace=self.verdict_namespace) 
+            for s, fd in zip(statements, statement_fact_digests)
+        ]
+        record_cache_lookups("verdict", n_hits=len(judgements) - judgements.count(None), n_misses=judgements.count(None))
+        logger.info(f"{len(judgements) - judgements.count(None)} verdicts reused from the verdict cache")
+        return judgements
+
+    def store_judgements (self, statements :List[str], statement_fact_digests :List[List[str]], judgements :List[bool]) -> None: 
+        if (self.verdict_cache is None): 
+            return 
+
+        for s, fd, j in zip(statements, statement_fact_digests, judgements): 
+            self.verdict_cache.store(statement=s, fact_digests=fd, verdict=j, namespace=self.verdict_namespace)
+
+    def create_one_by_one_inputs (self, statements :List[str], statement_facts :List[List[str]]) -> List[Dict]: 
+        return [
+            {
+                "input": s, 
+                "facts": encode_text_list_to_bulleted_paragraph(text_list=facts)
+            }
+            for s, facts in zip(statements, statement_facts)
+        ]
+
+    def create_batches (self, statements :List[str], statement_facts :List[List[str]]) -> List[List[int]]: 
+        """
+        Group the statements (indices) into batches of up to batch_size statements. With a context packer, a batch is closed early when 
+        its statements and the union of their facts would exceed the prompt budget. 
+        """
+        if (self.context_packer is None): 
+            return [list(range(i_start, min(i_start+self.batch_size, len(statements)))) for i_start in range(0, len(statements), self.batch_size)]
+
+        max_tokens = self.context_packer.get_items_budget(self.chain_4_texts_validation_against_facts.first)
+        batches = []
+        n_splits = 0
+        for i, (s, facts) in enumerate(zip(statements, statement_facts)): 
+            if (len(batches) > 0 and len(batches[-1]) < self.batch_size): 
+                new_facts = [fact for fact in facts if fact not in batch_facts]
+                n_new_tokens = self.context_packer.count_items_tokens([s] + new_facts)
+                if (n_tokens + n_new_tokens <= max_tokens): 
+                    batches[-1].append(i)
+                    batch_facts.update(dict.fromkeys(new_facts))
+                    n_tokens += n_new_tokens
+                    continue
+                n_splits += 1
+
+            batches.append([i])
+            batch_facts = dict.fromkeys(facts)
+            n_tokens = self.context_packer.count_items_tokens([s] + facts)
+
+        self.context_packer.record("validation_batches", n_splits=n_splits)
+        return batches
+
+    def create_batch_inputs (self, statements :List[str], statement_facts :List[List[str]], batches :List[List[int]]) -> List[Dict]: 
+        batch_inputs = []
+        for batch in batches: 
+            # The statements in a batch share the union of their facts 
+            batch_facts = list(dict.fromkeys(sum([statement_facts[i] for i in batch], [])))
+            batch_inputs.append({
+                "inputs": encode_text_list_to_indexed_paragraph(text_list=[statements[i] for i in batch]), 
+                "facts": encode_text_list_to_bulleted_paragraph(text_list=batch_facts)
+            })
+        return batch_inputs
+
+    def merge_batch_judgements (self, statements :List[str], batches :List[List[int]], batch_judgements :List[Dict[int, bool]]) -> List[Optional[bool]]: 
+        judgements = [None] * len(statements)
+
+        for batch, indexed_judgements in zip(batches, batch_judgements): 
+            for i_in_batch, i in enumerate(batch): 
+                judgements[i] = indexed_judgements.get(i_in_batch+1, None)
+
+        unclear_indices = [i for i, j in enumerate(judgements) if j is None]
+        if (len(unclear_indices) > 0): 
+            logger.info(f"{len(unclear_indices)} statements left unclear by the batch validation, validating them one by one")
+
+        return judgements
+
+    def validate_statements_one_by_one (self, statements :List[str], statement_facts :List[List[str]]) -> List[Optional[bool]]: 
+        # The validations past their deadline give None (unverified) 
+        return replace_deadline_errors(self.chain_4_text_validation_against_facts.batch(
+            self.create_one_by_one_inputs(statements=statements, statement_facts=statement_facts), 
+            config={"max_concurrency": self.max_concurrency}, 
+            return_exceptions=True
+        ))
+
+    async def avalidate_statements_one_by_one (self, statements :List[str], statement_facts :List[List[str]]) -> List[Optional[bool]]: 
+        # The validations past their deadline give None (unverified) 
+        return replace_deadline_errors(await self.chain_4_text_validation_against_facts.abatch(
+            self.create_one_by_one_inputs(statements=statements, statement_facts=statement_facts), 
+            config={"max_concurrency": self.max_concurrency}, 
+            return_exceptions=True
+        ))
+
+    def validate_statements_in_batches (self, statements :List[str], statement_facts :List[List[str]]) -> List[Optional[bool]]: 
+        batches = self.create_batches(statements=statements, statement_facts=statement_facts)
+        batch_judgements = replace_deadline_errors(self.chain_4_texts_validation_against_facts.batch(
+            self.create_batch_inputs(statements=statements, statement_facts=statement_facts, batches=batches), 
+            config={"max_concurrency": self.max_concurrency}, 
+            return_exceptions=True
+        ), default={})
+        judgements = self.merge_batch_judgements(statements=statements, batches=batches, batch_judgements=batch_judgements)
+
+        # Fall back to one-by-one validation for the statements left unclear by the batch responses 
+        unclear_indices = [i for i, j in enumerate(judgements) if j is None]
+        fallback_judgements = self.validate_statements_one_by_one(
+            statements=[statements[i] for i in unclear_indices], 
+            statement_facts=[statement_facts[i] for i in unclear_indices]
+        )
+        for i, j in zip(unclear_indices, fallback_judgements): 
+            judgements[i] = j 
+
+        return judgements
+
+    async def avalidate_statements_in_batches (self, statements :List[str], statement_facts :List[List[str]]) -> List[Optional[bool]]: 
+        batches = self.create_batches(statements=statements, statement_facts=statement_facts)
+        batch_judgements = replace_deadline_errors(await self.chain_4_texts_validation_against_facts.abatch(
+            self.create_batch_inputs(statements=statements, statement_facts=statement_facts, batches=batches), 
+            config={"max_concurrency": self.max_concurrency}, 
+            return_exceptions=True
+        ), default={})
+        judgements = self.merge_batch_judgements(statements=statements, batches=batches, batch_judgements=batch_judgements)
+
+        # Fall back to one-by-one validation for the statements left unclear by the batch responses 
+        unclear_indices = [i for i, j in enumerate(judgements) if j is None]
+        fallback_judgements = await self.avalidate_statements_one_by_one(
+            statements=[statements[i] for i in unclear_indices], 
+            statement_facts=[statement_facts[i] for i in unclear_indices]
+        )
+        for i, j in zip(unclear_indices, fallback_judgements): 
+            judgements[i] = j 
+
+        return judgements
+
+    def validate_statements (self, statements :List[str], statement_facts :List[List[str]]) -> List[Optional[bool]]: 
+        if (self.batch_size > 1): 
+            return self.validate_statements_in_batches(statements=statements, statement_facts=statement_facts)
+        return self.validate_statements_one_by_one(statements=statements, statement_facts=statement_facts)
+
+    async def avalidate_statements (self, statements :List[str], statement_facts :List[List[str]]) -> List[Optional[bool]]: 
+        if (self.batch_size > 1): 
+            return await self.avalidate_statements_in_batches(statements=statements, statement_facts=statement_facts)
+        return await self.avalidate_statements_one_by_one(statements=statements, statement_facts=statement_facts)
+
+    def prepare_judgements (self, statements :List[str], all_facts :List[str]) -> Tuple[List[List[str]], List[Optional[bool]]]: 
+        """
+        Return the facts for each statement, and the judgements known without calling the LLM (None for the pending ones). 
+        """
+        # Select the facts for each statement 
+        statement_facts = self.select_facts_for_statements(statements=statements, all_facts=all_facts)
+        statement_facts = self.pack_facts_for_statements(statements=statements, statement_facts=statement_facts, all_facts=all_facts)
+
+        # Reuse the cached verdicts 
+        statement_fact_digests = self.create_fact_digests_for_statements(statement_facts) if (self.verdict_cache is not None) else [[]] * len(statements)
+        judgements = self.lookup_cached_judgements(statements=statements, statement_fact_digests=statement_fact_digests)
+
+        # A statement without any (relevant) fact fails the validation 
+        judgements = [
+            False if (len(facts) == 0) else j
+            for j, facts in zip(judgements, statement_facts)
+        ]
+
+        # Accept the statements nearly verbatim in their facts 
+        judgements = self.verify_statements_locally(statements, statement_facts, judgements, all_facts)
+
+        return statement_facts, judgements
+
+    def complete_judgements (
+            self, 
+            statements :List[str], 
+            statement_facts :List[List[str]], 
+            judgements :List[Optional[bool]], 
+            pending_indices :List[int], 
+            pending_judgements :List[Optional[bool]]
+    ) -> List[bool]: 
+        for i, j in zip(pending_indices, pending_judgements): 
+            judgements[i] = j 
+
+        # Only the verdicts are cached, not the validations past their deadline 
+        judged_indices = [i for i, j in zip(pending_indices, pending_judgements) if j is not None]
+        if (self.verdict_cache is not None): 
+            judged_statement_facts = [statement_facts[i] for i in judged_indices]
+            self.store_judgements(
+                statements=[statements[i] for i in judged_indices], 
+                statement_fact_digests=self.create_fact_digests_for_statements(judged_statement_facts), 
+                judgements=[judgements[i] for i in judged_indices]
+            )
+
+        # The statements left unverified are dropped 
+        n_unverified = len(pending_indices) - len(judged_indices)
+        if (n_unverified > 0): 
+            logger.warning(f"{n_unverified} statements left unverified before the deadline, dropped")
+        return [j is True for j in judgements]
+
+    def judge_statements (self, statements :List[str], all_facts :List[str]) -> List[bool]: 
+        """
+        Validate the statements against the facts, and return a judgement per statement. 
+        """
+        statement_facts, judgements = self.prepare_judgements(statements=statements, all_facts=all_facts)
+
+        # Only validate the statements without known judgements 
+        pending_indices = [i for i, j in enumerate(judgements) if j is None]
+        pending_judgements = self.validate_statements(
+            statements=[statements[i] for i in pending_indices], 
+            statement_facts=[statement_facts[i] for i in pending_indices]
+        )
+
+        return self.complete_judgements(statements, statement_facts, judgements, pending_indices, pending_judgements)
+
+    async def ajudge_statements (self, statements :List[str], all_facts :List[str]) -> List[bool]: 
+        """
+        Validate the statements against the facts, and return a judgement per statement. 
+        """
+        statement_facts, judgements = self.prepare_judgements(statements=statements, all_facts=all_facts)
+
+        # Only validate the statements without known judgements 
+        pending_indices = [i for i, j in enumerate(judgements) if j is None]
+        pending_judgements = await self.avalidate_statements(
+            statements=[statements[i] for i in pending_indices], 
+            statement_facts=[statement_facts[i] for i in pending_indices]
+        )
+
+        return self.complete_judgements(statements, statement_facts, judgements, pending_indices, pending_judgements)
 
     def __call__(self, state :ReasoningState) -> ReasoningState:
         all_facts = collect_facts_from_state(state)
     
         if (len(all_facts) == 0): 
             # If there is no fact, then, there is no validated statement 
-            logging.info(f"No fact, no validated statement.")
+            logger.info(f"No fact, no validated statement.")
 
             # return 
             return {
                 "validated_statements": [] 
             } 
 
-        else: 
-            # Find out the last AI message 
-            last_ai_message = find_last_chat_message(state["messages"], message_type=AIMessage)
-            assert(last_ai_message is not None), "AIMessage not found"
-            
-            # Get the extracted statements from the state 
-            extracted_statements = state["extracted_statements"] 
-            
-            # validate the extracted statements 
-            encoded_facts = encode_text_list_to_bulleted_paragraph(
-                text_list=all_facts
-            )
+        # Find out the last AI message 
+        last_ai_message = find_last_chat_message(state["messages"], message_type=AIMessage)
+        assert(last_ai_message is not None), "AIMessage not found"
+        
+        # Get the extracted statements from the state 
+        extracted_statements = state["extracted_statements"] 
 
-            logging.info(f"Validating {len(extracted_statements)} extracted statements against {len(all_facts)} facts")
+        # validate the extracted statements 
+        logger.info(f"Validating {len(extracted_statements)} extracted statements against {len(all_facts)} facts")
 
-            validated_statements = [] 
+        judgements = self.judge_statements(statements=extracted_statements, all_facts=all_facts)
+        validated_statements = [es for es, j in zip(extracted_statements, judgements) if j]
+        for es, j in zip(extracted_statements, judgements): 
+            write_progress_event(STATEMENT_VERIFIED_EVENT, {"statement": es, "verified": j})
 
-            for es in extracted_statements: 
-                judgement = self.chain_4_text_validation_against_facts.invoke({
-                    "input": es, 
-                    "facts": encoded_facts
-                })
+        logger.info(f"{len(validated_statements)} statements passed the validation")
 
-                if (judgement): 
-                    validated_statements.append(es)
+        # return 
+        return {
+            "validated_statements": validated_statements
+        }
 
-            logging.info(f"{len(validated_statements)} statements passed the validation")
+    async def acall(self, state :ReasoningState) -> ReasoningState:
+        all_facts = collect_facts_from_state(state)
+    
+        if (len(all_facts) == 0): 
+            # If there is no fact, then, there is no validated statement 
+            logger.info(f"No fact, no validated statement.")
 
             # return 
             return {
-                "validated_statements": validated_statements
-            }
+                "validated_statements": [] 
+            } 
+
+        # Find out the last AI message 
+        last_ai_message = find_last_chat_message(state["messages"], message_type=AIMessage)
+        assert(last_ai_message is not None), "AIMessage not found"
+        
+        # Get the extracted statements from the state 
+        extracted_statements = state["extracted_statements"] 
+
+        # validate the extracted statements 
+        logger.info(f"Validating {len(extracted_statements)} extracted statements against {len(all_facts)} facts")
+
+        judgements = await self.ajudge_statements(statements=extracted_statements, all_facts=all_facts)
+        validated_statements = [es for es, j in zip(extracted_statements, judgements) if j]
+        for es, j in zip(extracted_statements, judgements): 
+            write_progress_event(STATEMENT_VERIFIED_EVENT, {"statement": es, "verified": j})
+
+        logger.info(f"{len(validated_statements)} statements passed the validation")
+
+        # return 
+        return {
+            "validated_statements": validated_statements
+        }
+
+class MicroBatcher: 
+    """
+    Group the streamed items into micro-batches: a batch is dispatched once it holds batch_size items, or timeout_seconds after its first item. 
+    schedule(delay_seconds, callback) runs the callback after the delay, and returns a handle with cancel() (e.g., threading.Timer, or loop.call_later). 
+    The batches are dispatched in order, one at a time. 
+    """
+
+    def __init__(
+            self, 
+            dispatch :Callable[[list], None], 
+            batch_size :int, 
+            timeout_seconds :float, 
+            schedule :Callable[[float, Callable[[], None]], Any]
+    ) -> None: 
+        self.dispatch = dispatch
+        self.batch_size = batch_size
+        self.timeout_seconds = timeout_seconds
+        self.schedule = schedule
+
+        self._lock = threading.Lock()
+        self.batch = []
+        self.n_batches = 0
+        self.timer_handles = []
+
+    def dispatch_batch (self) -> None: 
+        # Called with the lock held 
+        if (len(self.batch) == 0): 
+            return 
+        batch, self.batch = self.batch, []
+        self.n_batches += 1
+        self.dispatch(batch)
+
+    def flush (self, i_batch :Optional[int] = None) -> None: 
+        """
+        Dispatch the pending batch: the i_batch-th batch only (e.g., on its timeout), if given. 
+        """
+        with self._lock: 
+            if (i_batch is None or i_batch == self.n_batches): 
+                self.dispatch_batch()
+
+    def add (self, item) -> None: 
+        with self._lock: 
+            self.batch.append(item)
+            if (len(self.batch) >= self.batch_size): 
+                self.dispatch_batch()
+            elif (len(self.batch) == 1): 
+                i_batch = self.n_batches
+                self.timer_handles.append(self.schedule(self.timeout_seconds, lambda: self.flush(i_batch)))
+
+    def close (self) -> None: 
+        self.flush()
+        for timer_handle in self.timer_handles: 
+            timer_handle.cancel()
+
+def schedule_in_thread (delay_seconds :float, callback :Callable[[], None]) -> threading.Timer: 
+    timer = threading.Timer(delay_seconds, callback)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+class StatementsPipelineNode: 
+    """
+    A node that pipelines the facts collection, the statements extraction and the validation. 
+    The statements are streamed out of the extraction, and validated in micro-batches as soon as they are emitted and the facts are ready: 
+    a micro-batch is sent once it holds the validation batch size of statements, or micro_batch_timeout_seconds after its first statement. 
+    It replaces FactsCollectionNode, LLMResponseStatementsExtractionNode and LLMResponseValidationNode in the pipelined rigorous graph. 
+    """
+
+    name :str = "statements_pipeline"
+    llm_call_priority :int = PRIORITY_BACKGROUND
+    bounded_by_turn_deadline :bool = True
+
+    def __init__(
+            self, 
+            facts_collection_node :FactsCollectionNode, 
+            statements_extraction_node :LLMResponseStatementsExtractionNode, 
+            llm_response_validation_node :LLMResponseValidationNode, 
+            micro_batch_timeout_seconds :float = DEFAULT_MICRO_BATCH_TIMEOUT_SECONDS
+    ) -> None: 
+        self.facts_collection_node = facts_collection_node
+        self.statements_extraction_node = statements_extraction_node
+        self.llm_response_validation_node = llm_response_validation_node
+        self.micro_batch_timeout_seconds = micro_batch_timeout_seconds
+
+    def find_last_ai_message_content (self, state :ReasoningState) -> str: 
+        last_ai_message = find_last_chat_message(state["messages"], message_type=AIMessage)
+        assert(last_ai_message is not None), "AIMessage not found"
+        return last_ai_message.content
+
+    def collect_all_facts (self, state :ReasoningState, facts_update :ReasoningState) -> List[str]: 
+        # The facts update only appends to the fact table 
+        return collect_facts_from_state(state) + facts_update["fact_table"]
+
+    def cancel_if_no_fact (self, cancellation_scope :CancellationScope, state :ReasoningState, facts_future) -> None: 
+        # Without any fact, every statement fails the validation: the extraction can stop 
+        if (facts_future.cancelled() or facts_future.exception() is not None): 
+            return 
+        if (len(self.collect_all_facts(state, facts_future.result())) == 0): 
+            cancellation_scope.cancel("no fact collected")
+
+    def create_state_update (self, facts_update :ReasoningState, statements :List[str], judgements :List[bool]) -> ReasoningState: 
+        validated_statements = [s for s, j in zip(statements, judgements) if j]
+
+        logger.info(f"{len(validated_statements)} out of {len(statements)} extracted statements passed the validation")
+
+        return {
+            **facts_update, 
+            "extracted_statements": statements, 
+            "validated_statements": validated_statements
+        }
+
+    def write_judgements (self, statements :List[str], judgements :List[bool]) -> List[bool]: 
+        for statement, judgement in zip(statements, judgements): 
+            write_progress_event(STATEMENT_VERIFIED_EVENT, {"statement": statement, "verified": judgement})
+        return judgements 
+
+    def __call__(self, state :ReasoningState) -> ReasoningState: 
+        ai_message_content = self.find_last_ai_message_content(state)
+
+        statements = []
+        judgement_futures = []
+        cancellation_scope = get_cancellation_scope(self.facts_collection_node.cancellation_scope_registry, state)
+        # The batches timed out are dispatched from a timer thread: each gets a copy of the context of the node 
+        node_context = contextvars.copy_context()
+
+        with ThreadPoolExecutor(max_workers=self.llm_response_validation_node.max_concurrency + 1) as executor: 
+            # The facts collection runs in the background 
+            facts_future = executor.submit(contextvars.copy_context().run, self.facts_collection_node, state)
+            facts_future.add_done_callback(lambda f: self.cancel_if_no_fact(cancellation_scope, state, f))
+
+            def judge_statements (batch :List[str]) -> List[bool]: 
+                all_facts = self.collect_all_facts(state, facts_future.result())
+                if (len(all_facts) == 0): 
+                    return self.write_judgements(batch, [False] * len(batch))
+                return self.write_judgements(batch, self.llm_response_validation_node.judge_statements(statements=batch, all_facts=all_facts))
+
+            micro_batcher = MicroBatcher(
+                dispatch=lambda batch: judgement_futures.append(executor.submit(node_context.copy().run, judge_statements, batch)), 
+                batch_size=self.llm_response_validation_node.batch_size, 
+                timeout_seconds=self.micro_batch_timeout_seconds, 
+                schedule=schedule_in_thread
+            )
+
+            # The streamed statements are queued for validation in micro-batches 
+            try: 
+                for chunk in cancellation_scope.iterate(self.statements_extraction_node.chain_4_statements_extraction.stream({"input": ai_message_content})): 
+                    for statement in chunk: 
+                        statements.append(statement)
+                        micro_batcher.add(statement)
+            except BranchCancelledError: 
+                logger.info(f"Statements extraction cancelled: {cancellation_scope.reason}")
+            except DeadlineExceededError: 
+                logger.warning(f"Statements extraction past its deadline, validating the statements extracted so far")
+            finally: 
+                micro_batcher.close()
+            write_progress_event(STATEMENTS_EXTRACTED_EVENT, {"n_statements": len(statements)})
+
+            judgements = sum([f.result() for f in judgement_futures], [])
+            facts_update = facts_future.result()
+
+        return self.create_state_update(facts_update=facts_update, statements=statements, judgements=judgements)
+
+    async def acall(self, state :ReasoningState) -> ReasoningState: 
+        ai_message_content = self.find_last_ai_message_content(state)
+
+        statements = []
+        judgement_tasks = []
+        semaphore = asyncio.Semaphore(self.llm_response_validation_node.max_concurrency)
+        cancellation_scope = get_cancellation_scope(self.facts_collection_node.cancellation_scope_registry, state)
+
+        # The facts collection runs in the background 
+        facts_task = asyncio.create_task(self.facts_collection_node.acall(state))
+        facts_task.add_done_callback(lambda t: self.cancel_if_no_fact(cancellation_scope, state, t))
+
+        async def ajudge_statements (batch :List[str]) -> List[bool]: 
+            all_facts = self.collect_all_facts(state, await facts_task)
+            if (len(all_facts) == 0): 
+                return self.write_judgements(batch, [False] * len(batch))
+            async with semaphore: 
+                return self.write_judgements(batch, await self.llm_response_validation_node.ajudge_statements(statements=batch, all_facts=all_facts))
+
+        micro_batcher = MicroBatcher(
+            dispatch=lambda batch: judgement_tasks.append(asyncio.create_task(ajudge_statements(batch))), 
+            batch_size=self.llm_response_validation_node.batch_size, 
+            timeout_seconds=self.micro_batch_timeout_seconds, 
+            schedule=asyncio.get_running_loop().call_later
+        )
+
+        async def aextract_statements () -> None: 
+            # The streamed statements are queued for validation in micro-batches 
+            async for chunk in self.statements_extraction_node.chain_4_statements_extraction.astream({"input": ai_message_content}): 
+                for statement in chunk: 
+                    statements.append(statement)
+                    micro_batcher.add(statement)
+
+        try: 
+            try: 
+                await cancellation_scope.arun(aextract_statements())
+            except BranchCancelledError: 
+                logger.info(f"Statements extraction cancelled: {cancellation_scope.reason}")
+            except DeadlineExceededError: 
+                logger.warning(f"Statements extraction past its deadline, validating the statements extracted so far")
+            finally: 
+                micro_batcher.close()
+            write_progress_event(STATEMENTS_EXTRACTED_EVENT, {"n_statements": len(statements)})
+
+            judgements = sum(await asyncio.gather(*judgement_tasks), [])
+            facts_update = await facts_task
+
+        finally: 
+            # Do not leave background calls running if anything failed 
+            for task in judgement_tasks + [facts_task]: 
+                if (not task.done()): 
+                    task.cancel()
+
+        return self.create_state_update(facts_update=facts_update, statements=statements, judgements=list(judgements))
 
 class LLMResponseRevisementNode: 
 
     name :str = "llm_response_revisement"
+    # The revised answer is on the critical path of the turn 
+    llm_call_priority :int = PRIORITY_CRITICAL
 
     def __init__(
             self, 
-            chat_model :BaseChatModel = create_default_openai_llm()
+            chat_model :Optional[BaseChatModel] = None, 
+            context_packer :Optional[ContextPacker] = None, 
+            latency_policy :Optional[LatencyPolicy] = None
     ) -> None:
-        self.chain_4_statements_summarization = create_chain_for_statements_summarization(llm=chat_model)
+        """
+        chat_model: the LLM to use. If None, the shared default chat model (llms.get_default_chat_model) is resolved on first call. 
+        context_packer: if given, the validated statements over the prompt budget are split and summarized part by part (no statement is dropped). 
+        latency_policy: the deadline and hedging of the LLM calls. If the summarization is past its deadline, the validated statements are answered as a bulleted list. 
+        """
+        self.chat_model = chat_model
+        self.context_packer = context_packer
+        self.latency_policy = latency_policy
+
+    @cached_property
+    def chain_4_statements_summarization (self) -> Runnable: 
+        return create_chain_for_statements_summarization(
+            llm=resolve_chain_llm(self.chat_model, self.latency_policy, "statements_summarization_chain")
+        )
+
+    def create_summarization_inputs (self, validated_statements :List[str]) -> List[Dict]: 
+        """
+        One summarization input per part of the statements within the prompt budget (a single input without a context packer). 
+        """
+        statements_parts = [validated_statements]
+        if (self.context_packer is not None): 
+            max_tokens = self.context_packer.get_items_budget(self.chain_4_statements_summarization.first)
+            statements_parts = self.context_packer.split_items(validated_statements, max_tokens, name="summarization_statements")
+        return [
+            {"statements": encode_text_list_to_bulleted_paragraph(text_list=statements)}
+            for statements in statements_parts
+        ]
+
+    def summarize_statements (self, validated_statements :List[str]) -> str: 
+        summarization_inputs = self.create_summarization_inputs(validated_statements)
+        try: 
+            if (len(summarization_inputs) == 1): 
+                return self.chain_4_statements_summarization.invoke(summarization_inputs[0])
+            return "\n\n".join(self.chain_4_statements_summarization.batch(summarization_inputs))
+        except DeadlineExceededError: 
+            logger.warning(f"Statements summarization past its deadline, answering the validated statements as is")
+            return encode_text_list_to_bulleted_paragraph(text_list=validated_statements)
+
+    async def asummarize_statements (self, validated_statements :List[str]) -> str: 
+        summarization_inputs = self.create_summarization_inputs(validated_statements)
+        try: 
+            if (len(summarization_inputs) == 1): 
+                return await self.chain_4_statements_summarization.ainvoke(summarization_inputs[0])
+            return "\n\n".join(await self.chain_4_statements_summarization.abatch(summarization_inputs))
+        except DeadlineExceededError: 
+            logger.warning(f"Statements summarization past its deadline, answering the validated statements as is")
+            return encode_text_list_to_bulleted_paragraph(text_list=validated_statements)
 
     def __call__(self, state :ReasoningState) -> ReasoningState:
         new_messages = [
-            HumanMessage("Please revise rigorously") 
+            HumanMessage(REVISEMENT_INSTRUCTION) 
+        ]
+
+        validated_statements = state["validated_statements"]
+        if (len(validated_statements) == 0): 
+            new_messages.append(
+                AIMessage(NO_RIGOROUS_ANSWER)
+            )
+
+        else: 
+            new_messages.append(
+                AIMessage(self.summarize_statements(validated_statements))
+            )
+
+        return {
+            "messages": new_messages, 
+            "rigorousness_required": False, # reset rigorousness_required flag
+            "validated_statements": [] 
+        } 
+
+    async def acall(self, state :ReasoningState) -> ReasoningState:
+        new_messages = [
+            HumanMessage(REVISEMENT_INSTRUCTION) 
         ]
 
         validated_statements = state["validated_statements"]
         if (len(validated_statements) == 0): 
             new_messages.append(
-                AIMessage("Sorry, I cannot answer it rigorously...")
+                AIMessage(NO_RIGOROUS_ANSWER)
             )
 
         else: 
             new_messages.append(
-                AIMessage(self.chain_4_statements_summarization.invoke({
-                    "statements": encode_text_list_to_bulleted_paragraph(text_list=validated_statements)
-                }))
+                AIMessage(await self.asummarize_statements(validated_statements))
             )
 
         return {
@@ -311,47 +1740,173 @@ class LLMResponseRevisementNode:
 # ====
 # Rigorous LLM graph 
 # ====
-def create_rigorous_llm_graph (chatbot_subgraph :StateGraph) -> StateGraph: 
+def get_rigorous_llm_settings (graph) -> Optional[Dict]: 
+    """
+    The keyword arguments of create_rigorous_llm_graph which built the given graph (a graph builder, or its compiled graph), or None if not a rigorous graph. 
+    """
+    graph_builder = getattr(graph, "builder", graph)
+    settings = getattr(graph_builder, RIGOROUS_LLM_SETTINGS_ATTRIBUTE, None)
+    return dict(settings) if (settings is not None) else None
+
+
+def create_rigorous_llm_graph (
+        chatbot_subgraph :StateGraph, 
+        chat_model :Optional[BaseChatModel] = None, 
+        validation_batch_size :int = 1, 
+        max_concurrency :int = DEFAULT_MAX_CONCURRENCY, 
+        extraction_cache = None, 
+        verdict_cache :Optional[VerdictCache] = None, 
+        fact_top_k :Optional[int] = None, 
+        fact_min_score :float = 0.0, 
+        fact_dedup_threshold :Optional[float] = None, 
+        local_verifier :Optional[LocalStatementVerifier] = None, 
+        rigorousness_classifier :Optional[RigorousnessClassifier] = None, 
+        rigorousness_judgement_cache = None, 
+        fact_store = None, 
+        fact_store_top_k :Optional[int] = None, 
+        history_compaction_policy :Optional[HistoryCompactionPolicy] = None, 
+        context_packer :Optional[ContextPacker] = None, 
+        latency_policy :Optional[LatencyPolicy] = None, 
+        turn_budget :Optional[TurnBudget] = None, 
+        pipelined :bool = False
+) -> StateGraph: 
+    """
+    chat_model: the LLM used by the rigorous nodes. If None, the shared default chat model is resolved on first call. 
+    extraction_cache: an optional cache (e.g., caches.TieredCache) shared by the facts collection and the statements extraction. 
+    verdict_cache: an optional cache of the statement validation verdicts across turns. 
+    fact_top_k, fact_min_score: if fact_top_k is given, each statement is only validated against its top-k relevant facts from a lexical (BM25) fact index. 
+    fact_dedup_threshold: if given, the new facts with a (shingle) Jaccard similarity of at least this threshold to a known fact are dropped. 
+    local_verifier: if given, the statements nearly verbatim in their facts are accepted without an LLM call (see verifiers.LocalStatementVerifier). 
+    rigorousness_classifier: if given, the user queries it classifies confidently skip the LLM rigorousness judgement (see classifiers.RigorousnessClassifier). 
+    rigorousness_judgement_cache: an optional cache (e.g., caches.LRUCache) of the rigorousness judgements of repeated queries. 
+    fact_store: an optional persistent fact store (e.g., fact_store.SQLiteFactStore) shared across sessions: the sources already in the store are not extracted again. 
+    fact_store_top_k: if given (with a fact store), the top-k stored facts relevant to the user query are collected too, even if the chatbot made no tool call. 
+    history_compaction_policy: if given, the old turns and facts of the conversation are compacted at the start of each turn, which bounds the per-turn cost and the checkpoint size. 
+    context_packer: if given, the validation and summarization prompts are fit into its token budget: the least relevant facts are dropped, and the statements over the budget are split across calls. 
+    latency_policy: if given, the LLM calls of the rigorous nodes follow its per-chain deadlines and hedged requests (see latency_controls.LatencyPolicy). The calls past their deadline degrade gracefully, e.g., the statements left unverified are dropped. 
+    turn_budget: if given, the rigorous stages of each turn end by the deadline of this whole-turn budget, leaving the time for the revised answer (see latency_controls.TurnBudget). 
+    pipelined: if True, the facts collection, the statements extraction and the validation run as one StatementsPipelineNode, which validates each statement while the extraction is still generating. 
+    The keyword arguments are recorded on the graph builder (see get_rigorous_llm_settings), e.g., for the config fingerprint of the answer cache. 
+    """
+    settings = dict(locals())
     graph_builder = StateGraph(ReasoningState) 
+    setattr(graph_builder, RIGOROUS_LLM_SETTINGS_ATTRIBUTE, settings)
+
+    # The per-thread fact indices and deduplicators follow the fact tables of the threads (rebuilt once the history compaction drops facts) 
+    fact_index_registry = FactIndexRegistry() if (fact_top_k is not None) else None
+    fact_deduplicator_registry = FactDeduplicatorRegistry(threshold=fact_dedup_threshold) if (fact_dedup_threshold is not None) else None
+
+    # The rigorous branches of a turn share a cancellation scope, e.g., the statements extraction stops once no fact is collected 
+    cancellation_scope_registry = CancellationScopeRegistry()
 
-    # Start node and its out-going edges 
-    graph_builder.add_node(KEY_CHATBOT_SUBGRAPH, chatbot_subgraph.compile())
-    graph_builder.add_edge(START, KEY_CHATBOT_SUBGRAPH)
+    # The turn deadline is enforced by the latency-controlled chat models, even without per-chain deadlines 
+    if (turn_budget is not None and latency_policy is None): 
+        latency_policy = LatencyPolicy()
 
-    # LLM subgraph and its out-going edges 
-    graph_builder.add_edge(KEY_CHATBOT_SUBGRAPH, RigorousnessJudgementNode.name)
+    # Start node and its out-going edges: the chatbot subgraph and the rigorousness judgement run in parallel 
+    graph_builder.add_node(ChatbotSubgraphNode.name, create_graph_node(ChatbotSubgraphNode(chatbot_subgraph=chatbot_subgraph)))
+    graph_builder.add_edge(START, ChatbotSubgraphNode.name)
 
-    # Rigorousness judgement node and its out-going edges 
-    graph_builder.add_node(RigorousnessJudgementNode.name, RigorousnessJudgementNode())
+    rigorousness_judgement_node = RigorousnessJudgementNode(
+        chat_model=chat_model, 
+        classifier=rigorousness_classifier, 
+        judgement_cache=rigorousness_judgement_cache, 
+        latency_policy=latency_policy
+    )
+    graph_builder.add_node(RigorousnessJudgementNode.name, create_graph_node(rigorousness_judgement_node))
+    graph_builder.add_edge(START, RigorousnessJudgementNode.name)
+
+    gate_inputs = [ChatbotSubgraphNode.name, RigorousnessJudgementNode.name]
+    if (history_compaction_policy is not None): 
+        graph_builder.add_node(HistoryCompactionNode.name, create_graph_node(HistoryCompactionNode(policy=history_compaction_policy, chat_model=chat_model, latency_policy=latency_policy)))
+        graph_builder.add_edge(START, HistoryCompactionNode.name)
+        gate_inputs.append(HistoryCompactionNode.name)
+    if (turn_budget is not None): 
+        graph_builder.add_node(TurnTimerNode.name, create_graph_node(TurnTimerNode(turn_budget=turn_budget)))
+        graph_builder.add_edge(START, TurnTimerNode.name)
+        gate_inputs.append(TurnTimerNode.name)
+
+    # LLM subgraph and rigorousness judgement (and history compaction and turn timer) join at the rigorousness gate 
+    graph_builder.add_node(RigorousnessGate.name, create_graph_node(RigorousnessGate()))
+    graph_builder.add_edge(gate_inputs, RigorousnessGate.name)
+
+    # Rigorousness gate and its out-going edges 
     graph_builder.add_conditional_edges(
-        RigorousnessJudgementNode.name, 
-        rigorousness_judgement_conditional_edge, 
+        RigorousnessGate.name, 
+        partial(rigorousness_judgement_conditional_edge, fact_store=fact_store if (fact_store_top_k is not None) else None, turn_budget=turn_budget), 
         {
             SubTasksLauncher.name: SubTasksLauncher.name, 
+            LLMResponseRevisementNode.name: LLMResponseRevisementNode.name, 
             END: END
         }
     )
 
-    # Sub-tasks launcher node and its out-going edges 
-    graph_builder.add_node(SubTasksLauncher.name, SubTasksLauncher())
-    graph_builder.add_edge(SubTasksLauncher.name, FactsCollectionNode.name)
-    graph_builder.add_edge(SubTasksLauncher.name, LLMResponseStatementsExtractionNode.name)
+    # The rigorous nodes 
+    facts_collection_node = FactsCollectionNode(
+        chat_model=chat_model, 
+        max_concurrency=max_concurrency, 
+        extraction_cache=extraction_cache, 
+        fact_deduplicator_registry=fact_deduplicator_registry, 
+        cancellation_scope_registry=cancellation_scope_registry, 
+        fact_store=fact_store, 
+        fact_store_top_k=fact_store_top_k, 
+        latency_policy=latency_policy
+    )
+    statements_extraction_node = LLMResponseStatementsExtractionNode(
+        chat_model=chat_model, 
+        extraction_cache=extraction_cache, 
+        cancellation_scope_registry=cancellation_scope_registry, 
+        latency_policy=latency_policy, 
+        # The pipeline validates the statements as they are streamed out of the extraction 
+        streaming=(True if (pipelined) else None)
+    )
+    llm_response_validation_node = LLMResponseValidationNode(
+        chat_model=chat_model, 
+        batch_size=validation_batch_size, 
+        max_concurrency=max_concurrency, 
+        verdict_cache=verdict_cache, 
+        fact_index_registry=fact_index_registry, 
+        fact_top_k=fact_top_k, 
+        fact_min_score=fact_min_score, 
+        local_verifier=local_verifier, 
+        context_packer=context_packer, 
+        latency_policy=latency_policy
+    )
+
+    # Sub-tasks launcher node 
+    graph_builder.add_node(SubTasksLauncher.name, create_graph_node(SubTasksLauncher(cancellation_scope_registry=cancellation_scope_registry)))
+
+    if (pipelined): 
+        # Statements pipeline node and its out-going edges 
+        statements_pipeline_node = StatementsPipelineNode(
+            facts_collection_node=facts_collection_node, 
+            statements_extraction_node=statements_extraction_node, 
+            llm_response_validation_node=llm_response_validation_node
+        )
+        graph_builder.add_edge(SubTasksLauncher.name, StatementsPipelineNode.name)
+        graph_builder.add_node(StatementsPipelineNode.name, create_graph_node(statements_pipeline_node))
+        graph_builder.add_edge(StatementsPipelineNode.name, LLMResponseRevisementNode.name)
 
-    # Fact collection node and its out-going edges 
-    graph_builder.add_node(FactsCollectionNode.name, FactsCollectionNode())
-    graph_builder.add_edge(FactsCollectionNode.name, LLMResponseValidationNode.name)
+    else: 
+        # Sub-tasks launcher node's out-going edges 
+        graph_builder.add_edge(SubTasksLauncher.name, FactsCollectionNode.name)
+        graph_builder.add_edge(SubTasksLauncher.name, LLMResponseStatementsExtractionNode.name)
+
+        # Fact collection node and its out-going edges 
+        graph_builder.add_node(FactsCollectionNode.name, create_graph_node(facts_collection_node))
+        graph_builder.add_edge(FactsCollectionNode.name, LLMResponseValidationNode.name)
 
-    # LLM response statements extraction node and its out-going edges 
-    graph_builder.add_node(LLMResponseStatementsExtractionNode.name, LLMResponseStatementsExtractionNode())
-    graph_builder.add_edge(LLMResponseStatementsExtractionNode.name, LLMResponseValidationNode.name)
+        # LLM response statements extraction node and its out-going edges 
+        graph_builder.add_node(LLMResponseStatementsExtractionNode.name, create_graph_node(statements_extraction_node))
+        graph_builder.add_edge(LLMResponseStatementsExtractionNode.name, LLMResponseValidationNode.name)
 
-    # LLM response validation node and its out-going edges 
-    graph_builder.add_node(LLMResponseValidationNode.name, LLMResponseValidationNode())
-    graph_builder.add_edge(LLMResponseValidationNode.name, LLMResponseRevisementNode.name)
+        # LLM response validation node and its out-going edges 
+        graph_builder.add_node(LLMResponseValidationNode.name, create_graph_node(llm_response_validation_node))
+        graph_builder.add_edge(LLMResponseValidationNode.name, LLMResponseRevisementNode.name)
 
     # LLM response revisement node and its out-going edges 
-    graph_builder.add_node(LLMResponseRevisementNode.name, LLMResponseRevisementNode())
+    graph_builder.add_node(LLMResponseRevisementNode.name, create_graph_node(LLMResponseRevisementNode(chat_model=chat_model, context_packer=context_packer, latency_policy=latency_policy)))
     graph_builder.add_edge(LLMResponseRevisementNode.name, END)
 
     # return 
-    return graph_builder
\ No newline at end of file
+    return graph_builder
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional
+from langchain_core.messages import BaseMessage, SystemMessage, RemoveMessage
+
+from .data_definitions import ReasoningState, FactTableTruncation, is_user_query_message, get_fact_table, get_fact_id_offset, get_fact_ids_by_source
+
+
+# ====
+# Constants
+# ====
+# The id of the summary message put before the kept turns (see create_chat_history)
+HISTORY_SUMMARY_MESSAGE_ID = "history_summary"
+
+COMPACTION_MODES = ["drop", "summarize"]
+
+
+# ====
+# History compaction helper functions
+# ====
+def split_messages_into_turns (messages :List[BaseMessage]) -> List[List[BaseMessage]]:
+    """
+    Split the messages into turns: each turn starts with a user query (the messages before the first user query form a turn of their own).
+    """
+    turns = []
+    for message in messages:
+        if (len(turns) == 0 or is_user_query_message(message)):
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def encode_messages_to_transcript (messages :List[BaseMessage], max_chars_per_message :int = 2000) -> str:
+    # The tool messages (e.g., raw search results) and the revisement instructions are left out: the facts are kept in the fact table
+    return "\n".join([
+        f"{message.type}: {str(message.content)[:max_chars_per_message]}"
+        for message in messages
+        if ((is_user_query_message(message) or message.type == "ai") and str(message.content).strip() != "")
+    ])
+
+
+def create_chat_history (state :ReasoningState) -> List[BaseMessage]:
+    """
+    The messages as seen by the chatbot: the summary of the dropped turns (if any) comes first.
+    """
+    history_summary = state.get("history_summary", None)
+    if (not history_summary):
+        return state["messages"]
+    return [SystemMessage(f"Summary of the earlier conversation:\n{history_summary}", id=HISTORY_SUMMARY_MESSAGE_ID)] + state["messages"]
+
+
+# ====
+# History compaction classes
+# ====
+class HistoryCompactionPolicy:
+    """
+    A policy bounding the state of a conversation, so that the per-turn cost and the checkpoint size do not grow with the conversation length.
+    - Only the last max_turns turns (the current one included) are kept in the messages. The older turns are dropped,
+      or (mode "summarize") folded into a running summary which the chatbot sees before the kept turns.
+    - The facts outlive their messages, but if max_facts is given, only the newest max_facts facts are kept in the fact table.
+    """
+
+    def __init__ (
+            self,
+            max_turns :int = 10,
+            mode :str = "drop",
+            max_facts :Optional[int] = None,
+            max_chars_per_message :int = 2000
+    ) -> None:
+        """
+        max_chars_per_message: the messages are truncated to this length in the transcript to summarize.
+        """
+        assert(max_turns >= 1)
+        assert(mode in COMPACTION_MODES), f"Unknown compaction mode: {mode}"
+        assert(max_facts is None or max_facts >= 0)
+        self.max_turns = max_turns
+        self.mode = mode
+        self.max_facts = max_facts
+        self.max_chars_per_message = max_chars_per_message
+
+    def find_dropped_messages (self, state :ReasoningState) -> List[BaseMessage]:
+        turns = split_messages_into_turns(state["messages"])
+        return [message for turn in turns[:-self.max_turns] for message in turn]
+
+    def create_messages_update (self, dropped_messages :List[BaseMessage]) -> ReasoningState:
+        if (len(dropped_messages) == 0):
+            return {}
+        return {
+            "messages": [RemoveMessage(id=message.id) for message in dropped_messages]
+        }
+
+    def create_facts_update (self, state :ReasoningState, dropped_messages :List[BaseMessage]) -> ReasoningState:
+        """
+        Forget the fact sources of the dropped messages, and (with max_facts) drop the oldest facts.
+        """
+        update = {}
+
+        # The fact sources are the ToolMessage ids, and the user query ids (for the fact store retrievals)
+        dropped_ids = set([message.id for message in dropped_messages])
+        fact_ids_by_source :Dict[str, Optional[List[int]]] = {
+            source_id: None
+            for source_id in get_fact_ids_by_source(state)
+            if (source_id in dropped_ids or source_id.split(":", 1)[-1] in dropped_ids)
+        }
+        if (len(fact_ids_by_source) > 0):
+            update["fact_ids_by_source"] = fact_ids_by_source
+
+        n_facts = len(get_fact_table(state))
+        if (self.max_facts is not None and n_facts > self.max_facts):
+            n_dropped_facts = n_facts - self.max_facts
+            update["fact_table"] = FactTableTruncation(n_dropped_facts=n_dropped_facts)
+            update["fact_id_offset"] = get_fact_id_offset(state) + n_dropped_facts
+        return update
+
+    def create_transcript (self, dropped_messages :List[BaseMessage]) -> str:
+        return encode_messages_to_transcript(dropped_messages, max_chars_per_message=self.max_chars_per_message)
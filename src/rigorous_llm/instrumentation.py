@@ -0,0 +1,399 @@
+"""
+Instrumentation of the graph runs: per-node and per-chain wall time, LLM calls, prompt/completion tokens, cache hits, context packing and parser time.
+
+The metrics are collected by a callback handler, so that nothing is measured unless the handler is given in the run config:
+
+    handler = InstrumentationCallbackHandler(exporters=[JsonlExporter("metrics.jsonl")])
+    graph.invoke(state, config={"callbacks": [handler]})
+    print(handler.last_run_metrics.summary())
+
+A node is a run whose name is its langgraph_node (metadata), a chain is a run directly under the node runnable (e.g., the chains of chains.py,
+named *_chain), and a parser is a run named *OutputParser. The LLM calls, tokens, cache lookups and parser time are attributed to the enclosing node and chain.
+The cache lookups are reported by the caches' users with record_cache_lookups, and the items dropped or split to fit the prompt budgets
+with record_context_packing (both as custom callback events).
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.callbacks.manager import dispatch_custom_event
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables.config import ensure_config
+
+
+CACHE_EVENT_NAME = "rigorous_llm_cache_lookups"
+CONTEXT_PACKING_EVENT_NAME = "rigorous_llm_context_packing"
+
+STEP_METRIC_NAMES = [
+    "n_runs",
+    "n_errors",
+    "wall_seconds",
+    "n_llm_calls",
+    "llm_seconds",
+    "prompt_tokens",
+    "completion_tokens",
+    "cache_hits",
+    "cache_misses",
+    "context_items_dropped",
+    "context_splits",
+    "parser_seconds"
+]
+
+
+# ====
+# Instrumentation helper functions
+# ====
+def record_cache_lookups (cache_name :str, n_hits :int, n_misses :int = 0) -> None:
+    """
+    Report cache lookups to the instrumentation handler of the running graph (if any), attributed to the current node and chain.
+    It costs nothing without callbacks, and is ignored outside of a run.
+    """
+    if (n_hits + n_misses == 0 or not ensure_config().get("callbacks")):
+        return
+    dispatch_event_if_in_run(CACHE_EVENT_NAME, {"cache": cache_name, "n_hits": n_hits, "n_misses": n_misses})
+
+def record_context_packing (name :str, n_dropped_items :int = 0, n_splits :int = 0) -> None:
+    """
+    Report the items dropped (or the extra calls made by splitting the items) to fit a prompt budget, see context_packing.ContextPacker.
+    """
+    if (n_dropped_items + n_splits == 0 or not ensure_config().get("callbacks")):
+        return
+    dispatch_event_if_in_run(CONTEXT_PACKING_EVENT_NAME, {"name": name, "n_dropped_items": n_dropped_items, "n_splits": n_splits})
+
+def dispatch_event_if_in_run (event_name :str, data :Dict) -> None:
+    try:
+        dispatch_custom_event(event_name, data)
+    except RuntimeError:
+        # Not within a run
+        pass
+
+def get_token_usage (response :LLMResult) -> Dict[str, int]:
+    """
+    Get the prompt/completion tokens of an LLM response, from the usage metadata of the messages, or else from the provider's llm_output.
+    """
+    prompt_tokens, completion_tokens = 0, 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if (usage):
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+
+    if (prompt_tokens + completion_tokens == 0):
+        token_usage = (response.llm_output or {}).get("token_usage", None) or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+
+# ====
+# Metrics classes
+# ====
+class StepMetrics:
+    """
+    The metrics of a node or a chain, accumulated over its runs.
+    """
+
+    def __init__ (self) -> None:
+        for metric_name in STEP_METRIC_NAMES:
+            setattr(self, metric_name, 0)
+
+    def add (self, **increments) -> None:
+        for metric_name, increment in increments.items():
+            setattr(self, metric_name, getattr(self, metric_name) + increment)
+
+    def to_dict (self) -> Dict[str, float]:
+        return {metric_name: getattr(self, metric_name) for metric_name in STEP_METRIC_NAMES}
+
+class RunMetrics:
+    """
+    The metrics of one graph run (a root run of the callbacks): the totals, the metrics by node and by chain, and the lookups by cache.
+    """
+
+    def __init__ (self, run_id :str, name :str, metadata :Optional[Dict] = None) -> None:
+        self.run_id = run_id
+        self.name = name
+        self.metadata = metadata if (metadata is not None) else {}
+        self.started_at = time.time()
+        self.wall_seconds = None
+        self.error = None
+
+        self.totals = StepMetrics()
+        self.nodes :Dict[str, StepMetrics] = {}
+        self.chains :Dict[str, StepMetrics] = {}
+        self.caches :Dict[str, Dict[str, int]] = {}
+        self.context_packing :Dict[str, Dict[str, int]] = {}
+
+    def add (self, node :Optional[str], chain :Optional[str], **increments) -> None:
+        self.totals.add(**increments)
+        if (node is not None):
+            self.nodes.setdefault(node, StepMetrics()).add(**increments)
+        if (chain is not None):
+            self.chains.setdefault(chain, StepMetrics()).add(**increments)
+
+    def add_cache_lookups (self, node :Optional[str], chain :Optional[str], cache_name :str, n_hits :int, n_misses :int) -> None:
+        self.add(node, chain, cache_hits=n_hits, cache_misses=n_misses)
+        cache_metrics = self.caches.setdefault(cache_name, {"hits": 0, "misses": 0})
+        cache_metrics["hits"] += n_hits
+        cache_metrics["misses"] += n_misses
+
+    def add_context_packing (self, node :Optional[str], chain :Optional[str], name :str, n_dropped_items :int, n_splits :int) -> None:
+        self.add(node, chain, context_items_dropped=n_dropped_items, context_splits=n_splits)
+        packing_metrics = self.context_packing.setdefault(name, {"dropped_items": 0, "splits": 0})
+        packing_metrics["dropped_items"] += n_dropped_items
+        packing_metrics["splits"] += n_splits
+
+    def summary (self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "metadata": self.metadata,
+            "started_at": self.started_at,
+            "wall_seconds": self.wall_seconds,
+            "error": self.error,
+            "totals": self.totals.to_dict(),
+            "nodes": {name: m.to_dict() for name, m in self.nodes.items()},
+            "chains": {name: m.to_dict() for name, m in self.chains.items()},
+            "caches": {name: dict(m) for name, m in self.caches.items()},
+            "context_packing": {name: dict(m) for name, m in self.context_packing.items()}
+        }
+
+class RunInfo:
+    """
+    A run in flight, with the node and the chain it is attributed to.
+    """
+
+    __slots__ = ["kind", "name", "node", "chain", "root_id", "started_at"]
+
+    def __init__ (self, kind :str, name :str, node :Optional[str], chain :Optional[str], root_id, started_at :float) -> None:
+        self.kind = kind
+        self.name = name
+        self.node = node
+        self.chain = chain
+        self.root_id = root_id
+        self.started_at = started_at
+
+
+# ====
+# Callback handler
+# ====
+class InstrumentationCallbackHandler (BaseCallbackHandler):
+    """
+    Collect the RunMetrics of the graph runs it is given to (config={"callbacks": [handler]}), and pass them to the exporters once a run ends.
+    One handler may serve concurrent runs: each root run gets its own RunMetrics.
+    """
+
+    def __init__ (self, exporters :Optional[List[Any]] = None) -> None:
+        self.exporters = exporters if (exporters is not None) else []
+        self.last_run_metrics :Optional[RunMetrics] = None
+        self._runs :Dict[Any, RunInfo] = {}
+        self._metrics_by_root :Dict[Any, RunMetrics] = {}
+        self._lock = threading.Lock()
+
+    def start_run (self, kind :str, name :str, run_id, parent_run_id, metadata :Optional[Dict]) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            parent = self._runs.get(parent_run_id, None) if (parent_run_id is not None) else None
+            if (parent is None):
+                # A root run (or a run whose parent was not seen)
+                self._metrics_by_root[run_id] = RunMetrics(run_id=str(run_id), name=name, metadata=dict(metadata or {}))
+                root_id, node, chain = run_id, None, None
+            else:
+                root_id, node, chain = parent.root_id, parent.node, parent.chain
+
+            if (kind == "chain"):
+                if (name == (metadata or {}).get("langgraph_node", None) and not name.startswith("__")):
+                    # The langgraph task of a node runs the node runnable (of the same name) and then the channel writes
+                    kind = "node_body" if (parent is not None and parent.kind == "node" and parent.name == name) else "node"
+                    node, chain = name, None
+                elif (name.endswith("OutputParser")):
+                    kind = "parser"
+                elif (parent is not None and parent.kind == "node_body"):
+                    chain = name
+                else:
+                    kind = "other"
+
+            self._runs[run_id] = RunInfo(kind=kind, name=name, node=node, chain=chain, root_id=root_id, started_at=now)
+
+    def end_run (self, run_id, error :Optional[BaseException] = None, **increments) -> None:
+        now = time.perf_counter()
+        exported_metrics = None
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if (run is None):
+                return
+            metrics = self._metrics_by_root.get(run.root_id, None)
+            if (metrics is None):
+                return
+
+            elapsed = now - run.started_at
+            n_errors = int(error is not None)
+            if (run.kind == "node"):
+                metrics.nodes.setdefault(run.node, StepMetrics()).add(n_runs=1, n_errors=n_errors, wall_seconds=elapsed)
+            elif (run.kind == "chain"):
+                metrics.chains.setdefault(run.chain, StepMetrics()).add(n_runs=1, n_errors=n_errors, wall_seconds=elapsed)
+            elif (run.kind == "parser"):
+                metrics.add(run.node, run.chain, parser_seconds=elapsed)
+            elif (run.kind == "llm"):
+                metrics.add(run.node, run.chain, n_llm_calls=1, n_errors=n_errors, llm_seconds=elapsed, **increments)
+
+            if (run_id == run.root_id):
+                metrics.wall_seconds = elapsed
+                metrics.totals.add(n_runs=1, n_errors=n_errors, wall_seconds=elapsed)
+                metrics.error = (f"{type(error).__name__}: {error}") if (error is not None) else None
+                del self._metrics_by_root[run_id]
+                self.last_run_metrics = metrics
+                exported_metrics = metrics
+
+        if (exported_metrics is not None):
+            for exporter in self.exporters:
+                exporter.export(exported_metrics)
+
+    def on_chain_start (self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs) -> None:
+        if (name is None):
+            name = (serialized or {}).get("name", None) or "unknown"
+        self.start_run("chain", name, run_id, parent_run_id, metadata)
+
+    def on_chain_end (self, outputs, *, run_id, **kwargs) -> None:
+        self.end_run(run_id)
+
+    def on_chain_error (self, error :BaseException, *, run_id, **kwargs) -> None:
+        self.end_run(run_id, error=error)
+
+    def on_chat_model_start (self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs) -> None:
+        self.start_run("llm", "chat_model", run_id, parent_run_id, metadata)
+
+    def on_llm_start (self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs) -> None:
+        self.start_run("llm", "llm", run_id, parent_run_id, metadata)
+
+    def on_llm_end (self, response :LLMResult, *, run_id, **kwargs) -> None:
+        self.end_run(run_id, **get_token_usage(response))
+
+    def on_llm_error (self, error :BaseException, *, run_id, **kwargs) -> None:
+        self.end_run(run_id, error=error)
+
+    def on_custom_event (self, name :str, data :Any, *, run_id, **kwargs) -> None:
+        if (name not in [CACHE_EVENT_NAME, CONTEXT_PACKING_EVENT_NAME]):
+            return
+        with self._lock:
+            run = self._runs.get(run_id, None)
+            metrics = self._metrics_by_root.get(run.root_id, None) if (run is not None) else None
+            if (metrics is None):
+                return
+            if (name == CACHE_EVENT_NAME):
+                metrics.add_cache_lookups(run.node, run.chain, data["cache"], data["n_hits"], data["n_misses"])
+            else:
+                metrics.add_context_packing(run.node, run.chain, data["name"], data["n_dropped_items"], data["n_splits"])
+
+
+# ====
+# Exporters
+# ====
+class InMemoryExporter:
+    """
+    Keep the summaries of the last max_size runs in memory (e.g., for tests and notebooks).
+    """
+
+    def __init__ (self, max_size :int = 1000) -> None:
+        self.summaries = deque(maxlen=max_size)
+
+    def export (self, metrics :RunMetrics) -> None:
+        self.summaries.append(metrics.summary())
+
+class JsonlExporter:
+    """
+    Append the summary of every run to a JSONL file.
+    """
+
+    def __init__ (self, path :str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export (self, metrics :RunMetrics) -> None:
+        line = json.dumps(metrics.summary(), ensure_ascii=False, default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+class PrometheusExporter:
+    """
+    Accumulate the run metrics as Prometheus counters (labelled by node, chain and cache), rendered in the Prometheus text format.
+    If a path is given, the text is (atomically) rewritten there after every run, e.g., for the textfile collector of the node exporter.
+    """
+
+    def __init__ (self, path :Optional[str] = None, prefix :str = "rigorous_llm") -> None:
+        self.path = path
+        self.prefix = prefix
+        self.n_runs = 0
+        self.n_failed_runs = 0
+        self.run_seconds = 0.0
+        self.steps :Dict[tuple, StepMetrics] = {} # (kind, name) -> accumulated metrics
+        self.caches :Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def export (self, metrics :RunMetrics) -> None:
+        with self._lock:
+            self.n_runs += 1
+            self.n_failed_runs += int(metrics.error is not None)
+            self.run_seconds += metrics.wall_seconds or 0.0
+            for kind, steps in [("node", metrics.nodes), ("chain", metrics.chains)]:
+                for name, step_metrics in steps.items():
+                    self.steps.setdefault((kind, name), StepMetrics()).add(**step_metrics.to_dict())
+            for cache_name, cache_metrics in metrics.caches.items():
+                accumulated = self.caches.setdefault(cache_name, {"hits": 0, "misses": 0})
+                accumulated["hits"] += cache_metrics["hits"]
+                accumulated["misses"] += cache_metrics["misses"]
+            text = self.render_unlocked()
+
+        if (self.path is not None):
+            tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def escape_label_value (value :str) -> str:
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def render_unlocked (self) -> str:
+        lines = []
+        def add_metric (name :str, help_text :str, samples :List[tuple]) -> None:
+            lines.append(f"# HELP {self.prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            for labels, value in samples:
+                label_text = ",".join([f"{k}=\"{self.escape_label_value(v)}\"" for k, v in labels.items()])
+                lines.append(f"{self.prefix}_{name}{{{label_text}}} {value}" if (len(label_text) > 0) else f"{self.prefix}_{name} {value}")
+
+        add_metric("runs_total", "Graph runs.", [({}, self.n_runs)])
+        add_metric("failed_runs_total", "Failed graph runs.", [({}, self.n_failed_runs)])
+        add_metric("run_seconds_total", "Wall time of the graph runs.", [({}, self.run_seconds)])
+
+        step_items = sorted(self.steps.items())
+        for metric_name, exported_name, help_text in [
+            ("n_runs", "step_runs_total", "Runs of the step."),
+            ("n_errors", "step_errors_total", "Failed runs and LLM calls of the step."),
+            ("wall_seconds", "step_seconds_total", "Wall time of the step."),
+            ("n_llm_calls", "step_llm_calls_total", "LLM calls made by the step."),
+            ("llm_seconds", "step_llm_seconds_total", "Time spent in the LLM calls of the step."),
+            ("prompt_tokens", "step_prompt_tokens_total", "Prompt tokens sent by the step."),
+            ("completion_tokens", "step_completion_tokens_total", "Completion tokens received by the step."),
+            ("cache_hits", "step_cache_hits_total", "Cache hits of the step."),
+            ("cache_misses", "step_cache_misses_total", "Cache misses of the step."),
+            ("context_items_dropped", "step_context_items_dropped_total", "Prompt items dropped by the step to fit the token budget."),
+            ("context_splits", "step_context_splits_total", "Extra calls made by the step by splitting the prompt items to fit the token budget."),
+            ("parser_seconds", "step_parser_seconds_total", "Time spent in the output parsers of the step.")
+        ]:
+            add_metric(exported_name, help_text, [({"kind": kind, "step": name}, getattr(m, metric_name)) for (kind, name), m in step_items])
+
+        cache_items = sorted(self.caches.items())
+        add_metric("cache_hits_total", "Cache hits.", [({"cache": name}, m["hits"]) for name, m in cache_items])
+        add_metric("cache_misses_total", "Cache misses.", [({"cache": name}, m["misses"]) for name, m in cache_items])
+        return "\n".join(lines) + "\n"
+
+    def render (self) -> str:
+        with self._lock:
+            return self.render_unlocked()
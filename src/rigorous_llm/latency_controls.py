@@ -0,0 +1,191 @@
+import time
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+from .data_definitions import ReasoningState
+
+
+# ====
+# Constants
+# ====
+# The share of the turn budget reserved for the revised answer, by default
+DEFAULT_REVISEMENT_RESERVE_RATIO = 0.25
+
+# The chains whose calls are streamed (not hedged) by default: the revised answer (see streaming.py)
+DEFAULT_STREAMING_CHAINS = ["statements_summarization_chain"]
+
+
+# ====
+# LLM call deadline (per context)
+# ====
+class DeadlineExceededError (Exception):
+    """An LLM call given up at its deadline (see LatencyPolicy and TurnBudget)."""
+
+
+_llm_call_deadline :contextvars.ContextVar = contextvars.ContextVar("rigorous_llm_call_deadline", default=None)
+
+
+@contextlib.contextmanager
+def llm_call_deadline (deadline :Optional[float]) -> Iterator[None]:
+    """
+    Bound the LLM calls made within the context (including the threads and tasks started within it) by a deadline (a time.time() timestamp).
+    Nested deadlines only tighten the bound, and None keeps the current one.
+    """
+    current_deadline = _llm_call_deadline.get()
+    if (deadline is not None and current_deadline is not None):
+        deadline = min(deadline, current_deadline)
+    token = _llm_call_deadline.set(deadline if (deadline is not None) else current_deadline)
+    try:
+        yield
+    finally:
+        _llm_call_deadline.reset(token)
+
+
+def get_llm_call_deadline () -> Optional[float]:
+    return _llm_call_deadline.get()
+
+
+def get_remaining_seconds (deadline :Optional[float]) -> Optional[float]:
+    return (deadline - time.time()) if (deadline is not None) else None
+
+
+# ====
+# Latency control classes
+# ====
+class LatencyTracker:
+    """
+    A sliding window of the recent latencies (in seconds) of a chain, for the percentiles.
+    """
+
+    def __init__ (self, window_size :int = 200) -> None:
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=window_size)
+
+    def observe (self, latency_seconds :float) -> None:
+        with self._lock:
+            self.latencies.append(latency_seconds)
+
+    def percentile (self, percentile :float) -> Optional[float]:
+        with self._lock:
+            if (len(self.latencies) == 0):
+                return None
+            sorted_latencies = sorted(self.latencies)
+        return sorted_latencies[min(len(sorted_latencies)-1, int(round(percentile / 100.0 * (len(sorted_latencies)-1))))]
+
+    def __len__ (self) -> int:
+        return len(self.latencies)
+
+class LatencyPolicy:
+    """
+    Per-chain deadlines and hedged requests of the LLM calls (applied by llms.LatencyControlledChatModel, see wrap_chat_model).
+    - Deadline: an LLM call of a chain gives up (DeadlineExceededError) after deadline_seconds_by_chain[chain] (else deadline_seconds),
+      or at the deadline of its context (see llm_call_deadline, e.g., the turn budget), whichever comes first.
+    - Hedging: if hedge_percentile is given, a duplicate of a call is sent once the call is slower than this percentile of the recent latencies of its chain,
+      and the first answer is taken. Until hedge_min_samples latencies are observed, hedge_delay_seconds (if given) is the delay.
+    - Streaming: the calls of the streaming_chains may be streamed (e.g., with graph.astream(stream_mode="messages")), but are not hedged.
+      The calls of the other chains are never streamed, unless their chat model is wrapped with streaming=True (e.g., the statements extraction of the pipelined graph).
+    """
+
+    def __init__ (
+            self,
+            deadline_seconds :Optional[float] = None,
+            deadline_seconds_by_chain :Optional[Dict[str, float]] = None,
+            hedge_percentile :Optional[float] = None,
+            hedge_min_samples :int = 20,
+            hedge_delay_seconds :Optional[float] = None,
+            hedge_min_delay_seconds :float = 0.0,
+            window_size :int = 200,
+            streaming_chains :Optional[List[str]] = None
+    ) -> None:
+        assert(hedge_percentile is None or 0 < hedge_percentile < 100)
+        self.deadline_seconds = deadline_seconds
+        self.deadline_seconds_by_chain = deadline_seconds_by_chain if (deadline_seconds_by_chain is not None) else {}
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.window_size = window_size
+        self.streaming_chains = streaming_chains if (streaming_chains is not None) else DEFAULT_STREAMING_CHAINS
+
+        self._lock = threading.Lock()
+        self.trackers :Dict[str, LatencyTracker] = {}
+        self.n_calls = 0
+        self.n_hedged_calls = 0
+        self.n_hedge_wins = 0
+        self.n_deadline_exceeded = 0
+
+    def get_tracker (self, chain_name :str) -> LatencyTracker:
+        with self._lock:
+            if (chain_name not in self.trackers):
+                self.trackers[chain_name] = LatencyTracker(window_size=self.window_size)
+            return self.trackers[chain_name]
+
+    def get_deadline (self, chain_name :str) -> Optional[float]:
+        """
+        The deadline (a time.time() timestamp) of a call of the chain starting now: the tighter of the chain deadline and the context deadline.
+        """
+        deadline_seconds = self.deadline_seconds_by_chain.get(chain_name, self.deadline_seconds)
+        deadlines = [d for d in [get_llm_call_deadline(), (time.time() + deadline_seconds) if (deadline_seconds is not None) else None] if d is not None]
+        return min(deadlines) if (len(deadlines) > 0) else None
+
+    def get_hedge_delay_seconds (self, chain_name :str) -> Optional[float]:
+        if (self.hedge_percentile is None):
+            return None
+        tracker = self.get_tracker(chain_name)
+        if (len(tracker) < self.hedge_min_samples):
+            return self.hedge_delay_seconds
+        return max(self.hedge_min_delay_seconds, tracker.percentile(self.hedge_percentile))
+
+    def record_call (self, hedged :bool = False, hedge_won :bool = False, deadline_exceeded :bool = False) -> None:
+        with self._lock:
+            self.n_calls += 1
+            self.n_hedged_calls += int(hedged)
+            self.n_hedge_wins += int(hedge_won)
+            self.n_deadline_exceeded += int(deadline_exceeded)
+
+    def wrap_chat_model (self, chat_model, chain_name :str, streaming :Optional[bool] = None):
+        """
+        Wrap a chat model so that its calls (of the chain) follow this policy.
+        streaming: whether the calls may be streamed. If None, only if the chain is one of the streaming_chains.
+        """
+        # Deferred import: llms imports this module
+        from .llms import LatencyControlledChatModel
+        return LatencyControlledChatModel(
+            chat_model=chat_model,
+            chain_name=chain_name,
+            policy=self,
+            disable_streaming=not (streaming if (streaming is not None) else (chain_name in self.streaming_chains))
+        )
+
+class TurnBudget:
+    """
+    A whole-turn latency budget, from the start of the turn.
+    - The rigorous stages (the facts collection, the statements extraction and the validation) must end revisement_reserve_seconds before the end of the budget,
+      leaving the time for the revised answer: their LLM calls give up at that deadline, and the statements left unverified are dropped.
+    - If less than min_rigorous_seconds are left at the rigorousness gate, the rigorous stages are skipped, straight to the revisement.
+    """
+
+    def __init__ (
+            self,
+            budget_seconds :float,
+            revisement_reserve_seconds :Optional[float] = None,
+            min_rigorous_seconds :float = 0.0
+    ) -> None:
+        """
+        revisement_reserve_seconds: by default, DEFAULT_REVISEMENT_RESERVE_RATIO of the budget.
+        """
+        assert(budget_seconds > 0)
+        self.budget_seconds = budget_seconds
+        self.revisement_reserve_seconds = revisement_reserve_seconds if (revisement_reserve_seconds is not None) else DEFAULT_REVISEMENT_RESERVE_RATIO * budget_seconds
+        self.min_rigorous_seconds = min_rigorous_seconds
+
+    def create_turn_deadline (self) -> float:
+        # The deadline of the rigorous stages of a turn starting now
+        return time.time() + self.budget_seconds - self.revisement_reserve_seconds
+
+    def has_time_for_rigorous_stages (self, state :ReasoningState) -> bool:
+        remaining_seconds = get_remaining_seconds(state.get("turn_deadline", None))
+        return (remaining_seconds is None or remaining_seconds >= self.min_rigorous_seconds)
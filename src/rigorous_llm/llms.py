@@ -1,14 +1,493 @@
-import os 
-from langchain.chat_models.base import BaseChatModel
-from langchain_openai.chat_models import ChatOpenAI
+import os
+import time
+import uuid
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Callable, Iterator, List, Optional
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, BaseCallbackHandler, CallbackManagerForLLMRun
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables.base import RunnableBinding
+from langchain_core.language_models.chat_models import BaseChatModel
 
+from .latency_controls import DeadlineExceededError, get_remaining_seconds
+from .rate_limiters import get_shared_rate_limiter, get_retry_after_seconds, is_throttling_error, is_transient_error
+from .utils import estimate_token_count
 
-def create_default_openai_llm () -> BaseChatModel: 
+
+# ====
+# Streaming helper functions
+# ====
+def create_generation_chunk (result :ChatResult) -> ChatGenerationChunk:
+    message = result.generations[0].message
+    return ChatGenerationChunk(message=AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=getattr(message, "usage_metadata", None),
+        id=message.id
+    ))
+
+
+def stream_chat_model (chat_model :BaseChatModel, messages :List[BaseMessage], stop=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+    """
+    Stream the chunks of a call of the (wrapped) chat model, or its whole response as one chunk if it does not stream.
+    The wrapper reports the streamed tokens to its callbacks: the wrapped chat model gets no run manager, so that they are not reported twice.
+    """
+    if (type(chat_model)._stream == BaseChatModel._stream):
+        yield create_generation_chunk(chat_model._generate(messages, stop=stop, **kwargs))
+        return
+    yield from chat_model._stream(messages, stop=stop, **kwargs)
+
+
+async def astream_chat_model (chat_model :BaseChatModel, messages :List[BaseMessage], stop=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+    if (type(chat_model)._astream == BaseChatModel._astream and type(chat_model)._stream == BaseChatModel._stream):
+        yield create_generation_chunk(await chat_model._agenerate(messages, stop=stop, **kwargs))
+        return
+    async for chunk in chat_model._astream(messages, stop=stop, **kwargs):
+        yield chunk
+
+
+def get_chunk_used_tokens (chunk :ChatGenerationChunk) -> Optional[int]:
+    usage = getattr(chunk.message, "usage_metadata", None)
+    return usage.get("total_tokens", usage.get("input_tokens", 0) + usage.get("output_tokens", 0)) if (usage) else None
+
+
+# ====
+# Rate-limited chat model
+# ====
+class RateLimitedChatModel (BaseChatModel):
+    """
+    A chat model whose calls go through a rate limiter: limiter, or else the limiter shared by the process (see rate_limiters.py).
+    (Unlike the rate_limiter of the langchain chat models, it also bounds the concurrency of the calls and adapts to throttling.)
+    - Every call waits for the limiter, with the estimated tokens of the prompt plus expected_completion_tokens, and the priority of its context.
+    - A throttled call (e.g., HTTP 429) is reported to the limiter, which backs off, and retried up to max_retries times.
+      A call failing with a transient error (e.g., HTTP 5xx) is retried after an exponential backoff (from retry_backoff_seconds).
+    The wrapped chat model should not retry the calls itself (e.g., ChatOpenAI with max_retries=0), so that the limiter sees the throttled ones.
+    The streamed calls go through the limiter the same way, but a stream is only retried before its first chunk.
+    """
+
+    chat_model :BaseChatModel
+    limiter :Optional[Any] = None
+    max_retries :int = 3
+    retry_backoff_seconds :float = 0.5
+    expected_completion_tokens :int = 256
+
+    @property
+    def _llm_type (self) -> str:
+        return f"rate_limited_{self.chat_model._llm_type}"
+
+    def get_rate_limiter (self):
+        return self.limiter if (self.limiter is not None) else get_shared_rate_limiter()
+
+    def estimate_tokens (self, messages :List[BaseMessage]) -> int:
+        return sum([estimate_token_count(str(m.content)) for m in messages]) + self.expected_completion_tokens
+
+    @staticmethod
+    def get_used_tokens (result :ChatResult) -> Optional[int]:
+        usage = getattr(result.generations[0].message, "usage_metadata", None) if (len(result.generations) > 0) else None
+        if (usage):
+            return usage.get("total_tokens", usage.get("input_tokens", 0) + usage.get("output_tokens", 0))
+        token_usage = (result.llm_output or {}).get("token_usage", None)
+        return token_usage.get("total_tokens", None) if (token_usage) else None
+
+    def _generate (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        rate_limiter = self.get_rate_limiter()
+        n_tokens = self.estimate_tokens(messages)
+        for i_try in range(self.max_retries + 1):
+            rate_limiter.acquire(n_tokens=n_tokens)
+            try:
+                result = self.chat_model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as err:
+                throttled = is_throttling_error(err)
+                rate_limiter.release(n_estimated_tokens=n_tokens, throttled=throttled, retry_after_seconds=get_retry_after_seconds(err))
+                if (i_try < self.max_retries and throttled):
+                    continue
+                if (i_try < self.max_retries and is_transient_error(err)):
+                    time.sleep(self.retry_backoff_seconds * (2 ** i_try))
+                    continue
+                raise
+            except BaseException:
+                rate_limiter.release(n_estimated_tokens=n_tokens)
+                raise
+            rate_limiter.release(n_estimated_tokens=n_tokens, n_used_tokens=self.get_used_tokens(result))
+            return result
+
+    async def _agenerate (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        rate_limiter = self.get_rate_limiter()
+        n_tokens = self.estimate_tokens(messages)
+        for i_try in range(self.max_retries + 1):
+            await rate_limiter.aacquire(n_tokens=n_tokens)
+            try:
+                result = await self.chat_model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as err:
+                throttled = is_throttling_error(err)
+                rate_limiter.release(n_estimated_tokens=n_tokens, throttled=throttled, retry_after_seconds=get_retry_after_seconds(err))
+                if (i_try < self.max_retries and throttled):
+                    continue
+                if (i_try < self.max_retries and is_transient_error(err)):
+                    await asyncio.sleep(self.retry_backoff_seconds * (2 ** i_try))
+                    continue
+                raise
+            except BaseException:
+                # e.g., the task is cancelled
+                rate_limiter.release(n_estimated_tokens=n_tokens)
+                raise
+            rate_limiter.release(n_estimated_tokens=n_tokens, n_used_tokens=self.get_used_tokens(result))
+            return result
+
+    def _stream (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        rate_limiter = self.get_rate_limiter()
+        n_tokens = self.estimate_tokens(messages)
+        for i_try in range(self.max_retries + 1):
+            rate_limiter.acquire(n_tokens=n_tokens)
+            n_chunks = 0
+            n_used_tokens = None
+            try:
+                for chunk in stream_chat_model(self.chat_model, messages, stop=stop, **kwargs):
+                    n_chunks += 1
+                    n_used_tokens = get_chunk_used_tokens(chunk) or n_used_tokens
+                    yield chunk
+            except Exception as err:
+                throttled = is_throttling_error(err)
+                rate_limiter.release(n_estimated_tokens=n_tokens, throttled=throttled, retry_after_seconds=get_retry_after_seconds(err))
+                if (n_chunks == 0 and i_try < self.max_retries and throttled):
+                    continue
+                if (n_chunks == 0 and i_try < self.max_retries and is_transient_error(err)):
+                    time.sleep(self.retry_backoff_seconds * (2 ** i_try))
+                    continue
+                raise
+            except BaseException:
+                # e.g., the stream is closed by its consumer
+                rate_limiter.release(n_estimated_tokens=n_tokens)
+                raise
+            rate_limiter.release(n_estimated_tokens=n_tokens, n_used_tokens=n_used_tokens)
+            return
+
+    async def _astream (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        rate_limiter = self.get_rate_limiter()
+        n_tokens = self.estimate_tokens(messages)
+        for i_try in range(self.max_retries + 1):
+            await rate_limiter.aacquire(n_tokens=n_tokens)
+            n_chunks = 0
+            n_used_tokens = None
+            try:
+                async for chunk in astream_chat_model(self.chat_model, messages, stop=stop, **kwargs):
+                    n_chunks += 1
+                    n_used_tokens = get_chunk_used_tokens(chunk) or n_used_tokens
+                    yield chunk
+            except Exception as err:
+                throttled = is_throttling_error(err)
+                rate_limiter.release(n_estimated_tokens=n_tokens, throttled=throttled, retry_after_seconds=get_retry_after_seconds(err))
+                if (n_chunks == 0 and i_try < self.max_retries and throttled):
+                    continue
+                if (n_chunks == 0 and i_try < self.max_retries and is_transient_error(err)):
+                    await asyncio.sleep(self.retry_backoff_seconds * (2 ** i_try))
+                    continue
+                raise
+            except BaseException:
+                rate_limiter.release(n_estimated_tokens=n_tokens)
+                raise
+            rate_limiter.release(n_estimated_tokens=n_tokens, n_used_tokens=n_used_tokens)
+            return
+
+    def bind_tools (self, tools :list, **kwargs) -> Any:
+        # Bind the tools as the wrapped model does, but keep the calls going through the limiter
+        bound = self.chat_model.bind_tools(tools, **kwargs)
+        if isinstance(bound, BaseChatModel):
+            return self.model_copy(update={"chat_model": bound})
+        assert(isinstance(bound, RunnableBinding)), f"Unexpected bind_tools result: {type(bound).__name__}"
+        return self.bind(**bound.kwargs)
+
+
+# ====
+# Hedge attempt helper classes and functions
+# ====
+class TokenRecordingCallbackHandler (BaseCallbackHandler):
+    """
+    Record the new tokens of a call, to be reported later (see report_hedge_attempt).
+    """
+
+    run_inline = True
+
+    def __init__ (self) -> None:
+        self.tokens = []
+        self._lock = threading.Lock()
+
+    def on_llm_new_token (self, token :str, *, chunk=None, **kwargs) -> None:
+        with self._lock:
+            self.tokens.append((token, chunk))
+
+    def get_tokens (self) -> list:
+        with self._lock:
+            return list(self.tokens)
+
+
+def create_hedge_attempt_run_manager (run_manager, run_manager_class):
+    """
+    Create the run manager of one attempt of a hedged call: a child of the run manager of the call, whose callbacks are only recorded.
+    The callbacks of the attempts are not reported to the parent, so that the attempts given up (or outrun) are not counted.
+    """
+    if (run_manager is None):
+        return None
+    handler = TokenRecordingCallbackHandler()
+    return run_manager_class(
+        run_id=uuid.uuid4(),
+        handlers=[handler],
+        inheritable_handlers=[handler],
+        parent_run_id=run_manager.run_id,
+        tags=run_manager.tags,
+        inheritable_tags=run_manager.inheritable_tags,
+        metadata=run_manager.metadata,
+        inheritable_metadata=run_manager.inheritable_metadata
+    )
+
+
+def report_hedge_attempt (attempt_run_manager, run_manager) -> None:
+    """
+    Report the recorded tokens of the winning attempt of a hedged call to the run manager of the call.
+    """
+    for token, chunk in attempt_run_manager.handlers[0].get_tokens():
+        run_manager.on_llm_new_token(token, chunk=chunk)
+
+
+async def areport_hedge_attempt (attempt_run_manager, run_manager) -> None:
+    for token, chunk in attempt_run_manager.handlers[0].get_tokens():
+        await run_manager.on_llm_new_token(token, chunk=chunk)
+
+
+# ====
+# Latency-controlled chat model
+# ====
+class LatencyControlledChatModel (BaseChatModel):
+    """
+    A chat model whose calls (of one chain) follow a latency_controls.LatencyPolicy: each call gives up at its deadline (DeadlineExceededError),
+    and a duplicate (hedged) call is sent once the call is slower than the hedge delay of the chain, the first answer being taken.
+    In the sync calls, the call given up (or outrun by its duplicate) cannot be interrupted and completes in the background;
+    in the async calls, it is cancelled. The latencies of all the calls are observed, for the hedge delays.
+    Each attempt reports to its own child run manager, and only the winning attempt is reported to the callbacks of the call (see create_hedge_attempt_run_manager).
+    The streamed calls (see LatencyPolicy.streaming_chains) are not hedged, since a duplicate would repeat the chunks: their deadline is checked between the chunks.
+    """
+
+    chat_model :BaseChatModel
+    chain_name :str
+    policy :Any
+
+    @property
+    def _llm_type (self) -> str:
+        return f"latency_controlled_{self.chat_model._llm_type}"
+
+    def call_chat_model (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        t_start = time.perf_counter()
+        result = self.chat_model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        self.policy.get_tracker(self.chain_name).observe(time.perf_counter() - t_start)
+        return result
+
+    async def acall_chat_model (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        t_start = time.perf_counter()
+        try:
+            result = await self.chat_model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        except asyncio.CancelledError:
+            # A lower bound of the latency, so that the slow calls stay in the percentiles
+            self.policy.get_tracker(self.chain_name).observe(time.perf_counter() - t_start)
+            raise
+        self.policy.get_tracker(self.chain_name).observe(time.perf_counter() - t_start)
+        return result
+
+    def get_wait_seconds (self, deadline :Optional[float], hedge_at :Optional[float]) -> Optional[float]:
+        wait_until = min([t for t in [deadline, hedge_at] if t is not None], default=None)
+        return max(0.0, get_remaining_seconds(wait_until)) if (wait_until is not None) else None
+
+    def raise_deadline_exceeded (self) -> None:
+        self.policy.record_call(deadline_exceeded=True)
+        raise DeadlineExceededError(f"LLM call of {self.chain_name} past its deadline")
+
+    def _generate (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        deadline = self.policy.get_deadline(self.chain_name)
+        hedge_delay_seconds = self.policy.get_hedge_delay_seconds(self.chain_name)
+        if (deadline is None and hedge_delay_seconds is None):
+            self.policy.record_call()
+            return self.call_chat_model(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if (deadline is not None and time.time() >= deadline):
+            self.raise_deadline_exceeded()
+
+        hedge_at = (time.time() + hedge_delay_seconds) if (hedge_delay_seconds is not None) else None
+        executor = ThreadPoolExecutor(max_workers=2)
+        # Each attempt gets its own run manager: only the winning one is reported to run_manager
+        attempt_run_managers = {}
+
+        def submit ():
+            attempt_run_manager = create_hedge_attempt_run_manager(run_manager, CallbackManagerForLLMRun)
+            future = executor.submit(contextvars.copy_context().run, self.call_chat_model, messages, stop, attempt_run_manager, **kwargs)
+            attempt_run_managers[future] = attempt_run_manager
+            return future
+
+        try:
+            futures = [submit()]
+            pending = set(futures)
+            error = None
+            while (len(pending) > 0):
+                done, pending = wait(pending, timeout=self.get_wait_seconds(deadline, hedge_at), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if (future.exception() is None):
+                        self.policy.record_call(hedged=(len(futures) > 1), hedge_won=(future is not futures[0]))
+                        if (run_manager is not None):
+                            report_hedge_attempt(attempt_run_managers[future], run_manager)
+                        return future.result()
+                    error = future.exception()
+                if (deadline is not None and time.time() >= deadline):
+                    self.raise_deadline_exceeded()
+                if (hedge_at is not None and time.time() >= hedge_at and len(futures) == 1 and len(pending) > 0):
+                    futures.append(submit())
+                    pending.add(futures[-1])
+                    hedge_at = None
+            self.policy.record_call(hedged=(len(futures) > 1))
+            raise error
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _agenerate (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        deadline = self.policy.get_deadline(self.chain_name)
+        hedge_delay_seconds = self.policy.get_hedge_delay_seconds(self.chain_name)
+        if (deadline is None and hedge_delay_seconds is None):
+            self.policy.record_call()
+            return await self.acall_chat_model(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if (deadline is not None and time.time() >= deadline):
+            self.raise_deadline_exceeded()
+
+        hedge_at = (time.time() + hedge_delay_seconds) if (hedge_delay_seconds is not None) else None
+        attempt_run_managers = {}
+
+        def submit ():
+            attempt_run_manager = create_hedge_attempt_run_manager(run_manager, AsyncCallbackManagerForLLMRun)
+            task = asyncio.ensure_future(self.acall_chat_model(messages, stop=stop, run_manager=attempt_run_manager, **kwargs))
+            attempt_run_managers[task] = attempt_run_manager
+            return task
+
+        tasks = [submit()]
+        try:
+            pending = set(tasks)
+            error = None
+            while (len(pending) > 0):
+                done, pending = await asyncio.wait(pending, timeout=self.get_wait_seconds(deadline, hedge_at), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if (task.exception() is None):
+                        self.policy.record_call(hedged=(len(tasks) > 1), hedge_won=(task is not tasks[0]))
+                        if (run_manager is not None):
+                            await areport_hedge_attempt(attempt_run_managers[task], run_manager)
+                        return task.result()
+                    error = task.exception()
+                if (deadline is not None and time.time() >= deadline):
+                    self.raise_deadline_exceeded()
+                if (hedge_at is not None and time.time() >= hedge_at and len(tasks) == 1 and len(pending) > 0):
+                    tasks.append(submit())
+                    pending.add(tasks[-1])
+                    hedge_at = None
+            self.policy.record_call(hedged=(len(tasks) > 1))
+            raise error
+        finally:
+            for task in tasks:
+                if (not task.done()):
+                    task.cancel()
+
+    def _stream (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        deadline = self.policy.get_deadline(self.chain_name)
+        t_start = time.perf_counter()
+        for chunk in stream_chat_model(self.chat_model, messages, stop=stop, **kwargs):
+            if (deadline is not None and time.time() >= deadline):
+                self.raise_deadline_exceeded()
+            yield chunk
+        self.policy.get_tracker(self.chain_name).observe(time.perf_counter() - t_start)
+        self.policy.record_call()
+
+    async def _astream (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        deadline = self.policy.get_deadline(self.chain_name)
+        t_start = time.perf_counter()
+        chunks = astream_chat_model(self.chat_model, messages, stop=stop, **kwargs)
+        try:
+            while (True):
+                remaining_seconds = get_remaining_seconds(deadline)
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(0.0, remaining_seconds) if (remaining_seconds is not None) else None)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.raise_deadline_exceeded()
+                yield chunk
+        finally:
+            await chunks.aclose()
+        self.policy.get_tracker(self.chain_name).observe(time.perf_counter() - t_start)
+        self.policy.record_call()
+
+
+def create_default_openai_llm () -> BaseChatModel:
     assert("OPENAI_API_KEY" in os.environ)
     assert("OPENAI_MODEL" in os.environ)
 
-    return ChatOpenAI(
-        model=os.environ["OPENAI_MODEL"], 
-        api_key=os.environ["OPENAI_API_KEY"], 
-        temperature=0.01
-    )
\ No newline at end of file
+    # Deferred import: langchain_openai is slow to import
+    from langchain_openai.chat_models import ChatOpenAI
+
+    # The failed calls are retried by RateLimitedChatModel (with the shared limiter backing off on throttling), not by the OpenAI client
+    return RateLimitedChatModel(chat_model=ChatOpenAI(
+        model=os.environ["OPENAI_MODEL"],
+        api_key=os.environ["OPENAI_API_KEY"],
+        temperature=0.01,
+        max_retries=0
+    ))
+
+
+def get_chat_model_name (llm :BaseChatModel) -> str:
+    """
+    Get a name identifying the given chat model (e.g., for cache keys)
+    """
+    if isinstance(llm, (RateLimitedChatModel, LatencyControlledChatModel)):
+        return get_chat_model_name(llm.chat_model)
+    for attr_name in ["model_name", "model"]:
+        model_name = getattr(llm, attr_name, None)
+        if (type(model_name) is str):
+            return model_name
+    return getattr(llm, "_llm_type", type(llm).__name__)
+
+
+# ====
+# Default chat model registry
+# ====
+# The default chat model is created on first use (not at import) and shared by all nodes, so that they share one HTTP connection pool.
+_default_chat_model_factory :Callable[[], BaseChatModel] = create_default_openai_llm
+_default_chat_model :Optional[BaseChatModel] = None
+_default_chat_model_lock = threading.Lock()
+
+
+def set_default_chat_model_factory (factory :Callable[[], BaseChatModel]) -> None:
+    """
+    Set the factory of the default chat model. The current default chat model (if created) is dropped.
+    """
+    global _default_chat_model_factory, _default_chat_model
+    with _default_chat_model_lock:
+        _default_chat_model_factory = factory
+        _default_chat_model = None
+
+
+def set_default_chat_model (chat_model :BaseChatModel) -> None:
+    set_default_chat_model_factory(lambda: chat_model)
+
+
+def get_default_chat_model () -> BaseChatModel:
+    """
+    Get the shared default chat model, and create it on the first call.
+    """
+    global _default_chat_model
+    if (_default_chat_model is None):
+        with _default_chat_model_lock:
+            if (_default_chat_model is None):
+                _default_chat_model = _default_chat_model_factory()
+    return _default_chat_model
+
+
+def resolve_chat_model (chat_model :Optional[BaseChatModel]) -> BaseChatModel:
+    """
+    Return the given chat model, or the shared default chat model if None.
+    """
+    return chat_model if (chat_model is not None) else get_default_chat_model()
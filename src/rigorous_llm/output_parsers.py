@@ -1,9 +1,11 @@
 import re 
-from typing import Optional, List, Union
+from typing import Optional, List, Dict, Tuple, Union, Iterator, AsyncIterator
+from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import BaseOutputParser
+from langchain_core.output_parsers.transform import BaseTransformOutputParser
 
 import logging 
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 
 # ====
@@ -22,6 +24,47 @@ def get_first_sentence (text :str) -> str:
     
     return text[0:min(i_period, i_newline)]
 
+def find_boolean_in_text (text :str) -> Optional[bool]: 
+    assert(type(text) is str) 
+
+    text = text.strip().lower()
+    text = get_first_sentence(text) 
+
+    if (text.find("yes") >= 0 or text.find("true") >= 0): 
+        return True
+    
+    elif (text.find("no") >= 0 or text.find("false") >= 0): 
+        return False 
+    
+    return None 
+
+# The strict verdict grammar of an indexed judgement: an optional "the statement is" and "not", then the verdict token, ending the clause, then no other verdict or hedge 
+VERDICT_PATTERN = re.compile(r"^(?:(?:the\s+)?(?:statement|text|answer)\s+is\s+|it\s+is\s+)?(not\s+)?(true|false|yes|no)\s*(?:$|[,;:!\)\-]\s*(.*)$)")
+VERDICT_HEDGE_PATTERN = re.compile(r"\b(true|false|yes|no|not|unclear|unknown|uncertain|undetermined|cannot|can't|maybe|partially|partly)\b")
+
+def find_verdict_in_text (text :str) -> Optional[bool]: 
+    """
+    Find the verdict of a judgement strictly: "true"/"yes" or "false"/"no" must come first (possibly negated, e.g., "not true"). 
+    Anything else (e.g., "unknown", "cannot determine", "not enough information", "true or false") is unclear (None). 
+    """
+    assert(type(text) is str) 
+
+    text = get_first_sentence(text.strip().lower())
+    text = text.strip(" \t:-=>\"'*`")
+
+    re_match = VERDICT_PATTERN.match(text)
+    if (re_match is None): 
+        return None 
+
+    negated, verdict, rest = re_match.groups()
+    if (VERDICT_HEDGE_PATTERN.search(rest or "") is not None): 
+        return None 
+    if (negated and verdict in ["yes", "no"]): 
+        return None 
+
+    judgement = verdict in ["true", "yes"]
+    return (not judgement) if (negated) else judgement 
+
 def strip_and_remove_empty_strings_from_list (text_list :List[str]) -> List[str]: 
     text_list = list(map(lambda t: t.strip(), text_list))
     text_list = list(filter(lambda t: t!="", text_list))
@@ -56,22 +99,15 @@ class BooleanOutputParser (BaseOutputParser[bool]):
 
     def parse (self, text :str) -> bool:
         try: 
-            original_text = text 
+            judgement = find_boolean_in_text(text)
 
-            text = text.strip().lower()
-            text = get_first_sentence(text) 
-
-            if (text.find("yes") >= 0 or text.find("true") >= 0): 
-                return True
-            
-            elif (text.find("no") >= 0 or text.find("false") >= 0): 
-                return False 
+            if (judgement is None): 
+                raise Exception(f"Unable to parse output: {text}")
             
-            else: 
-                raise Exception(f"Unable to parse output: {original_text}")
+            return judgement
 
         except Exception as err:
-            logging.error(err)
+            logger.error(err)
             if (type(self.fallback_value) is bool): 
                 return self.fallback_value
             else: 
@@ -81,7 +117,11 @@ class BooleanOutputParser (BaseOutputParser[bool]):
     def _type(self) -> str:  
         return "boolean_output_parser"
 
-class StrListOutputParser (BaseOutputParser[List[str]]): 
+class StrListOutputParser (BaseTransformOutputParser[List[str]]): 
+    """
+    Parse a bulleted/numbered list into a list of strings. 
+    When streamed, it emits each item (as a one-item list) as soon as the item is complete, i.e., once the next item starts. 
+    """
 
     bullet_patterns :List[str] = [
         r"^\s*(\d+|[\*])([\.:\s]{0,1})"
@@ -127,22 +167,84 @@ class StrListOutputParser (BaseOutputParser[List[str]]):
         # return 
         return aggregated_text_list
 
+    def find_last_bullet_line_start (self, text :str) -> int: 
+        """
+        Return the start index of the last line starting with a bullet, or -1. 
+        """
+        i_end = len(text)
+        while (i_end >= 0): 
+            i_start = text.rfind("\n", 0, i_end) + 1
+            tline = text[i_start:i_end].strip()
+            if (any([re.match(b_pattern, tline) is not None for b_pattern in self.bullet_patterns])): 
+                return i_start
+            i_end = i_start - 1
+        return -1
+
+    def split_complete_items (self, buffer :str, is_final :bool) -> Tuple[List[str], str]: 
+        """
+        Split the streamed buffer into the complete items and the rest of the buffer, starting at the pending (last) item. 
+        Only the complete items are parsed, so that streaming a long list stays linear. 
+        """
+        if (is_final): 
+            return self.parse(buffer), ""
+
+        # Only the complete lines can be parsed, and the last item can still be continued by the following lines 
+        i_last_newline = buffer.rfind("\n")
+        if (i_last_newline < 0): 
+            return [], buffer
+
+        i_pending = self.find_last_bullet_line_start(buffer[:i_last_newline])
+        if (i_pending <= 0): 
+            return [], buffer
+
+        return self.parse(buffer[:i_pending]), buffer[i_pending:]
+
+    def _transform (self, input :Iterator[Union[str, BaseMessage]]) -> Iterator[List[str]]: 
+        buffer = ""
+        for chunk in input: 
+            chunk_text = chunk.content if isinstance(chunk, BaseMessage) else chunk
+            buffer += chunk_text
+            if ("\n" not in chunk_text): 
+                continue
+            items, buffer = self.split_complete_items(buffer=buffer, is_final=False)
+            for item in items: 
+                yield [item]
+
+        items, buffer = self.split_complete_items(buffer=buffer, is_final=True)
+        for item in items: 
+            yield [item]
+
+    async def _atransform (self, input :AsyncIterator[Union[str, BaseMessage]]) -> AsyncIterator[List[str]]: 
+        buffer = ""
+        async for chunk in input: 
+            chunk_text = chunk.content if isinstance(chunk, BaseMessage) else chunk
+            buffer += chunk_text
+            if ("\n" not in chunk_text): 
+                continue
+            items, buffer = self.split_complete_items(buffer=buffer, is_final=False)
+            for item in items: 
+                yield [item]
+
+        items, buffer = self.split_complete_items(buffer=buffer, is_final=True)
+        for item in items: 
+            yield [item]
+
     @property  
     def _type(self) -> str:  
         return "str_list_output_parser"
     
 
-class SelectionIndicesOutputParser(BaseOutputParser[int]): 
+class SelectionIndicesOutputParser(BaseOutputParser[List[int]]): 
 
     bullet_patterns :List[str] = [
         r"^\s*(\d+)([\.:\s]{0,1})", 
         r"^\s*\[(\d+)\]([\.:\s]{0,1})", 
-        r"^\s*([(\d+)\)([\.:\s]{0,1})"
+        r"^\s*\((\d+)\)([\.:\s]{0,1})"
     ]
 
     separators :List[str] = ["\n"]
 
-    def parse (self, text :str) -> List[str]: 
+    def parse (self, text :str) -> List[int]: 
         # break text into lines 
         text_lines = split_text_by_separators(text=text, separators=self.separators)
 
@@ -165,3 +267,37 @@ class SelectionIndicesOutputParser(BaseOutputParser[int]):
     @property  
     def _type(self) -> str:  
         return "selection_indices_output_parser"
+
+
+
+class IndexedBooleanOutputParser (SelectionIndicesOutputParser): 
+    """
+    Parse lines like "[1] true" into {1: True}. Lines without a recognizable index or verdict are skipped, so the caller can tell which indices were left unclear. 
+    The verdicts follow a strict grammar (see find_verdict_in_text), so that a hedged line (e.g., "[2] cannot determine") is left unclear rather than misread. 
+    """
+
+    def parse (self, text :str) -> Dict[int, bool]: 
+        # break text into lines 
+        text_lines = split_text_by_separators(text=text, separators=self.separators)
+
+        # clean up
+        text_lines = strip_and_remove_empty_strings_from_list(text_lines)
+
+        # map indices to judgements 
+        indexed_judgements = {}
+
+        for tline in text_lines: 
+            for b_pattern in self.bullet_patterns: 
+                re_match = re.match(b_pattern, tline)
+                if (re_match is not None): 
+                    judgement = find_verdict_in_text(tline[re_match.span()[1]:])
+                    if (judgement is not None): 
+                        indexed_judgements[int(re_match.groups()[0])] = judgement 
+                    break 
+
+        # return 
+        return indexed_judgements
+
+    @property  
+    def _type(self) -> str:  
+        return "indexed_boolean_output_parser"
\ No newline at end of file
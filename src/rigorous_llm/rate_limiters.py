@@ -0,0 +1,357 @@
+"""
+A rate limiter shared by the LLM calls of a process: request and token buckets, and an adaptive (AIMD) concurrency limit.
+
+- The buckets keep the calls under the provider's requests-per-minute and tokens-per-minute limits.
+- The concurrency limit grows additively on success and is cut multiplicatively on throttling (e.g., HTTP 429), which also pauses all the calls.
+- The waiting calls are served by priority (see llm_call_priority): the critical-path calls (e.g., the final summarization) go before the background ones
+  (e.g., the statements validation).
+"""
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+import contextlib
+import contextvars
+from typing import Iterator, Optional
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# ====
+# Priorities (lower is served first)
+# ====
+PRIORITY_CRITICAL = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+_llm_call_priority :contextvars.ContextVar = contextvars.ContextVar("rigorous_llm_call_priority", default=PRIORITY_NORMAL)
+
+
+@contextlib.contextmanager
+def llm_call_priority (priority :int) -> Iterator[None]:
+    """
+    Set the priority of the LLM calls made within the context (including the threads and tasks started within it).
+    """
+    token = _llm_call_priority.set(priority)
+    try:
+        yield
+    finally:
+        _llm_call_priority.reset(token)
+
+
+def get_llm_call_priority () -> int:
+    return _llm_call_priority.get()
+
+
+# ====
+# Rate limiter helper functions
+# ====
+def is_throttling_error (error :BaseException) -> bool:
+    """
+    Check if an error of an LLM call is a throttling (rate limit) error, e.g., openai.RateLimitError or an HTTP 429.
+    """
+    if (getattr(error, "status_code", None) == 429 or getattr(getattr(error, "response", None), "status_code", None) == 429):
+        return True
+    if ("RateLimit" in type(error).__name__):
+        return True
+    message = str(error).lower()
+    return ("rate limit" in message or "too many requests" in message)
+
+
+def is_transient_error (error :BaseException) -> bool:
+    """
+    Check if an error of an LLM call is transient (a server error, a connection error or a timeout), i.e., worth retrying.
+    """
+    status_code = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if (isinstance(status_code, int) and status_code >= 500):
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError)) or any([s in type(error).__name__ for s in ["Connection", "Timeout"]])
+
+
+def get_retry_after_seconds (error :BaseException) -> Optional[float]:
+    """
+    Get the retry-after delay (in seconds) of a throttling error, if the provider gave one.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if (headers is None):
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ====
+# Rate limiter classes
+# ====
+class TokenBucket:
+    """
+    A token bucket refilled at rate_per_second, holding at most capacity. Not thread-safe (the limiter holds the lock).
+    """
+
+    def __init__ (self, rate_per_second :float, capacity :float) -> None:
+        assert(rate_per_second > 0 and capacity > 0)
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.level = capacity
+        self.updated_at = time.monotonic()
+
+    def refill (self, now :float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    def get_wait_seconds (self, amount :float) -> float:
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate_per_second)
+
+    def consume (self, amount :float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def refund (self, amount :float) -> None:
+        # A negative refund (more tokens used than estimated) may take the level below zero: the next calls wait for it
+        self.level = min(self.capacity, self.level + amount)
+
+class Waiter:
+    """
+    A call waiting for the limiter. It is woken up through its event (a threading.Event, or an asyncio.Event of its loop).
+    """
+
+    __slots__ = ["priority", "seq", "n_tokens", "event", "loop", "cancelled"]
+
+    def __init__ (self, priority :int, seq :int, n_tokens :int, event, loop :Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.n_tokens = n_tokens
+        self.event = event
+        self.loop = loop
+        self.cancelled = False
+
+    def __lt__ (self, other :"Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def wake_up (self) -> None:
+        if (self.loop is None):
+            self.event.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self.event.set)
+            except RuntimeError:
+                # The loop is closed
+                pass
+
+class AdaptiveRateLimiter:
+    """
+    A thread-safe (and asyncio-friendly) rate limiter of LLM calls, shared across the graphs of a process.
+    - requests_per_minute / tokens_per_minute: the bucket rates (None for no limit). The buckets hold burst_seconds of their rates.
+    - The concurrency limit starts at initial_concurrency, grows by increase_step per concurrency-limit successes, and is multiplied by
+      decrease_factor on throttling (at most once per decrease_cooldown_seconds, as the calls in flight fail together).
+    - On throttling, all the calls are paused for the provider's retry-after, or else backoff_seconds.
+    """
+
+    def __init__ (
+            self,
+            requests_per_minute :Optional[float] = None,
+            tokens_per_minute :Optional[float] = None,
+            burst_seconds :float = 10.0,
+            initial_concurrency :float = 8,
+            min_concurrency :float = 1,
+            max_concurrency :float = 64,
+            increase_step :float = 1.0,
+            decrease_factor :float = 0.5,
+            decrease_cooldown_seconds :float = 1.0,
+            backoff_seconds :float = 1.0
+    ) -> None:
+        assert(0 < min_concurrency <= initial_concurrency <= max_concurrency)
+        assert(0 < decrease_factor < 1)
+        self.request_bucket = TokenBucket(requests_per_minute / 60.0, max(1.0, requests_per_minute / 60.0 * burst_seconds)) if (requests_per_minute is not None) else None
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute / 60.0 * burst_seconds) if (tokens_per_minute is not None) else None
+        self.concurrency_limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown_seconds = decrease_cooldown_seconds
+        self.backoff_seconds = backoff_seconds
+
+        self.n_in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease_at = 0.0
+
+        self.n_acquired = 0
+        self.n_throttled = 0
+        self.wait_seconds = 0.0
+
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    # Under the lock
+    def get_head_waiter (self) -> Optional[Waiter]:
+        while (len(self._waiters) > 0 and self._waiters[0].cancelled):
+            heapq.heappop(self._waiters)
+        return self._waiters[0] if (len(self._waiters) > 0) else None
+
+    # Under the lock
+    def try_acquire (self, waiter :Waiter) -> Optional[float]:
+        """
+        Grant the call if it is the first in line and the limits allow it (return 0), else return how long to wait for (None: until woken up).
+        """
+        if (self.get_head_waiter() is not waiter or self.n_in_flight >= max(1, int(self.concurrency_limit))):
+            return None
+
+        now = time.monotonic()
+        wait_seconds = self.paused_until - now
+        for bucket, amount in [(self.request_bucket, 1), (self.token_bucket, waiter.n_tokens)]:
+            if (bucket is not None):
+                bucket.refill(now)
+                wait_seconds = max(wait_seconds, bucket.get_wait_seconds(amount))
+        if (wait_seconds > 0):
+            return wait_seconds
+
+        for bucket, amount in [(self.request_bucket, 1), (self.token_bucket, waiter.n_tokens)]:
+            if (bucket is not None):
+                bucket.consume(amount)
+        heapq.heappop(self._waiters)
+        self.n_in_flight += 1
+        self.n_acquired += 1
+
+        # The next in line may be granted too
+        next_waiter = self.get_head_waiter()
+        if (next_waiter is not None):
+            next_waiter.wake_up()
+        return 0.0
+
+    def create_waiter (self, n_tokens :int, priority :Optional[int], event, loop=None) -> Waiter:
+        waiter = Waiter(
+            priority=priority if (priority is not None) else get_llm_call_priority(),
+            seq=next(self._seq),
+            n_tokens=n_tokens,
+            event=event,
+            loop=loop
+        )
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+        return waiter
+
+    def cancel_waiter (self, waiter :Waiter) -> None:
+        with self._lock:
+            waiter.cancelled = True
+            next_waiter = self.get_head_waiter()
+            if (next_waiter is not None):
+                next_waiter.wake_up()
+
+    def acquire (self, n_tokens :int = 0, priority :Optional[int] = None) -> None:
+        """
+        Wait (blocking) until the call may start. Every acquire must be followed by a release.
+        """
+        t_start = time.monotonic()
+        waiter = self.create_waiter(n_tokens, priority, threading.Event())
+        try:
+            while True:
+                with self._lock:
+                    waiter.event.clear()
+                    wait_seconds = self.try_acquire(waiter)
+                if (wait_seconds == 0):
+                    break
+                waiter.event.wait(timeout=wait_seconds)
+        except BaseException:
+            self.cancel_waiter(waiter)
+            raise
+        with self._lock:
+            self.wait_seconds += time.monotonic() - t_start
+
+    async def aacquire (self, n_tokens :int = 0, priority :Optional[int] = None) -> None:
+        """
+        Wait (asynchronously) until the call may start. Every aacquire must be followed by a release.
+        """
+        t_start = time.monotonic()
+        waiter = self.create_waiter(n_tokens, priority, asyncio.Event(), loop=asyncio.get_running_loop())
+        try:
+            while True:
+                with self._lock:
+                    waiter.event.clear()
+                    wait_seconds = self.try_acquire(waiter)
+                if (wait_seconds == 0):
+                    break
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), timeout=wait_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self.cancel_waiter(waiter)
+            raise
+        with self._lock:
+            self.wait_seconds += time.monotonic() - t_start
+
+    def release (
+            self,
+            n_estimated_tokens :int = 0,
+            n_used_tokens :Optional[int] = None,
+            throttled :bool = False,
+            retry_after_seconds :Optional[float] = None
+    ) -> None:
+        """
+        Release a call, and adapt the concurrency limit: additive increase on success, multiplicative decrease on throttling.
+        n_used_tokens (if known) corrects the token bucket for the estimate made at acquire.
+        """
+        with self._lock:
+            self.n_in_flight -= 1
+            now = time.monotonic()
+
+            if (throttled):
+                self.n_throttled += 1
+                self.paused_until = max(self.paused_until, now + (retry_after_seconds if (retry_after_seconds is not None) else self.backoff_seconds))
+                if (now - self.last_decrease_at >= self.decrease_cooldown_seconds):
+                    self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * self.decrease_factor)
+                    self.last_decrease_at = now
+                    logger.warning(f"LLM calls throttled, concurrency limit cut to {self.concurrency_limit:.1f}")
+            else:
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + self.increase_step / self.concurrency_limit)
+
+            if (self.token_bucket is not None and n_used_tokens is not None):
+                self.token_bucket.refund(n_estimated_tokens - n_used_tokens)
+
+            next_waiter = self.get_head_waiter()
+            if (next_waiter is not None):
+                next_waiter.wake_up()
+
+
+# ====
+# Shared rate limiter
+# ====
+# One limiter for all the LLM calls of the process (all graphs and nodes), created on first use
+_shared_rate_limiter :Optional[AdaptiveRateLimiter] = None
+_shared_rate_limiter_lock = threading.Lock()
+
+
+def set_shared_rate_limiter (rate_limiter :Optional[AdaptiveRateLimiter]) -> None:
+    global _shared_rate_limiter
+    with _shared_rate_limiter_lock:
+        _shared_rate_limiter = rate_limiter
+
+
+def create_default_rate_limiter () -> AdaptiveRateLimiter:
+    """
+    Create a rate limiter with the bucket rates of the environment variables RIGOROUS_LLM_REQUESTS_PER_MINUTE and RIGOROUS_LLM_TOKENS_PER_MINUTE (if set).
+    """
+    requests_per_minute = os.environ.get("RIGOROUS_LLM_REQUESTS_PER_MINUTE", None)
+    tokens_per_minute = os.environ.get("RIGOROUS_LLM_TOKENS_PER_MINUTE", None)
+    return AdaptiveRateLimiter(
+        requests_per_minute=float(requests_per_minute) if (requests_per_minute is not None) else None,
+        tokens_per_minute=float(tokens_per_minute) if (tokens_per_minute is not None) else None
+    )
+
+
+def get_shared_rate_limiter () -> AdaptiveRateLimiter:
+    """
+    Get the shared rate limiter, and create it (create_default_rate_limiter) on the first call.
+    """
+    global _shared_rate_limiter
+    if (_shared_rate_limiter is None):
+        with _shared_rate_limiter_lock:
+            if (_shared_rate_limiter is None):
+                _shared_rate_limiter = create_default_rate_limiter()
+    return _shared_rate_limiter
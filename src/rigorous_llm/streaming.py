@@ -0,0 +1,130 @@
+from typing import AsyncIterator, Dict, Iterator, List, NamedTuple, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import Runnable, RunnableConfig
+from langgraph.config import get_stream_writer
+
+
+# ====
+# Constants
+# ====
+# The answer events, in their usual order within a turn
+CASUAL_ANSWER_EVENT = "casual_answer"
+RIGOROUSNESS_JUDGED_EVENT = "rigorousness_judged"
+FACTS_COLLECTED_EVENT = "facts_collected"
+STATEMENTS_EXTRACTED_EVENT = "statements_extracted"
+STATEMENT_VERIFIED_EVENT = "statement_verified"
+REVISED_ANSWER_TOKEN_EVENT = "revised_answer_token"
+REVISED_ANSWER_EVENT = "revised_answer"
+
+# The progress events written by the rigorous nodes to the custom stream of the graph (see write_progress_event)
+PROGRESS_EVENT_TYPES = [FACTS_COLLECTED_EVENT, STATEMENTS_EXTRACTED_EVENT, STATEMENT_VERIFIED_EVENT]
+
+STREAM_MODES = ["updates", "messages", "custom"]
+
+
+# ====
+# Streaming helper functions
+# ====
+def write_progress_event (event_type :str, data :Dict) -> None:
+    """
+    Write a progress event to the custom stream of the current graph run (a no-op outside a graph run, or if the run is not streamed).
+    """
+    try:
+        writer = get_stream_writer()
+    except (RuntimeError, KeyError):
+        # Not within a graph run
+        return
+    writer({"type": event_type, "data": data})
+
+
+def find_last_ai_message_content (update :Optional[Dict]) -> Optional[str]:
+    messages = (update or {}).get("messages", None) or []
+    ai_messages = [message for message in messages if isinstance(message, AIMessage) and not message.tool_calls]
+    return str(ai_messages[-1].content) if (len(ai_messages) > 0) else None
+
+
+# ====
+# Streaming classes
+# ====
+class RigorousAnswerEvent (NamedTuple):
+    type :str
+    data :Dict
+
+
+class RigorousAnswerEventConverter:
+    """
+    Convert the chunks of a rigorous graph stream (graph.stream/astream with stream_mode=STREAM_MODES) into answer events:
+    - the casual answer, as soon as the chatbot subgraph is done, and whether a rigorous answer follows;
+    - the progress of the rigorous stages: the facts collected, the statements extracted, and each statement verified (with the counts so far);
+    - the tokens of the revised answer as they are generated (if the chat model streams), then the whole revised answer.
+    """
+
+    def __init__ (self) -> None:
+        # Deferred import: graph_builders imports this module
+        from .graph_builders import ChatbotSubgraphNode, RigorousnessJudgementNode, LLMResponseRevisementNode
+        self.chatbot_node_name = ChatbotSubgraphNode.name
+        self.judgement_node_name = RigorousnessJudgementNode.name
+        self.revisement_node_name = LLMResponseRevisementNode.name
+
+        self.n_judged_statements = 0
+        self.n_verified_statements = 0
+
+    def convert_updates (self, updates :Dict) -> List[RigorousAnswerEvent]:
+        events = []
+        for node_name, update in updates.items():
+            if (node_name == self.chatbot_node_name):
+                content = find_last_ai_message_content(update)
+                if (content is not None):
+                    events.append(RigorousAnswerEvent(CASUAL_ANSWER_EVENT, {"content": content}))
+            elif (node_name == self.judgement_node_name):
+                events.append(RigorousAnswerEvent(RIGOROUSNESS_JUDGED_EVENT, {"rigorousness_required": update["rigorousness_required"]}))
+            elif (node_name == self.revisement_node_name):
+                events.append(RigorousAnswerEvent(REVISED_ANSWER_EVENT, {"content": find_last_ai_message_content(update)}))
+        return events
+
+    def convert_message (self, message, metadata :Dict) -> List[RigorousAnswerEvent]:
+        # Only the tokens of the revised answer: the other LLM calls (e.g., the validations) are internal
+        if (metadata.get("langgraph_node", None) != self.revisement_node_name or not isinstance(message, AIMessageChunk)):
+            return []
+        if (str(message.content) == ""):
+            return []
+        # The statements over the prompt budget are summarized part by part, concurrently: the message id tells the parts apart
+        return [RigorousAnswerEvent(REVISED_ANSWER_TOKEN_EVENT, {"content": str(message.content), "message_id": message.id})]
+
+    def convert_progress (self, progress :Dict) -> List[RigorousAnswerEvent]:
+        if (not isinstance(progress, dict) or progress.get("type", None) not in PROGRESS_EVENT_TYPES):
+            return []
+        data = dict(progress["data"])
+        if (progress["type"] == STATEMENT_VERIFIED_EVENT):
+            self.n_judged_statements += 1
+            self.n_verified_statements += int(data["verified"])
+            data.update({"n_judged_statements": self.n_judged_statements, "n_verified_statements": self.n_verified_statements})
+        return [RigorousAnswerEvent(progress["type"], data)]
+
+    def convert (self, stream_mode :str, chunk) -> List[RigorousAnswerEvent]:
+        if (stream_mode == "updates"):
+            return self.convert_updates(chunk)
+        if (stream_mode == "messages"):
+            return self.convert_message(*chunk)
+        if (stream_mode == "custom"):
+            return self.convert_progress(chunk)
+        return []
+
+
+# ====
+# Streaming functions
+# ====
+def stream_rigorous_answer (graph :Runnable, inputs :Dict, config :Optional[RunnableConfig] = None) -> Iterator[RigorousAnswerEvent]:
+    """
+    Run a turn of the (compiled) rigorous graph, and stream its answer events (see RigorousAnswerEventConverter).
+    """
+    converter = RigorousAnswerEventConverter()
+    for stream_mode, chunk in graph.stream(inputs, config=config, stream_mode=STREAM_MODES):
+        yield from converter.convert(stream_mode, chunk)
+
+
+async def astream_rigorous_answer (graph :Runnable, inputs :Dict, config :Optional[RunnableConfig] = None) -> AsyncIterator[RigorousAnswerEvent]:
+    converter = RigorousAnswerEventConverter()
+    async for stream_mode, chunk in graph.astream(inputs, config=config, stream_mode=STREAM_MODES):
+        for event in converter.convert(stream_mode, chunk):
+            yield event
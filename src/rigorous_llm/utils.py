@@ -1,3 +1,6 @@
+import re 
+import json 
+import math 
 from typing import List, Union 
 from langchain_core.messages import BaseMessage
 
@@ -11,6 +14,77 @@ def encode_text_list_to_bulleted_paragraph (text_list :List[str], bullet_str :st
     )
 
 
+def encode_text_list_to_indexed_paragraph (text_list :List[str], start_index :int = 1) -> str: 
+    return "\n".join([
+        f"[{i}] {x.strip()}" 
+        for i, x in enumerate(text_list, start=start_index)
+    ])
+
+
+def normalize_text (text :str) -> str: 
+    """
+    Normalize a text for comparison: lowercase, collapse whitespace, and strip the surrounding bullets/punctuation. 
+    """
+    text = re.sub(r"\s+", " ", text.lower())
+    return text.strip(" *-.,;:!?")
+
+
+def estimate_token_count (text :str) -> int: 
+    """
+    Roughly estimate the number of tokens of a text (about 4 characters per token for English). 
+    """
+    return math.ceil(len(text) / 4)
+
+
+def split_text_into_chunks (text :str, max_tokens :int) -> List[str]: 
+    """
+    Split a text into chunks within the token budget. The text is split at line breaks, then at sentence ends, then (as the last resort) at any position. 
+    """
+    assert(max_tokens > 0)
+    if (estimate_token_count(text) <= max_tokens): 
+        return [text]
+
+    max_chars = max_tokens * 4
+
+    # break the text into pieces, each within the budget 
+    pieces = [] 
+    for line in text.splitlines(keepends=True): 
+        if (len(line) <= max_chars): 
+            pieces.append(line)
+            continue
+        for sentence in re.split(r"(?<=[\.!?])\s+", line): 
+            if (len(sentence) < max_chars): 
+                pieces.append(sentence + " ")
+            else: 
+                pieces += [sentence[i:i+max_chars] for i in range(0, len(sentence), max_chars)]
+
+    # greedily pack the pieces into chunks 
+    chunks = [""]
+    for piece in pieces: 
+        if (len(chunks[-1]) + len(piece) > max_chars): 
+            chunks.append("")
+        chunks[-1] += piece
+
+    return [c for c in chunks if c.strip() != ""]
+
+
+def split_tool_content_into_chunks (content :str, max_tokens :int) -> List[str]: 
+    """
+    Split a tool message content into chunks: one chunk per result entry if the content is a JSON list, and every chunk within the token budget. 
+    """
+    try: 
+        entries = json.loads(content)
+    except (TypeError, ValueError): 
+        entries = None 
+
+    if (isinstance(entries, list) and len(entries) > 0): 
+        texts = [json.dumps(e) for e in entries]
+    else: 
+        texts = [content]
+
+    return sum([split_text_into_chunks(t, max_tokens=max_tokens) for t in texts], [])
+
+
 def find_last_chat_message (
         message_list :List[BaseMessage], 
         message_type :BaseMessage, 
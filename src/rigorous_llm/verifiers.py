@@ -0,0 +1,113 @@
+import re
+import threading
+from typing import List, Optional, Set, Tuple
+
+from .fact_index import FactIndex, tokenize_text
+
+
+# ====
+# Constants
+# ====
+NEGATION_WORDS = frozenset(["not", "no", "never", "none", "nor", "neither", "without", "nothing", "nobody", "cannot"])
+
+MONTH_NAMES = frozenset([
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"
+])
+
+
+# ====
+# Verification helper functions
+# ====
+def find_negations (text :str) -> Set[str]:
+    words = re.findall(r"[a-z]+(?:n't)?", text.lower())
+    return set([w for w in words if w in NEGATION_WORDS or w.endswith("n't")])
+
+
+def find_numbers_and_dates (text :str) -> Set[str]:
+    """
+    Find the numbers (thousands separators removed) and month names in a text.
+    """
+    numbers = [n.replace(",", "") for n in re.findall(r"\d+(?:[,.]\d+)*", text)]
+    months = [w for w in re.findall(r"[a-z]+", text.lower()) if w in MONTH_NAMES]
+    return set(numbers + months)
+
+
+def create_bigrams (tokens :List[str]) -> Set[Tuple[str, str]]:
+    return set(zip(tokens, tokens[1:]))
+
+
+# ====
+# Verifier classes
+# ====
+class LocalStatementVerifier:
+    """
+    A local fast path in front of the LLM validation: a statement is accepted without an LLM call if one of its
+    top relevant facts (from the fact index) nearly contains it verbatim:
+    - the fact contains at least min_containment of the statement tokens (stop words excluded),
+    - the token Jaccard overlap is at least min_token_overlap,
+    - at least min_bigram_containment of the statement token bigrams appear in the fact (i.e., the word order holds),
+    - the statement numbers and dates all appear in the fact, and the negations are the same.
+    Otherwise, the statement is left to the LLM. The verifier never rejects a statement.
+    """
+
+    def __init__ (
+            self,
+            min_containment :float = 0.9,
+            min_token_overlap :float = 0.4,
+            min_bigram_containment :float = 0.75,
+            top_k :int = 3
+    ) -> None:
+        self.min_containment = min_containment
+        self.min_token_overlap = min_token_overlap
+        self.min_bigram_containment = min_bigram_containment
+        self.top_k = top_k
+
+        # Statistics
+        self.n_verified_statements = 0
+        self.n_avoided_llm_validations = 0
+        self._lock = threading.Lock()
+
+    def is_supported_by (self, statement :str, fact :str) -> bool:
+        statement_tokens = tokenize_text(statement)
+        fact_tokens = tokenize_text(fact)
+        if (len(statement_tokens) == 0 or len(fact_tokens) == 0):
+            return False
+
+        statement_token_set, fact_token_set = set(statement_tokens), set(fact_tokens)
+        n_shared = len(statement_token_set & fact_token_set)
+        if (n_shared / len(statement_token_set) < self.min_containment):
+            return False
+        if (n_shared / len(statement_token_set | fact_token_set) < self.min_token_overlap):
+            return False
+
+        statement_bigrams = create_bigrams(statement_tokens)
+        if (len(statement_bigrams) > 0 and len(statement_bigrams & create_bigrams(fact_tokens)) / len(statement_bigrams) < self.min_bigram_containment):
+            return False
+
+        if (not find_numbers_and_dates(statement).issubset(find_numbers_and_dates(fact))):
+            return False
+
+        return (find_negations(statement) == find_negations(fact))
+
+    def find_supporting_fact (self, statement :str, fact_index :FactIndex, allowed_facts :Optional[Set[str]] = None) -> Optional[str]:
+        """
+        Return a fact supporting the statement among its top relevant facts (restricted to allowed_facts if given), or None.
+        """
+        for fact, score in fact_index.search(query=statement, top_k=self.top_k):
+            if (allowed_facts is not None and fact not in allowed_facts):
+                continue
+            if (self.is_supported_by(statement, fact)):
+                return fact
+        return None
+
+    def verify (self, statement :str, fact_index :FactIndex, allowed_facts :Optional[Set[str]] = None) -> Optional[bool]:
+        """
+        Return True if the statement is accepted locally, and None if it should be validated by the LLM.
+        """
+        is_accepted = (self.find_supporting_fact(statement, fact_index, allowed_facts) is not None)
+
+        with self._lock:
+            self.n_verified_statements += 1
+            self.n_avoided_llm_validations += int(is_accepted)
+
+        return True if (is_accepted) else None
@@ -0,0 +1,58 @@
+from langchain_core.prompts import PromptTemplate
+
+from rigorous_llm import answer_cache
+import pytest
+
+from rigorous_llm.answer_cache import AnswerCache, create_answer_cached_graph, create_config_fingerprint, create_fact_store_freshness_check, create_graph_fingerprint
+from rigorous_llm.fact_store import SQLiteFactStore
+from rigorous_llm.fakes import ScriptedChatModel, create_scripted_rigorous_llm_graph
+
+
+def test_config_fingerprint_follows_the_prompts (monkeypatch):
+    chat_model = ScriptedChatModel()
+    fingerprint = create_config_fingerprint(chat_model, pipelined=True)
+
+    assert create_config_fingerprint(chat_model, pipelined=True) == fingerprint
+    assert create_config_fingerprint(chat_model, pipelined=False) != fingerprint
+
+    # A changed prompt of a chain of the graph changes the fingerprint
+    create_chain = answer_cache.RIGOROUS_GRAPH_CHAIN_BUILDERS[0]
+    monkeypatch.setattr(answer_cache, "RIGOROUS_GRAPH_CHAIN_BUILDERS", [
+        (lambda llm: PromptTemplate.from_template("Is it rigorous? {input}") | llm)
+    ] + answer_cache.RIGOROUS_GRAPH_CHAIN_BUILDERS[1:])
+    assert create_config_fingerprint(chat_model, pipelined=True) != fingerprint
+
+    monkeypatch.setattr(answer_cache, "RIGOROUS_GRAPH_CHAIN_BUILDERS", [create_chain] + answer_cache.RIGOROUS_GRAPH_CHAIN_BUILDERS[1:])
+    assert create_config_fingerprint(chat_model, pipelined=True) == fingerprint
+
+
+def test_fact_store_freshness_check_is_exact ():
+    fact_store = SQLiteFactStore(":memory:")
+    fact_store.put_facts("source", ["It was 1998.", "In 1998.", "1998 was."])
+    answer_cache = AnswerCache(freshness_check=create_fact_store_freshness_check(fact_store))
+
+    # The fact is not the top BM25 hit of its own text, but it is still stored
+    assert fact_store.search("It was 1998.", top_k=1)[0]["fact"] != "It was 1998."
+    answer_cache.store("When was it?", "fingerprint", "It was 1998.", ["It was 1998.", "In 1998."])
+    assert answer_cache.lookup("When was it?", "fingerprint") is not None
+    assert answer_cache.n_stale == 0
+
+    # A fact gone from the store makes the answer stale
+    fact_store.put_facts("source", ["In 1998."])
+    assert answer_cache.lookup("When was it?", "fingerprint") is None
+    assert answer_cache.n_stale == 1
+
+
+def test_graph_fingerprint_follows_the_graph_settings ():
+    chat_model = ScriptedChatModel()
+    graph = create_scripted_rigorous_llm_graph(chat_model=chat_model, validation_batch_size=4).compile()
+    fingerprint = create_graph_fingerprint(graph)
+
+    assert create_graph_fingerprint(create_scripted_rigorous_llm_graph(chat_model=chat_model, validation_batch_size=4).compile()) == fingerprint
+    assert create_graph_fingerprint(create_scripted_rigorous_llm_graph(chat_model=chat_model, validation_batch_size=1).compile()) != fingerprint
+    assert create_graph_fingerprint(create_scripted_rigorous_llm_graph(chat_model=chat_model, validation_batch_size=4, fact_top_k=5).compile()) != fingerprint
+
+    # A given fingerprint must match the settings of the graph
+    create_answer_cached_graph(graph, AnswerCache(), fingerprint)
+    with pytest.raises(AssertionError):
+        create_answer_cached_graph(graph, AnswerCache(), create_config_fingerprint(chat_model))
@@ -0,0 +1,80 @@
+import json
+import sys
+
+from rigorous_llm import batch_runner
+from rigorous_llm.fakes import DEFAULT_RIGOROUS_LLM_SCRIPT, create_scripted_rigorous_llm_graph, create_scripted_chat_model_for_rigorous_llm
+
+
+# The queries matching it fail while set (see create_flaky_graph)
+FAILING_PATTERN = {"pattern": None}
+
+# The queries run by the graph
+RUN_QUERIES = []
+
+
+def fail_query (prompt :str) -> str:
+    raise RuntimeError("scripted failure")
+
+
+def create_flaky_graph ():
+    rules = list(DEFAULT_RIGOROUS_LLM_SCRIPT)
+    if (FAILING_PATTERN["pattern"] is not None):
+        rules = [(FAILING_PATTERN["pattern"], fail_query)] + rules
+    chat_model = create_scripted_chat_model_for_rigorous_llm().model_copy(update={"rules": rules})
+
+    graph = create_scripted_rigorous_llm_graph(chat_model=chat_model).compile()
+    astream = graph.astream
+
+    def record_and_astream (inputs, *args, **kwargs):
+        RUN_QUERIES.append(inputs["messages"][-1].content)
+        return astream(inputs, *args, **kwargs)
+
+    graph.astream = record_and_astream
+    return graph
+
+
+def run_batch (monkeypatch, capsys, input_path, output_path) -> dict:
+    monkeypatch.setattr(sys, "argv", [
+        "batch_runner",
+        "--input", str(input_path),
+        "--output", str(output_path),
+        "--graph-factory", f"{__name__}:create_flaky_graph",
+        "--max-concurrency", "2"
+    ])
+    RUN_QUERIES.clear()
+    batch_runner.main()
+    return json.loads(capsys.readouterr().out)
+
+
+def read_results (output_path) -> list:
+    return [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_batch_runner_resumes_from_its_results (tmp_path, monkeypatch, capsys):
+    input_path = tmp_path / "queries.jsonl"
+    output_path = tmp_path / "results.jsonl"
+    queries = {f"q{i}": f"What is company number {i}?" for i in range(5)}
+    input_path.write_text("".join([json.dumps({"id": i, "query": q}) + "\n" for i, q in queries.items()]), encoding="utf-8")
+
+    # First run: one query fails
+    FAILING_PATTERN["pattern"] = "company number 3"
+    try:
+        report = run_batch(monkeypatch, capsys, input_path, output_path)
+    finally:
+        FAILING_PATTERN["pattern"] = None
+    assert (report["n_succeeded"], report["n_failed"], report["n_skipped"]) == (4, 1, 0)
+    assert sorted(RUN_QUERIES) == sorted(queries.values())
+    results = {r["id"]: r for r in read_results(output_path)}
+    assert "error" in results["q3"]
+
+    # Interrupt: the last result is truncated mid-line
+    lines = output_path.read_text(encoding="utf-8").splitlines(keepends=True)
+    truncated_id = json.loads(lines[-1])["id"]
+    output_path.write_text("".join(lines[:-1]) + lines[-1][:len(lines[-1]) // 2], encoding="utf-8")
+
+    # Second run: only the failed and the truncated queries are run again
+    expected_ids = {"q3", truncated_id}
+    report = run_batch(monkeypatch, capsys, input_path, output_path)
+    assert sorted(RUN_QUERIES) == sorted([queries[i] for i in expected_ids])
+    assert (report["n_succeeded"], report["n_failed"], report["n_skipped"]) == (len(expected_ids), 0, len(queries) - len(expected_ids))
+    assert batch_runner.read_completed_ids(str(output_path)) == set(queries.keys())
@@ -0,0 +1,25 @@
+from langchain_core.runnables import RunnableLambda
+
+from rigorous_llm.fact_deduplication import FactDeduplicator, FactDeduplicatorRegistry
+from rigorous_llm.graph_builders import FactsCollectionNode
+
+
+def test_filter_facts_leaves_the_known_facts_unchanged ():
+    fact_deduplicator = FactDeduplicator(threshold=0.8)
+    fact_deduplicator.sync_facts(["Paris is the capital of France."])
+
+    facts_lists = [["Paris is the capital of France!", "Berlin is the capital of Germany."], ["Berlin is the capital of Germany"]]
+    for _ in range(2):
+        assert fact_deduplicator.filter_facts(facts_lists) == [["Berlin is the capital of Germany."], []]
+    assert fact_deduplicator.facts == ["Paris is the capital of France."]
+
+
+def test_retried_facts_collection_keeps_its_new_facts ():
+    node = FactsCollectionNode(fact_deduplicator_registry=FactDeduplicatorRegistry(threshold=0.8))
+    state = {"messages": [], "fact_table": ["Paris is the capital of France."]}
+    new_facts = {"tool_message": ["Berlin is the capital of Germany."]}
+    deduplicate = RunnableLambda(lambda state: node.deduplicate_new_facts(state, new_facts))
+
+    # A retried step (the state not updated by the failed attempt) deduplicates its new facts the same way
+    for _ in range(2):
+        assert deduplicate.invoke(state, config={"configurable": {"thread_id": "retry"}}) == new_facts
@@ -0,0 +1,43 @@
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from rigorous_llm.data_definitions import NO_RIGOROUS_ANSWER
+from rigorous_llm.fact_deduplication import FactDeduplicator
+from rigorous_llm.fact_index import FactIndex
+from rigorous_llm.fakes import create_scripted_rigorous_llm_graph, create_scripted_search_tool
+from rigorous_llm.history_compaction import HistoryCompactionPolicy
+
+
+def test_fact_index_sync_drops_the_truncated_facts ():
+    fact_index = FactIndex()
+    fact_index.sync_facts(["Paris is in France.", "Berlin is in Germany."])
+    fact_index.sync_facts(["Berlin is in Germany.", "Rome is in Italy."])
+
+    assert fact_index.facts == ["Berlin is in Germany.", "Rome is in Italy."]
+    assert fact_index.search("Paris", top_k=3) == []
+
+
+def test_fact_deduplicator_sync_forgets_the_truncated_facts ():
+    fact_deduplicator = FactDeduplicator(threshold=0.8)
+    fact_deduplicator.sync_facts(["Paris is in France.", "Berlin is in Germany."])
+    fact_deduplicator.sync_facts(["Berlin is in Germany."])
+
+    assert fact_deduplicator.filter_facts([["Paris is in France.", "Berlin is in Germany!"]]) == [["Paris is in France."]]
+
+
+def test_compacted_facts_are_collected_again ():
+    search_tool = create_scripted_search_tool(search=lambda query: ["Paris is the capital of France."])
+    graph = create_scripted_rigorous_llm_graph(
+        search_tool=search_tool,
+        fact_top_k=5,
+        fact_dedup_threshold=0.8,
+        history_compaction_policy=HistoryCompactionPolicy(max_turns=1, max_facts=0)
+    ).compile(checkpointer=MemorySaver())
+    config = {"configurable": {"thread_id": "compaction"}}
+
+    for _ in range(2):
+        outputs = graph.invoke({"messages": [HumanMessage("What is the capital of France?")]}, config=config)
+
+        # The facts dropped by the compaction of the turn are not known duplicates anymore: they are collected (and selected) again
+        assert len(outputs["fact_table"]) == 1 and "Paris is the capital of France." in outputs["fact_table"][0]
+        assert outputs["messages"][-1].content != NO_RIGOROUS_ANSWER
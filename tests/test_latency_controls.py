@@ -0,0 +1,134 @@
+from collections import defaultdict
+import asyncio
+import itertools
+import threading
+import time
+from typing import List
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from rigorous_llm.fakes import DEFAULT_RIGOROUS_LLM_SCRIPT, ScriptedChatModel, create_scripted_rigorous_llm_graph, create_scripted_search_tool
+from rigorous_llm.graph_builders import StatementsPipelineNode
+from rigorous_llm.latency_controls import LatencyPolicy, TurnBudget
+
+
+def create_inputs (query :str) -> dict:
+    return {"messages": [HumanMessage(query)], "rigorousness_required": False, "extracted_statements": [], "validated_statements": []}
+
+
+class SlowFirstChatModel (BaseChatModel):
+    """
+    A chat model whose first call is slow (and outrun by its hedged duplicate). Each call reports its tokens to its run manager.
+    """
+
+    first_call_seconds :float = 0.3
+
+    def __init__ (self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        object.__setattr__(self, "call_ids", itertools.count())
+
+    @property
+    def _llm_type (self) -> str:
+        return "slow_first"
+
+    def _generate (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        i_call = next(self.call_ids)
+        if (i_call == 0):
+            time.sleep(self.first_call_seconds)
+        tokens = [f"call{i_call}", "true"]
+        for token in tokens:
+            if (run_manager is not None):
+                run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(" ".join(tokens)))])
+
+    async def _agenerate (self, messages :List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        i_call = next(self.call_ids)
+        if (i_call == 0):
+            await asyncio.sleep(self.first_call_seconds)
+        tokens = [f"call{i_call}", "true"]
+        for token in tokens:
+            if (run_manager is not None):
+                await run_manager.on_llm_new_token(token)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(" ".join(tokens)))])
+
+
+class LLMCallbackCounter (BaseCallbackHandler):
+    def __init__ (self) -> None:
+        self.tokens = []
+        self.n_llm_starts = 0
+        self.n_llm_ends = 0
+        self._lock = threading.Lock()
+
+    def on_chat_model_start (self, serialized, messages, **kwargs) -> None:
+        with self._lock:
+            self.n_llm_starts += 1
+
+    def on_llm_new_token (self, token :str, **kwargs) -> None:
+        with self._lock:
+            self.tokens.append(token)
+
+    def on_llm_end (self, response, **kwargs) -> None:
+        with self._lock:
+            self.n_llm_ends += 1
+
+
+def test_hedged_call_is_reported_once ():
+    policy = LatencyPolicy(hedge_percentile=95.0, hedge_delay_seconds=0.05)
+    chat_model = SlowFirstChatModel()
+    counter = LLMCallbackCounter()
+
+    response = policy.wrap_chat_model(chat_model, "rigorousness_judgement_chain").invoke("Is it true?", config={"callbacks": [counter]})
+    # Let the outrun call complete in the background
+    time.sleep(chat_model.first_call_seconds + 0.1)
+
+    assert response.content == "call1 true"
+    assert counter.tokens == ["call1", "true"]
+    assert (counter.n_llm_starts, counter.n_llm_ends) == (1, 1)
+
+
+def test_hedged_async_call_is_reported_once ():
+    policy = LatencyPolicy(hedge_percentile=95.0, hedge_delay_seconds=0.05)
+    chat_model = SlowFirstChatModel()
+    counter = LLMCallbackCounter()
+
+    response = asyncio.run(policy.wrap_chat_model(chat_model, "rigorousness_judgement_chain").ainvoke("Is it true?", config={"callbacks": [counter]}))
+
+    assert response.content == "call1 true"
+    assert counter.tokens == ["call1", "true"]
+    assert (counter.n_llm_starts, counter.n_llm_ends) == (1, 1)
+
+
+def test_latency_policy_streams_only_the_streaming_chains ():
+    policy = LatencyPolicy()
+    chat_model = ScriptedChatModel()
+
+    assert policy.wrap_chat_model(chat_model, "statements_summarization_chain").disable_streaming is False
+    assert policy.wrap_chat_model(chat_model, "statements_extraction_chain").disable_streaming is True
+    assert policy.wrap_chat_model(chat_model, "statements_extraction_chain", streaming=True).disable_streaming is False
+
+
+def test_pipelined_extraction_is_streamed_under_turn_budget ():
+    chat_model = ScriptedChatModel(rules=DEFAULT_RIGOROUS_LLM_SCRIPT, token_latency_seconds=0.01)
+    search_tool = create_scripted_search_tool(search=lambda query: [
+        "Google LLC is an American technology company. It was founded in 1998. It is a subsidiary of Alphabet Inc."
+    ])
+    graph = create_scripted_rigorous_llm_graph(
+        chat_model=chat_model,
+        search_tool=search_tool,
+        turn_budget=TurnBudget(budget_seconds=60.0),
+        pipelined=True
+    ).compile()
+
+    # The arrival times of the chunks of each message generated in the pipeline
+    arrival_times = defaultdict(list)
+    for message, metadata in graph.stream(create_inputs("What is Google LLC?"), stream_mode="messages"):
+        if (metadata.get("langgraph_node") == StatementsPipelineNode.name and isinstance(message, AIMessageChunk)):
+            arrival_times[message.id].append(time.perf_counter())
+
+    # The statements extraction arrives chunk by chunk, not as one message at its end
+    n_chunks, times = max([(len(times), times) for times in arrival_times.values()])
+    assert n_chunks > 5
+    assert times[-1] - times[0] > 0.05
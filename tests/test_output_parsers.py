@@ -0,0 +1,40 @@
+import pytest
+
+from rigorous_llm.output_parsers import IndexedBooleanOutputParser, find_verdict_in_text
+
+
+@pytest.mark.parametrize("text, verdict", [
+    ("true", True),
+    ("True.", True),
+    ("yes", True),
+    ("**true**", True),
+    ("false", False),
+    ("No, the facts say otherwise.", False),
+    ("The statement is not true", False),
+    ("not false", True),
+    ("unknown", None),
+    ("cannot determine", None),
+    ("not enough information", None),
+    ("no information", None),
+    ("true or false", None),
+    ("true, but not certain", None),
+    ("", None),
+])
+def test_find_verdict_in_text (text, verdict):
+    assert find_verdict_in_text(text) is verdict
+
+
+def test_indexed_boolean_output_parser_leaves_hedged_lines_unclear ():
+    text = "\n".join([
+        "[1] true",
+        "[2] unknown",
+        "[3] cannot determine",
+        "[4] not enough information",
+        "[5] false",
+        "[6] The statement is not true",
+        "[7] yes",
+    ])
+
+    # The unclear indices (2, 3 and 4) are left out, for the one-by-one fallback
+    assert IndexedBooleanOutputParser().parse(text) == {1: True, 5: False, 6: False, 7: True}
+
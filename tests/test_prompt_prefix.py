@@ -0,0 +1,62 @@
+from rigorous_llm.data_definitions import collect_facts_from_state, create_facts_update
+from rigorous_llm.fakes import ScriptedChatModel
+from rigorous_llm.graph_builders import LLMResponseRevisementNode, LLMResponseValidationNode
+
+
+FACTS_BY_SOURCE = {
+    "tool_message_1": ["Google LLC is an American technology company.", "Google LLC was founded in 1998."],
+    "tool_message_2": ["Google LLC is a subsidiary of Alphabet Inc.", "Google LLC was founded in 1998."],
+}
+
+
+def create_state () -> dict:
+    return create_facts_update({}, FACTS_BY_SOURCE)
+
+
+def render_prefix (prompt :str, variable_part :str) -> str:
+    # The prompt up to its per-call part (the statements to validate or summarize), which comes last
+    assert variable_part in prompt
+    return prompt[:prompt.rindex(variable_part)]
+
+
+def test_validation_prompts_share_the_fact_block_prefix ():
+    node = LLMResponseValidationNode(chat_model=ScriptedChatModel(), batch_size=2)
+    all_facts = collect_facts_from_state(create_state())
+    statements_list = [["Google LLC was founded in 1998."], ["Google LLC is owned by Alphabet Inc."]]
+
+    prefixes = []
+    for statements in statements_list:
+        one_by_one_inputs = node.create_one_by_one_inputs(statements, [all_facts])[0]
+        prefixes.append(render_prefix(node.chain_4_text_validation_against_facts.first.format(**one_by_one_inputs), statements[0]))
+    assert prefixes[0] == prefixes[1]
+    assert prefixes[0].rstrip().endswith("Text:")
+    assert all([fact in prefixes[0] for fact in all_facts])
+
+    batch_prefixes = []
+    for statements in statements_list:
+        batch_inputs = node.create_batch_inputs(statements, [all_facts], [[0]])[0]
+        batch_prefixes.append(render_prefix(node.chain_4_texts_validation_against_facts.first.format(**batch_inputs), statements[0]))
+    assert batch_prefixes[0] == batch_prefixes[1]
+    assert all([fact in batch_prefixes[0] for fact in all_facts])
+
+
+def test_validation_fact_block_is_identical_across_states ():
+    # The same facts collected again (in a new state) give a byte-identical fact block
+    assert collect_facts_from_state(create_state()) == collect_facts_from_state(create_state())
+    assert collect_facts_from_state(create_state()) == [
+        "Google LLC is an American technology company.",
+        "Google LLC was founded in 1998.",
+        "Google LLC is a subsidiary of Alphabet Inc.",
+    ]
+
+
+def test_summarization_prompts_share_the_instructions_prefix ():
+    node = LLMResponseRevisementNode(chat_model=ScriptedChatModel())
+    statements_list = [["Google LLC was founded in 1998."], ["Google LLC is a subsidiary of Alphabet Inc."]]
+
+    prefixes = [
+        render_prefix(node.chain_4_statements_summarization.first.format(**node.create_summarization_inputs(statements)[0]), statements[0])
+        for statements in statements_list
+    ]
+    assert prefixes[0] == prefixes[1]
+    assert prefixes[0].startswith("Summarize the statements")
@@ -0,0 +1,90 @@
+import asyncio
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import HumanMessage
+
+from rigorous_llm.fakes import create_scripted_rigorous_llm_graph, create_scripted_search_tool
+from rigorous_llm.graph_builders import MicroBatcher, StatementsPipelineNode
+
+
+class ValidationCallCounter (BaseCallbackHandler):
+
+    def __init__ (self) -> None:
+        self.n_batch_calls = 0
+        self.n_single_calls = 0
+
+    def on_chat_model_start (self, serialized, messages, **kwargs) -> None:
+        prompt = "\n".join([str(m.content) for m in messages[0]])
+        self.n_batch_calls += int("validate each of the given texts" in prompt)
+        self.n_single_calls += int("validate a given text" in prompt)
+
+
+class ManualTimers:
+
+    def __init__ (self) -> None:
+        self.callbacks = []
+
+    def schedule (self, delay_seconds, callback):
+        self.callbacks.append(callback)
+        return self
+
+    def cancel (self) -> None:
+        pass
+
+
+def create_graph ():
+    search_tool = create_scripted_search_tool(search=lambda query: [
+        "Google LLC is an American technology company. It was founded in 1998. It is a subsidiary of Alphabet Inc. "
+        "It is based in Mountain View. It runs a search engine. It makes the Android operating system."
+    ])
+    return create_scripted_rigorous_llm_graph(search_tool=search_tool, validation_batch_size=4, pipelined=True).compile()
+
+
+def create_inputs () -> dict:
+    return {"messages": [HumanMessage("What is Google LLC?")], "rigorousness_required": False, "extracted_statements": [], "validated_statements": []}
+
+
+def find_pipeline_update (updates :list) -> dict:
+    return [update[StatementsPipelineNode.name] for update in updates if StatementsPipelineNode.name in update][0]
+
+
+def test_micro_batcher_dispatches_full_and_timed_out_batches ():
+    batches = []
+    timers = ManualTimers()
+    micro_batcher = MicroBatcher(dispatch=batches.append, batch_size=2, timeout_seconds=0.1, schedule=timers.schedule)
+
+    for item in ["a", "b", "c"]:
+        micro_batcher.add(item)
+    assert batches == [["a", "b"]]
+
+    # The timer of the first batch is stale, the one of the second batch dispatches it
+    for callback in timers.callbacks:
+        callback()
+    assert batches == [["a", "b"], ["c"]]
+
+    micro_batcher.close()
+    assert batches == [["a", "b"], ["c"]]
+
+
+def test_pipelined_validation_is_batched ():
+    counter = ValidationCallCounter()
+    outputs = find_pipeline_update(list(create_graph().stream(create_inputs(), config={"callbacks": [counter]}, stream_mode="updates")))
+
+    assert len(outputs["extracted_statements"]) == 6
+    assert outputs["validated_statements"] == outputs["extracted_statements"]
+    assert counter.n_single_calls == 0
+    assert counter.n_batch_calls <= 2
+
+
+def test_async_pipelined_validation_is_batched ():
+    counter = ValidationCallCounter()
+
+    async def astream_updates () -> list:
+        return [update async for update in create_graph().astream(create_inputs(), config={"callbacks": [counter]}, stream_mode="updates")]
+
+    outputs = find_pipeline_update(asyncio.run(astream_updates()))
+
+    assert len(outputs["extracted_statements"]) == 6
+    assert outputs["validated_statements"] == outputs["extracted_statements"]
+    assert counter.n_single_calls == 0
+    assert counter.n_batch_calls <= 2
@@ -0,0 +1,59 @@
+import json
+import time
+import asyncio
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from rigorous_llm.graph_builders import BasicToolNode
+
+
+def create_slow_tool (delay_seconds :float):
+    def slow_search (query :str) -> str:
+        time.sleep(delay_seconds)
+        return f"Results of {query}"
+
+    return StructuredTool.from_function(func=slow_search, name="slow_search", description="A slow search.")
+
+
+def create_state (n_tool_calls :int) -> dict:
+    return {"messages": [AIMessage("", tool_calls=[
+        {"name": "slow_search", "args": {"query": f"query {i}"}, "id": f"call_{i}"}
+        for i in range(n_tool_calls)
+    ])]}
+
+
+def test_tool_calls_time_out_from_their_submission ():
+    node = BasicToolNode(tools=[create_slow_tool(delay_seconds=1.0)], max_concurrency=1, timeout_seconds=0.2)
+
+    t_start = time.perf_counter()
+    outputs = node(create_state(n_tool_calls=2))
+    elapsed_seconds = time.perf_counter() - t_start
+
+    # The call queued behind the concurrency limit times out with the first one, instead of running after it
+    assert elapsed_seconds < 0.35
+    assert [message.status for message in outputs["messages"]] == ["error", "error"]
+    assert all(["timed out" in json.loads(message.content)["error"] for message in outputs["messages"]])
+
+
+def test_async_tool_calls_time_out_from_their_submission ():
+    node = BasicToolNode(tools=[create_slow_tool(delay_seconds=1.0)], max_concurrency=1, timeout_seconds=0.2)
+
+    async def acall_node ():
+        # Timed within the event loop: asyncio.run waits for the (sync) tool threads left running at its end
+        t_start = time.perf_counter()
+        outputs = await node.acall(create_state(n_tool_calls=2))
+        return outputs, time.perf_counter() - t_start
+
+    outputs, elapsed_seconds = asyncio.run(acall_node())
+
+    assert elapsed_seconds < 0.35
+    assert [message.status for message in outputs["messages"]] == ["error", "error"]
+
+
+def test_tool_calls_within_the_timeout_are_answered ():
+    node = BasicToolNode(tools=[create_slow_tool(delay_seconds=0.0)], max_concurrency=1, timeout_seconds=1.0)
+
+    outputs = node(create_state(n_tool_calls=2))
+
+    assert [json.loads(message.content) for message in outputs["messages"]] == ["Results of query 0", "Results of query 1"]